@@ -0,0 +1,103 @@
+''' Crawls a synthetic site with a cluster of local crawler processes.
+
+    Starts a StubCacheServer serving HOSTS hosts of PAGES pages each, all
+    linking across hosts, then one crawler process per node with
+    ClusterFrontier. Checks that every page was downloaded exactly once
+    across the cluster and prints the crawl time.
+
+    python -m benchmarks.cluster [--nodes 3] [--hosts 12] [--pages 20]
+'''
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from configparser import ConfigParser
+
+from crawler import Crawler
+from crawler.cluster import ClusterFrontier, configure_node
+from utils.config import Config
+from utils.stub_server import StubCacheServer
+
+
+def synthetic_site(hosts, pages, seed=0):
+    ''' Pages of distinct text, each linking to pages on three other hosts. '''
+    rng = random.Random(seed)
+    vocab = ["".join(rng.choice("abcdefghijklmnop") for _ in range(7))
+             for _ in range(5000)]
+    urls = [f"https://h{h}.ics.uci.edu/page{p}"
+            for h in range(hosts) for p in range(pages)]
+    site = dict()
+    for url in urls:
+        text = " ".join(rng.choice(vocab) for _ in range(300))
+        links = "".join(f'<a href="{rng.choice(urls)}">link</a>' for _ in range(6))
+        next_page = urls[(urls.index(url) + 1) % len(urls)]
+        site[url] = (f"<html><body><p>{text}</p>{links}"
+                     f'<a href="{next_page}">next</a></body></html>').encode()
+    return site
+
+
+def free_ports(count):
+    sockets = [socket.socket() for _ in range(count)]
+    for sock in sockets:
+        sock.bind(("127.0.0.1", 0))
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+def run_node(node_id, nodes, cache_server, seed_url, workdir):
+    os.chdir(workdir)
+    cparser = ConfigParser()
+    cparser.read(os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), "config.ini"))
+    cparser["CRAWLER"]["SEEDURL"] = seed_url
+    cparser["CRAWLER"]["POLITENESS"] = "0.05"
+    cparser["CLUSTER"]["NODES"] = ",".join(f"{host}:{port}" for host, port in nodes)
+    cparser["CLUSTER"]["FLUSH_INTERVAL"] = "0.2"
+    config = configure_node(Config(cparser), node_id)
+    config.cache_server = cache_server
+    Crawler(config, True, frontier_factory=ClusterFrontier).start()
+
+
+def main(node_count, hosts, pages):
+    site = synthetic_site(hosts, pages)
+    server = StubCacheServer(site).start()
+    nodes = [("127.0.0.1", port) for port in free_ports(node_count)]
+    workdir = tempfile.mkdtemp()
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_node, args=(
+            node_id, nodes, server.address, next(iter(site)), workdir))
+        for node_id in range(node_count)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+    server.stop()
+
+    fetched = {url: count for url, count in server.fetched.items()
+               if not url.endswith("/robots.txt")}
+    missing = len(set(site) - set(fetched))
+    repeated = sum(1 for count in fetched.values() if count > 1)
+    print(f"{node_count} nodes crawled {len(fetched)}/{len(site)} pages "
+          f"in {elapsed:.1f}s ({len(fetched) / elapsed:.1f} pages/sec)")
+    print(f"missing: {missing}, downloaded more than once: {repeated}, "
+          f"node exit codes: {[process.exitcode for process in processes]}")
+    return 0 if not missing and not repeated else 1
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--hosts", type=int, default=12)
+    parser.add_argument("--pages", type=int, default=20)
+    args = parser.parse_args()
+    sys.exit(main(args.nodes, args.hosts, args.pages))
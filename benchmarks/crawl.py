@@ -0,0 +1,316 @@
+''' Crawls a synthetic site end to end against a local cache server, as
+    launch.py would crawl the real one, and measures the crawl.
+
+    A StubCacheServer in its own process serves the site, so its work is not
+    counted against the crawler. The synthetic site has HOSTS hosts of PAGES
+    pages linking within and across hosts, plus the things a real crawl runs
+    into: robots.txt files disallowing /private/, an endless calendar and an
+    endless ?page= list (traps), pages giving 500s and 404s, mirrored copies
+    of pages, pages over the word limit, pages over MAX_PAGE_SIZE and
+    non-text files. Pages are generated from their url, so every run and
+    every commit crawls the same site. --site crawls a recorded site instead:
+    a pickled dict of url -> body or (status, body, headers), with
+    SEEDURL as the seed.
+
+    Prints pages/sec, CPU time per page, peak RSS and the frontier size over
+    time, and writes them as JSON with the commit they were measured on to
+    --output. --baseline compares with the JSON of an earlier run.
+
+    python -m benchmarks.crawl [--engine threaded] [--threads 4] [--hosts 8]
+        [--pages 60] [--site site.pkl] [--output crawl.json] [--baseline old.json]
+'''
+import json
+import multiprocessing
+import os
+import pickle
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+from argparse import ArgumentParser
+from configparser import ConfigParser
+from datetime import date, timedelta
+from threading import Thread
+
+import crawler.worker
+from crawler import Crawler
+from launch import WORKERS
+from utils.config import Config
+from utils.metrics import metrics
+from utils.stub_server import StubCacheServer
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECTIONS = ["people", "research", "courses", "news", "events", "projects"]
+ROBOTS = b"User-agent: *\nDisallow: /private/\n"
+TEXT = {"Content-Type": "text/html; charset=utf-8"}
+
+
+class SyntheticSite(object):
+    ''' Pages generated on request from their url, behind the dict.get the
+        StubCacheServer looks them up with. '''
+    def __init__(self, hosts, pages, max_page_size, seed=0):
+        rng = random.Random(seed)
+        self.vocab = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz")
+                              for _ in range(rng.randint(3, 9)))
+                      for _ in range(20000)]
+        self.hosts = [f"https://h{h}.ics.uci.edu" for h in range(hosts)]
+        self.pages = pages
+        self.seed = seed
+        self.huge = b"<html><body>" + b"x " * (max_page_size // 2) + b"</body></html>"
+
+    @property
+    def seed_url(self):
+        return self.page_url(0, 0)
+
+    def page_url(self, host, page):
+        return f"{self.hosts[host]}/{SECTIONS[page % len(SECTIONS)]}/{page}"
+
+    def _rng(self, url):
+        return random.Random(zlib.crc32(url.encode()) ^ self.seed)
+
+    def _text(self, rng, words):
+        return " ".join(rng.choice(self.vocab) for _ in range(words))
+
+    def _html(self, text, links):
+        anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+        return f"<html><body><p>{text}</p>{anchors}</body></html>".encode()
+
+    def _page(self, url, host, page):
+        rng = self._rng(url)
+        origin = self.hosts[host]
+        links = [self.page_url(host, rng.randrange(self.pages)) for _ in range(4)]
+        links += [self.page_url(rng.randrange(len(self.hosts)), rng.randrange(self.pages))
+                  for _ in range(2)]
+        links.append(self.page_url(host, (page + 1) % self.pages))
+        if page % 10 == 0:
+            links += [f"{origin}/private/{page}", f"{origin}/broken/{page}",
+                      f"{origin}/missing/{page}", f"{origin}/mirror{url[len(origin):]}",
+                      f"{origin}/files/{page}"]
+        if page % 25 == 0:
+            links += [f"{origin}/big/{page}", f"{origin}/huge/{page}"]
+        if page == 0:
+            links += [f"{origin}/calendar/2021-01-01", f"{origin}/list?page=1"]
+        return self._html(self._text(rng, rng.randint(150, 1200)), links)
+
+    def get(self, url):
+        origin, _, path = url.partition(".ics.uci.edu")
+        origin += ".ics.uci.edu"
+        if origin not in self.hosts:
+            return None
+        host = self.hosts.index(origin)
+        parts = path.strip("/").split("/")
+        if path == "/robots.txt":
+            return (200, ROBOTS, {"Content-Type": "text/plain"})
+        if len(parts) == 2 and parts[0] in SECTIONS and parts[1].isdigit() \
+                and int(parts[1]) < self.pages:
+            return self._page(url, host, int(parts[1]))
+        if parts[0] == "mirror":
+            return self.get(origin + path[len("/mirror"):])
+        if parts[0] == "private":
+            return self._html(self._text(self._rng(url), 300), [])
+        if parts[0] == "broken":
+            return (500, b"", TEXT)
+        if parts[0] == "files":
+            return (200, bytes(self._rng(url).randrange(256) for _ in range(4096)),
+                    {"Content-Type": "application/octet-stream"})
+        if parts[0] == "big":
+            return self._html(self._text(self._rng(url), 60000), [])
+        if parts[0] == "huge":
+            return self.huge
+        if parts[0] == "calendar":
+            # every day links to the next, forever
+            day = date.fromisoformat(parts[1])
+            return self._html(self._text(self._rng(url), 200), [
+                f"{origin}/calendar/{day + timedelta(days=1)}",
+                f"{origin}/calendar/{day - timedelta(days=1)}"])
+        if path.startswith("/list?page="):
+            number = int(path.split("=")[1])
+            return self._html(self._text(self._rng(url), 200), [
+                f"{origin}/list?page={number + 1}"])
+        return None
+
+
+def serve(site, conn):
+    ''' Runs the cache server in its own process until told to stop, then
+        sends back how often each url was requested. '''
+    server = StubCacheServer(site).start()
+    conn.send(server.address)
+    conn.recv()
+    server.stop()
+    conn.send(dict(server.fetched))
+
+
+def git_commit():
+    ''' The commit the benchmark ran on, marked dirty if tracked files changed. '''
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO, capture_output=True,
+            text=True, check=True).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def rss_mb():
+    ''' Current resident set size of this process. '''
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cpu_seconds(who):
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def sample(crawl, start, interval, timeline):
+    while any(worker.is_alive() for worker in crawl.workers):
+        timeline.append({
+            "seconds": round(time.perf_counter() - start, 3),
+            "pages": crawl.reporter.stats["page_count"],
+            "frontier_queued": crawl.frontier.queued_count(),
+            "frontier_seen": len(crawl.frontier.seen),
+            "rss_mb": round(rss_mb(), 1),
+            "cpu_seconds": round(cpu_seconds(resource.RUSAGE_SELF), 3),
+        })
+        time.sleep(interval)
+
+
+def crawl(args):
+    cparser = ConfigParser()
+    cparser.read(os.path.join(REPO, "config.ini"))
+    cparser["CRAWLER"]["POLITENESS"] = str(args.politeness)
+    cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = str(args.threads)
+    cparser["LOCAL PROPERTIES"]["LOG_LEVEL"] = "WARNING"
+    if args.site:
+        with open(args.site, "rb") as site_file:
+            site = pickle.load(site_file)
+    else:
+        site = SyntheticSite(args.hosts, args.pages,
+                             cparser["CRAWLER"].getint("MAX_PAGE_SIZE", 3000000), args.seed)
+        cparser["CRAWLER"]["SEEDURL"] = site.seed_url
+
+    context = multiprocessing.get_context("spawn")
+    conn, child_conn = context.Pipe()
+    server = context.Process(target=serve, args=(site, child_conn), daemon=True)
+    server.start()
+    os.chdir(tempfile.mkdtemp())
+    config = Config(cparser)
+    config.cache_server = conn.recv()
+
+    timeline = []
+    start = time.perf_counter()
+    crawl = Crawler(config, True, worker_factory=WORKERS[args.engine])
+    crawl.start_async()
+    sampler = Thread(target=sample, args=(crawl, start, args.sample, timeline), daemon=True)
+    sampler.start()
+    crawl.join()
+    elapsed = time.perf_counter() - start
+    sampler.join()
+    if crawler.worker._parse_pool is not None:
+        # reaps the parse processes, so their CPU time counts as the crawl's
+        crawler.worker._parse_pool.shutdown()
+    cpu = cpu_seconds(resource.RUSAGE_SELF)
+    parse_cpu = cpu_seconds(resource.RUSAGE_CHILDREN)
+    parse_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+    conn.send("stop")
+    fetched = conn.recv()
+    server.join()
+
+    pages = crawl.reporter.stats["page_count"]
+    snapshot = metrics.snapshot()
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {
+            "engine": args.engine, "threads": args.threads,
+            "politeness": args.politeness, "site": args.site,
+            "hosts": args.hosts, "pages": args.pages, "seed": args.seed},
+        "pages": pages,
+        "downloads": sum(count for url, count in fetched.items()
+                         if not url.endswith("/robots.txt")),
+        "robots_violations": sum(1 for url in fetched if "/private/" in url),
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 2),
+        "cpu_seconds": round(cpu + parse_cpu, 3),
+        "cpu_ms_per_page": round(1000 * (cpu + parse_cpu) / max(pages, 1), 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "parse_process_peak_rss_mb": round(parse_rss, 1),
+        "frontier_peak_queued": max((point["frontier_queued"] for point in timeline), default=0),
+        "frontier_seen": len(crawl.frontier.seen),
+        "trap_rejected": crawl.frontier.traps.rejected,
+        "counters": snapshot["counters"],
+        "stages": snapshot["stages"],
+        "timeline": timeline,
+    }
+
+
+SUMMARY = [
+    ("pages_per_second", "pages/sec"),
+    ("cpu_ms_per_page", "CPU ms/page"),
+    ("peak_rss_mb", "peak RSS MB"),
+    ("frontier_peak_queued", "peak frontier"),
+]
+
+
+def main(args):
+    result = crawl(args)
+    print(f"commit {result['commit']}, {result['params']['engine']} engine, "
+          f"{result['params']['threads']} threads, {result['cpus']} cpus")
+    print(f"crawled {result['pages']} pages ({result['downloads']} downloads, "
+          f"{result['trap_rejected']} trap urls dropped, "
+          f"{result['robots_violations']} robots.txt violations) in {result['seconds']}s")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"compared with {args.baseline} (commit {baseline['commit']})")
+    for key, label in SUMMARY:
+        line = f"{label:>15}: {result[key]:10}"
+        if baseline and baseline.get(key):
+            line += f"  was {baseline[key]:10}  ({result[key] / baseline[key]:.2f}x)"
+        print(line)
+    print(f"{'frontier size':>15}: " + " ".join(
+        f"{point['frontier_queued']}@{point['seconds']:.0f}s"
+        for point in result["timeline"][::max(len(result["timeline"]) // 10, 1)]))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, indent=1)
+        print(f"wrote {args.output}")
+    return 0 if not result["robots_violations"] else 1
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--engine", choices=sorted(WORKERS), default="threaded")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--politeness", type=float, default=0.05)
+    parser.add_argument("--hosts", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--site", type=str, default=None)
+    parser.add_argument("--sample", type=float, default=0.5)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--baseline", type=str, default=None)
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    if args.baseline:
+        args.baseline = os.path.abspath(args.baseline)
+    if args.site:
+        args.site = os.path.abspath(args.site)
+    sys.exit(main(args))
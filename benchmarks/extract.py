@@ -0,0 +1,89 @@
+''' Compares the single-pass lxml extraction in scraper.parsePage with the
+    BeautifulSoup get_text + find_all pipeline it replaced.
+
+    Both must produce the same anchor hrefs and the same word count for every
+    page (the BeautifulSoup reference drops <script> and <style> first, as
+    parsePage only keeps visible text). Prints pages/sec for both.
+
+    python -m benchmarks.extract [--corpus dir/of/html] [--pages N]
+'''
+import os
+import random
+import sys
+import time
+
+from argparse import ArgumentParser
+from collections import defaultdict
+
+from bs4 import BeautifulSoup
+
+import scraper
+
+
+WORDS = ("research student informatics computer science graduate faculty "
+         "seminar course lecture data learning systems software café über "
+         "naïve e-mail don't 2020 x86 a b").split()
+
+
+def synthetic_corpus(count, seed=0):
+    rng = random.Random(seed)
+    pages = []
+    for i in range(count):
+        body = []
+        for _ in range(rng.randint(20, 120)):
+            words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))
+            href = rng.choice([
+                f"/page/{rng.randint(0, 999)}", f"../up/{i}#frag",
+                f"https://www.ics.uci.edu/~p{rng.randint(0, 50)}/",
+                "//cs.uci.edu/x?id=3&amp;b=4", "mailto:x@uci.edu"])
+            body.append(f"<p>{words} &amp; <a href='{href}'>{rng.choice(WORDS)}</a>"
+                        f"<!-- {rng.choice(WORDS)} --></p>")
+            if rng.random() < 0.05:
+                body.append("<script>var x = 'hidden words';</script>"
+                            "<style>p { color: red }</style>")
+        pages.append(("<html><head><title>Page</title></head><body>"
+                      + "\n".join(body) + "</body></html>").encode("utf-8"))
+    return pages
+
+
+def load_corpus(path):
+    return [open(os.path.join(path, name), "rb").read()
+            for name in sorted(os.listdir(path))]
+
+
+def soup_parse(content):
+    ''' The BeautifulSoup pipeline scraper.extract_next_links used before. '''
+    soup = BeautifulSoup(content, "lxml")
+    for hidden in soup(["script", "style"]):
+        hidden.decompose()
+    return (soup.get_text(), [link.get("href") for link in soup.find_all("a")
+                              if link.get("href") is not None])
+
+
+def run(parse, pages):
+    results = []
+    start = time.perf_counter()
+    for content in pages:
+        text, hrefs = parse(content)
+        numWords, _ = scraper.tokenFrequencies(text.lower(), defaultdict(int))
+        results.append((hrefs, numWords))
+    return results, len(pages) / (time.perf_counter() - start)
+
+
+def main(corpus, count):
+    pages = load_corpus(corpus) if corpus else synthetic_corpus(count)
+    reference, soup_rate = run(soup_parse, pages)
+    results, lxml_rate = run(scraper.parsePage, pages)
+    mismatches = sum(1 for a, b in zip(reference, results) if a != b)
+    print(f"BeautifulSoup: {soup_rate:8.1f} pages/sec")
+    print(f"  parsePage:   {lxml_rate:8.1f} pages/sec ({lxml_rate / soup_rate:.1f}x)")
+    print(f"parity: {len(pages) - mismatches}/{len(pages)} pages identical")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--pages", type=int, default=300)
+    args = parser.parse_args()
+    sys.exit(main(args.corpus, args.pages))
@@ -0,0 +1,80 @@
+''' Compares the memory and speed of a frontier that keeps every queued url in
+    memory with one capped at FRONTIER_MEMORY_URLS, which spills the rest to
+    disk.
+
+    python -m benchmarks.frontier_memory [--urls N] [--cap N] [--config_file config.ini]
+'''
+import os
+import tempfile
+import time
+import tracemalloc
+
+from argparse import ArgumentParser
+from configparser import ConfigParser
+
+from crawler.frontier import Frontier
+from utils import canonicalize
+from utils.config import Config
+
+
+def synthetic_links(count):
+    hosts = [f"https://sub{i}.ics.uci.edu" for i in range(50)]
+    return [canonicalize(f"{hosts[i % len(hosts)]}/page/{i}?id={i * 7}")
+            for i in range(count)]
+
+
+def new_frontier(config, cap, links):
+    config.frontier_memory_urls = cap
+    config.save_file = os.path.join(tempfile.mkdtemp(), "frontier.journal")
+    config.seed_urls = [links[0][0]]
+    return Frontier(config, True)
+
+
+def bench_cap(config, cap, links):
+    ''' Returns (adds/sec, pops/sec, MB traced after the adds). '''
+    frontier = new_frontier(config, cap, links)
+    start = time.perf_counter()
+    for i in range(0, len(links), 50):
+        frontier.add_urls(links[i:i + 50], 1)
+    adds = len(links) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    popped = 0
+    while True:
+        url, wait = frontier.poll_tbd_url()
+        if url is None:
+            break
+        # completes without fetching, so the politeness delay is not waited
+        frontier.mark_url_complete(url, fetched=False)
+        popped += 1
+    pops = popped / (time.perf_counter() - start)
+    frontier.close()
+
+    tracemalloc.start()
+    frontier = new_frontier(config, cap, links)
+    for i in range(0, len(links), 50):
+        frontier.add_urls(links[i:i + 50], 1)
+    traced = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+    frontier.close()
+    return adds, pops, traced
+
+
+def main(config_file, count, cap):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    config.trap_template_limit = count
+    links = synthetic_links(count)
+    for name, limit in (("in memory", 0), (f"cap {cap}", cap)):
+        adds, pops, traced = bench_cap(config, limit, links)
+        print(f"{name:>12}: {adds:9.0f} adds/sec {pops:9.0f} pops/sec "
+              f"{traced:8.1f} MB after adding {count} urls")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=100000)
+    parser.add_argument("--cap", type=int, default=10000)
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    args = parser.parse_args()
+    main(args.config_file, args.urls, args.cap)
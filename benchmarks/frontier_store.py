@@ -0,0 +1,52 @@
+''' Compares Frontier.add_url throughput of the shelve and journal backends.
+
+    python -m benchmarks.frontier_store [--urls N] [--config_file config.ini]
+'''
+import os
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from configparser import ConfigParser
+
+from crawler.frontier import Frontier
+from utils.config import Config
+
+
+def synthetic_urls(count):
+    hosts = [f"https://sub{i}.ics.uci.edu" for i in range(50)]
+    return [f"{hosts[i % len(hosts)]}/page/{i}?id={i * 7}" for i in range(count)]
+
+
+def bench_store(config, store, urls):
+    config.store = store
+    config.save_file = os.path.join(tempfile.mkdtemp(), f"frontier.{store}")
+    config.seed_urls = urls[:1]
+    frontier = Frontier(config, True)
+    start = time.perf_counter()
+    for url in urls:
+        frontier.add_url(url)
+    frontier.close()
+    return len(urls) / (time.perf_counter() - start)
+
+
+def main(config_file, count):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    # the urls share a template per host, which would mostly be dropped as traps
+    config.trap_template_limit = count
+    urls = synthetic_urls(count)
+    results = {store: bench_store(config, store, urls)
+               for store in ("shelve", "journal")}
+    for store, rate in results.items():
+        print(f"{store:>8}: {rate:12.0f} adds/sec")
+    print(f" speedup: {results['journal'] / results['shelve']:12.1f}x")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=20000)
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    args = parser.parse_args()
+    main(args.config_file, args.urls)
@@ -0,0 +1,75 @@
+''' Measures how page analysis in the pipeline engine scales with processes.
+
+    Runs scraper.analyzeResponse over pickled responses (as PipelineWorker
+    hands them to its pool) in a spawned ProcessPoolExecutor for each process
+    count, keeping at most 4 pages per process in flight, and compares with
+    analyzing the same pages in this process. Prints pages/sec for each.
+
+    python -m benchmarks.parse_pool [--pages N] [--processes 1,2,4]
+'''
+import multiprocessing
+import os
+import pickle
+import time
+
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+import scraper
+from benchmarks.extract import synthetic_corpus
+from crawler.dedup import fingerprint
+
+
+def pickled_responses(count):
+    pages = []
+    for i, content in enumerate(synthetic_corpus(count)):
+        raw = requests.Response()
+        raw.url = f"https://www.ics.uci.edu/page/{i}"
+        raw.status_code = 200
+        raw._content = content
+        raw.headers["Content-Type"] = "text/html; charset=utf-8"
+        pages.append(pickle.dumps(raw))
+    return pages
+
+
+def run_pool(pages, processes):
+    with ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn")) as pool:
+        # start the processes and import the scraper before timing
+        list(pool.map(scraper.analyzeResponse, pages[:processes]))
+        start = time.perf_counter()
+        pending = deque()
+        for page in pages:
+            if len(pending) >= 4 * processes:
+                pending.popleft().result()
+            pending.append(pool.submit(scraper.analyzeResponse, page, fingerprint))
+        while pending:
+            pending.popleft().result()
+        return len(pages) / (time.perf_counter() - start)
+
+
+def main(count, process_counts):
+    pages = pickled_responses(count)
+    start = time.perf_counter()
+    for page in pages:
+        scraper.analyzeResponse(page, fingerprint)
+    inline_rate = len(pages) / (time.perf_counter() - start)
+    print(f"{os.cpu_count()} cores")
+    print(f"  in process: {inline_rate:8.1f} pages/sec")
+    for processes in process_counts:
+        rate = run_pool(pages, processes)
+        print(f"{processes:3d} processes: {rate:8.1f} pages/sec ({rate / inline_rate:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--processes", type=str, default=None)
+    args = parser.parse_args()
+    counts = ([int(n) for n in args.processes.split(",")] if args.processes
+              else sorted({1, 2, os.cpu_count() or 1}))
+    main(args.pages, counts)
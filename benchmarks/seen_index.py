@@ -0,0 +1,58 @@
+''' Reports memory per url and lookup throughput of the seen-url index.
+
+    python -m benchmarks.seen_index [--sizes 1000000,10000000] [--bloom]
+'''
+import sys
+import time
+
+from argparse import ArgumentParser
+from hashlib import sha256
+
+from crawler.seen import SeenIndex
+
+
+def urlhash(i):
+    return sha256(f"https://sub{i % 97}.ics.uci.edu/page/{i}".encode()).hexdigest()
+
+
+def bench(size, bloom, lookups=1000000):
+    index = SeenIndex(bloom_capacity=size if bloom else 0)
+    start = time.perf_counter()
+    for i in range(size):
+        index.add(urlhash(i))
+    add_secs = time.perf_counter() - start
+
+    lookups = min(lookups, size)
+    hits = [urlhash(i) for i in range(0, size, size // lookups)][:lookups]
+    misses = [urlhash(size + i) for i in range(lookups)]
+    start = time.perf_counter()
+    found = sum(1 for h in hits if h in index)
+    hit_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    false_hits = sum(1 for h in misses if h in index)
+    miss_secs = time.perf_counter() - start
+    assert found == lookups
+
+    print(f"{size:>10} urls{' +bloom' if bloom else ''}: "
+          f"{index.nbytes / size:6.1f} bytes/url, "
+          f"{size / add_secs:10.0f} adds/sec, "
+          f"{lookups / hit_secs:10.0f} hit lookups/sec, "
+          f"{lookups / miss_secs:10.0f} miss lookups/sec, "
+          f"{false_hits} false hits")
+
+
+def set_bytes_per_url(size=100000):
+    ''' Memory of the python set of hex urlhashes it replaces, for reference. '''
+    hashes = {urlhash(i) for i in range(size)}
+    total = sys.getsizeof(hashes) + sum(sys.getsizeof(h) for h in hashes)
+    return total / size
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--sizes", type=str, default="1000000,10000000")
+    parser.add_argument("--bloom", action="store_true", default=False)
+    args = parser.parse_args()
+    print(f"set of hex urlhashes: {set_bytes_per_url():6.1f} bytes/url")
+    for size in map(int, args.sizes.split(",")):
+        bench(size, args.bloom)
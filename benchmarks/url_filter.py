@@ -0,0 +1,99 @@
+''' Compares scraper.filter_valid with the is_valid it replaced, which built
+    sets, ran parse_qsl and matched a ".*\\.(...)$" regex on every call.
+
+    Both must accept exactly the same urls. Prints urls/sec for both. Pass a
+    file with one url per line (e.g. the urls of a past crawl) with --urls,
+    otherwise a synthetic mix of the links found on the ics.uci.edu sites is
+    used.
+
+    python -m benchmarks.url_filter [--urls urls.txt] [--count N]
+'''
+import random
+import re
+import sys
+import time
+
+from argparse import ArgumentParser
+from urllib.parse import urlparse, parse_qsl
+
+import scraper
+
+
+def legacy_is_valid(url):
+    ''' scraper.is_valid before the rules were compiled into UrlFilter. '''
+    parsed = urlparse(url)
+    if parsed.scheme not in set(["http", "https"]):
+        return False
+    if not (parsed.netloc.endswith('.ics.uci.edu')) and \
+        not (parsed.netloc.endswith('.cs.uci.edu')) and \
+            not (parsed.netloc.endswith('.informatics.uci.edu')) and \
+                not (parsed.netloc.endswith('.stat.uci.edu')) and \
+                    not (parsed.netloc == 'today.uci.edu' and parsed.path.startswith('/department/information_computer_sciences/')):
+        return False
+    if any(suffix in parsed.query for suffix in ['ical', 'png', 'jpg', 'gif', 'pdf', 'facebook', 'zip','twitter', 'difftype', 'filter', 'odc', 'replyto']) or url.endswith('.Z'):
+        return False
+    if len(parse_qsl(parsed.query)) > 5:
+        return False
+    return not re.match(
+        r".*\.(css|js|bmp|gif|jpe?g|ico"
+        + r"|png|tiff?|mid|mp2|mp3|mp4"
+        + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
+        + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
+        + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
+        + r"|epub|dll|cnf|tgz|sha1"
+        + r"|thmx|mso|arff|rtf|jar|csv"
+        + r"|ics|ical|ifb|pptx|ppsx|odc|war"
+        + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
+
+
+HOSTS = ["www.ics.uci.edu", "ics.uci.edu", "vision.ics.uci.edu", "www.cs.uci.edu",
+         "www.informatics.uci.edu", "www.stat.uci.edu", "today.uci.edu",
+         "www.uci.edu", "evoke.ics.uci.edu:8080", "github.com", "www.facebook.com"]
+PATHS = ["/", "/about", "/~eppstein/pubs/", "/people/faculty.html", "/a/b/c/",
+         "/files/report.PDF", "/img/logo.png", "/data.tar.gz", "/paper.ps.Z",
+         "/wiki/doku.php", "/department/information_computer_sciences/news",
+         "/x.pdf/view", "/page;jsessionid=1.png", "/events/2019-05-01"]
+QUERIES = ["", "", "", "id=3", "do=diff&difftype=sidebyside", "a=1&b=2&c=3&d=4&e=5&f=6",
+           "a=1&b=&c=3&d=4&e=5&f=", "share=facebook", "format=ical", "p=12&replytocom=5",
+           "s=x&&t=y", "q=%20a+b", "tab_files=1&tab_details=1&filter=year"]
+
+
+def synthetic_urls(count, seed=0):
+    rng = random.Random(seed)
+    urls = []
+    for _ in range(count):
+        query = rng.choice(QUERIES)
+        url = f"{rng.choice(['https', 'http', 'https', 'mailto'])}://{rng.choice(HOSTS)}{rng.choice(PATHS)}"
+        urls.append(url + ("?" + query if query else ""))
+    return urls
+
+
+def load_urls(path):
+    with open(path) as url_file:
+        return [line.strip() for line in url_file if line.strip()]
+
+
+def main(path, count):
+    urls = load_urls(path) if path else synthetic_urls(count)
+
+    start = time.perf_counter()
+    reference = [url for url in urls if legacy_is_valid(url)]
+    legacy_rate = len(urls) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    results = scraper.filter_valid(urls)
+    rate = len(urls) / (time.perf_counter() - start)
+
+    print(f"   is_valid (old): {legacy_rate:10.0f} urls/sec")
+    print(f"filter_valid:      {rate:10.0f} urls/sec ({rate / legacy_rate:.1f}x)")
+    print(f"parity: {len(reference)} valid urls before, {len(results)} after, "
+          f"{'identical' if reference == results else 'DIFFERENT'}")
+    return 0 if reference == results else 1
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=str, default=None)
+    parser.add_argument("--count", type=int, default=200000)
+    args = parser.parse_args()
+    sys.exit(main(args.urls, args.count))
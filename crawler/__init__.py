@@ -1,22 +1,27 @@
-from utils import get_logger
+from utils import get_logger, set_log_level
+from utils.metrics import metrics
 from crawler.frontier import Frontier
 from crawler.worker import Worker
 from crawler.reporter import Reporter
 
-import nltk
-
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
         self.config = config
+        set_log_level(config.log_level)
         self.logger = get_logger("CRAWLER")
         self.frontier = frontier_factory(config, restart)
         self.workers = list()
         self.worker_factory = worker_factory
-        self.reporter = Reporter(restart)
-
-        nltk.download('punkt')
+        # the frontier completes crawled urls once the stats of their pages are saved
+        self.reporter = Reporter(config, restart, on_save=self.frontier.commit)
 
     def start_async(self):
+        if self.config.metrics_port:
+            metrics.serve(self.config.metrics_port)
+            self.logger.info(
+                f"Serving metrics on http://127.0.0.1:{self.config.metrics_port}/metrics")
+        if self.config.metrics_file:
+            metrics.dump_every(self.config.metrics_file, self.config.metrics_interval)
         self.workers = [
             self.worker_factory(worker_id, self.config, self.frontier, self.reporter)
             for worker_id in range(self.config.threads_count)]
@@ -30,5 +35,9 @@ class Crawler(object):
     def join(self):
         for worker in self.workers:
             worker.join()
+        self.reporter.close()
+        self.frontier.close()
+        if self.config.metrics_file:
+            metrics.dump(self.config.metrics_file)
 
     
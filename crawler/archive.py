@@ -0,0 +1,149 @@
+''' Fetched pages, kept so the scraper can be rerun on them without crawling
+    again (see reprocess.py).
+
+    The archive is a directory of segment files of at most ARCHIVE_SEGMENT_MB
+    each. Every page is one record: a line of JSON with its url, final url,
+    status and headers, then its body, compressed on its own as one gzip
+    member or zstd frame, so a record can be read from its offset alone.
+    Next to each segment, an index holds a line of "offset length url" per
+    record. A crawl always starts a new segment, so segments are never
+    appended to after a crash.
+'''
+import gzip
+import json
+import mmap
+import os
+import zlib
+
+from collections import namedtuple
+from threading import Lock
+
+from utils import get_logger
+
+
+# a page as it was downloaded: the url crawled, the url the cache server
+# fetched, the status, the response headers and the body
+ArchivedPage = namedtuple("ArchivedPage", ["url", "final_url", "status", "headers", "content"])
+
+SEGMENT = "segment-{:05d}.{}"
+
+
+def _codec(compression):
+    ''' Returns (compress, decompress) for ARCHIVE_COMPRESSION. '''
+    if compression == "gzip":
+        return (lambda data: gzip.compress(data, compresslevel=6),
+                lambda data: zlib.decompress(data, 31))
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("ARCHIVE_COMPRESSION = zstd needs the zstandard package")
+        return (zstandard.ZstdCompressor().compress,
+                zstandard.ZstdDecompressor().decompress)
+    raise ValueError(f"Unknown ARCHIVE_COMPRESSION {compression}, use gzip or zstd")
+
+
+def encode(page):
+    header = json.dumps({
+        "url": page.url, "final_url": page.final_url,
+        "status": page.status, "headers": page.headers})
+    return header.encode() + b"\n" + page.content
+
+
+def decode(record):
+    header, _, content = record.partition(b"\n")
+    header = json.loads(header)
+    return ArchivedPage(header["url"], header["final_url"], header["status"],
+                        header["headers"], content)
+
+
+def segments(directory):
+    ''' Paths of the archive's segments, oldest first. '''
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith("segment-") and not name.endswith(".idx"))
+
+
+def read_index(segment):
+    ''' (offset, length, url) of each complete record of segment. '''
+    size = os.path.getsize(segment)
+    entries = []
+    with open(segment + ".idx", "rb") as index:
+        for line in index:
+            parts = line.rstrip(b"\n").split(b" ", 2)
+            if not line.endswith(b"\n") or len(parts) != 3:
+                break       # cut off by a crash
+            offset, length = int(parts[0]), int(parts[1])
+            if offset + length > size:
+                break
+            entries.append((offset, length, parts[2].decode()))
+    return entries
+
+
+def read_records(segment, entries=None):
+    ''' Yields the ArchivedPage of each index entry of segment, or of every
+        record, reading the segment through mmap. '''
+    decompress = _codec(segment.rsplit(".", 1)[1])[1]
+    if entries is None:
+        entries = read_index(segment)
+    if not entries:
+        return
+    with open(segment, "rb") as segment_file, \
+            mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for offset, length, _ in entries:
+            yield decode(decompress(data[offset:offset + length]))
+
+
+class PageArchive(object):
+    ''' Appends pages to the segments in directory, from any thread. '''
+    def __init__(self, directory, segment_size, compression="gzip", restart=False):
+        self.logger = get_logger("ARCHIVE")
+        self.directory = directory
+        self.segment_size = segment_size
+        self.compression = compression
+        self.compress = _codec(compression)[0]
+        self.lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+        if restart:
+            for path in segments(directory):
+                os.remove(path)
+                if os.path.exists(path + ".idx"):
+                    os.remove(path + ".idx")
+        existing = segments(directory)
+        self.number = int(os.path.basename(existing[-1]).split("-")[1].split(".")[0]) + 1 \
+            if existing else 0
+        self.segment = None
+        self.index = None
+        self.pages = 0
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, SEGMENT.format(self.number, self.compression))
+        self.number += 1
+        self.segment = open(path, "ab")
+        self.index = open(path + ".idx", "ab")
+
+    def _close_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.index.close()
+            self.segment = self.index = None
+
+    def append(self, page):
+        record = self.compress(encode(page))
+        with self.lock:
+            if self.segment is None or self.segment.tell() + len(record) > self.segment_size:
+                self._close_segment()
+                self._open_segment()
+            offset = self.segment.tell()
+            self.segment.write(record)
+            # the record is written out before the index entry pointing to it
+            self.segment.flush()
+            self.index.write(f"{offset} {len(record)} {page.url}\n".encode())
+            self.pages += 1
+
+    def close(self):
+        with self.lock:
+            self._close_segment()
+        self.logger.info(f"Archived {self.pages} pages in {self.directory}.")
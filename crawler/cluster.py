@@ -0,0 +1,248 @@
+from bisect import bisect
+from hashlib import sha1
+from multiprocessing.connection import Listener, Client, AuthenticationError
+from threading import Thread, Event, Lock
+from urllib.parse import urlparse
+
+from crawler.frontier import Frontier
+from utils import get_logger, get_urlhash, canonicalize
+from utils.metrics import metrics
+
+
+def configure_node(config, node_id):
+    ''' Gives node node_id of the cluster its own save file, stats and report,
+        so that several nodes can run in one directory. '''
+    config.node_id = node_id
+    suffix = f".node{node_id}"
+    config.save_file += suffix
+    config.stats_file += suffix
+    config.report_file += suffix
+    if config.archive_dir:
+        config.archive_dir += suffix
+    if config.history_file:
+        config.history_file += suffix
+    return config
+
+
+class HashRing(object):
+    ''' Consistent hashing of netlocs onto nodes. Each node owns replicas
+        points on the ring, so hosts spread evenly and a change in the number
+        of nodes only moves the hosts next to the added or removed points. '''
+    def __init__(self, nodes, replicas=64):
+        self.points = sorted(
+            (self._hash(f"{node}#{i}"), node)
+            for node in nodes for i in range(replicas))
+        self.keys = [point for point, _ in self.points]
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(sha1(key.encode()).digest()[:8], "big")
+
+    def owner(self, netloc):
+        index = bisect(self.keys, self._hash(netloc)) % len(self.keys)
+        return self.points[index][1]
+
+
+class ClusterFrontier(Frontier):
+    ''' The shard of a crawl across CLUSTER NODES owned by this node: the
+        hosts the HashRing assigns to config.node_id.
+
+        Urls of other nodes' hosts are batched per node and sent to them
+        over multiprocessing connections, every FLUSH_INTERVAL seconds or
+        once BATCH_SIZE are waiting. Since each host has one owner, its
+        politeness, robots.txt and trap counts stay on one node. Each node
+        saves and checkpoints only its own shard, plus the urls it has not
+        sent yet: they are saved as pending until their owner has saved
+        them, and go back to the outbox when the node resumes.
+
+        A node running out of urls waits instead of stopping, as other
+        nodes may still send it some. Node 0 polls every node for whether it
+        is idle and how many urls it sent and received, and stops the
+        cluster once two polls in a row find every node idle with the same
+        counts and as many urls received as sent. '''
+    def __init__(self, config, restart):
+        self.node_id = config.node_id
+        self.peers = config.cluster_nodes       # (host, port) of each node id
+        self.ring = HashRing(range(len(self.peers)))
+        self.authkey = config.cluster_authkey.encode()
+        self.outbox = {
+            node: list() for node in range(len(self.peers))
+            if node != self.node_id}
+        self.sent = 0
+        self.received = 0
+        self.stopped = False
+        self.closing = Event()
+        self.flush_now = Event()
+        self.connections = dict()       # node -> Client connection
+        self.send_lock = Lock()
+        super().__init__(config, restart)
+
+        self.cluster_logger = get_logger(f"CLUSTER-{self.node_id}", "CLUSTER")
+        metrics.gauge("cluster_urls_sent", lambda: self.sent)
+        metrics.gauge("cluster_urls_received", lambda: self.received)
+        metrics.gauge("cluster_outbox_urls", lambda: sum(map(len, self.outbox.values())))
+        self.listener = Listener(self.peers[self.node_id], authkey=self.authkey)
+        Thread(target=self._accept, daemon=True).start()
+        Thread(target=self._forward, daemon=True).start()
+        if self.node_id == 0:
+            Thread(target=self._coordinate, daemon=True).start()
+
+    def add_urls(self, links, depth=0):
+        local = []
+        remote = []
+        for url, urlhash in links:
+            owner = self.ring.owner(urlparse(url).netloc)
+            if owner == self.node_id:
+                local.append((url, urlhash))
+            else:
+                remote.append((owner, url, urlhash))
+        if local:
+            super().add_urls(local, depth)
+        if not remote:
+            return
+        with self.lock:
+            for owner, url, urlhash in remote:
+                # saved before the page that found it is completed
+                if self.seen.add(urlhash):
+                    self.save[urlhash] = (url, False)
+                    self._forward_url(owner, url, depth)
+
+    def _forward_url(self, owner, url, depth):
+        self.outbox[owner].append((url, depth))
+        if len(self.outbox[owner]) >= self.config.cluster_batch_size:
+            self.flush_now.set()
+
+    def _enqueue(self, url, depth=0):
+        # pending urls of other nodes' hosts are the outbox of a resumed node
+        owner = self.ring.owner(urlparse(url).netloc)
+        if owner == self.node_id:
+            super()._enqueue(url, depth)
+        else:
+            self._forward_url(owner, url, depth)
+
+    def _pending(self):
+        return super()._pending() + [
+            entry for urls in self.outbox.values() for entry in urls]
+
+    def _finished(self):
+        return not self.in_progress and self.stopped
+
+    def status(self):
+        ''' Returns (idle, urls sent, urls received) of this node. '''
+        with self.lock:
+            idle = (not self.host_queues and not self.in_progress
+                    and not any(self.outbox.values()))
+            return idle, self.sent, self.received
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            self.has_work.notify_all()
+
+    def _send(self, node, message):
+        ''' Sends message to node, returning its reply. '''
+        with self.send_lock:
+            conn = self.connections.get(node)
+            if conn is None:
+                conn = self.connections[node] = Client(
+                    self.peers[node], authkey=self.authkey)
+            try:
+                conn.send(message)
+                if message[0] != "stop":
+                    return conn.recv()
+            except (OSError, EOFError):
+                del self.connections[node]
+                conn.close()
+                raise
+
+    def flush(self):
+        ''' Sends the urls waiting for each other node, and completes them
+            once the node has saved them. They stay in the outbox until then,
+            for the next flush if the node cannot be reached. '''
+        for node in self.outbox:
+            with self.lock:
+                urls = list(self.outbox[node])
+            if not urls:
+                continue
+            try:
+                self._send(node, ("urls", urls))
+            except (OSError, EOFError) as err:
+                self.cluster_logger.warning(f"Could not send urls to node {node}: {err}")
+                continue
+            with self.lock:
+                del self.outbox[node][:len(urls)]
+                self.sent += len(urls)
+                for url, _ in urls:
+                    self.save[get_urlhash(url)] = (url, True)
+
+    def _forward(self):
+        while not self.closing.is_set():
+            self.flush_now.wait(self.config.cluster_flush_interval)
+            self.flush_now.clear()
+            self.flush()
+
+    def _receive(self, urls):
+        with self.lock:
+            for url, depth in urls:
+                link = canonicalize(url)
+                if link is not None:
+                    super().add_urls([link], depth)
+            self.received += len(urls)
+        # the sender completes them once this returns
+        self.save.flush()
+
+    def _accept(self):
+        while not self.closing.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                continue
+            Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (OSError, EOFError):
+                    return
+                if message[0] == "urls":
+                    self._receive(message[1])
+                    conn.send(True)
+                elif message[0] == "status":
+                    conn.send(self.status())
+                elif message[0] == "stop":
+                    self.cluster_logger.info("Crawl finished on every node, stopping.")
+                    self.stop()
+
+    def _coordinate(self):
+        previous = None
+        while not self.closing.wait(self.config.cluster_flush_interval):
+            try:
+                statuses = [self.status()] + [
+                    self._send(node, ("status",)) for node in self.outbox]
+            except (OSError, EOFError):
+                # a node is not up yet, or gone
+                previous = None
+                continue
+            if (statuses == previous and all(idle for idle, _, _ in statuses)
+                    and sum(sent for _, sent, _ in statuses)
+                    == sum(received for _, _, received in statuses)):
+                self.cluster_logger.info("Crawl finished on every node, stopping.")
+                for node in self.outbox:
+                    try:
+                        self._send(node, ("stop",))
+                    except (OSError, EOFError):
+                        pass
+                self.stop()
+                return
+            previous = statuses
+
+    def close(self):
+        self.closing.set()
+        self.flush_now.set()
+        self.listener.close()
+        with self.send_lock:
+            for conn in self.connections.values():
+                conn.close()
+        super().close()
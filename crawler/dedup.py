@@ -0,0 +1,133 @@
+from collections import Counter
+from functools import lru_cache
+from hashlib import blake2b
+from threading import Lock
+
+
+LANE = 32       # bits per counter when summing the bits of 64-bit feature hashes
+SHINGLE = 3     # words per feature, single words would make every page with
+                # the same common words look alike
+
+
+def _byte_lanes():
+    ''' Spreads each bit of a byte into its own LANE-bit counter. '''
+    table = []
+    for byte in range(256):
+        lanes = 0
+        for bit in range(8):
+            if byte >> bit & 1:
+                lanes |= 1 << (LANE * bit)
+        table.append(lanes)
+    return table
+
+BYTE_LANES = _byte_lanes()
+
+
+@lru_cache(maxsize=1 << 16)
+def _feature_lanes(feature):
+    lanes = 0
+    for i, byte in enumerate(blake2b(feature.encode(), digest_size=8).digest()):
+        lanes |= BYTE_LANES[byte] << (8 * LANE * i)
+    return lanes
+
+
+def shingles(words):
+    ''' Counts the runs of SHINGLE consecutive words. '''
+    if len(words) < SHINGLE:
+        return Counter([" ".join(words)])
+    return Counter(map(" ".join, zip(*(words[i:] for i in range(SHINGLE)))))
+
+
+def simhash(features):
+    ''' 64-bit SimHash of a mapping of feature -> count, each feature weighted
+        by its count. The 64 per-bit sums are added at once, one LANE-bit
+        counter per bit of a big integer, instead of bit by bit. '''
+    lanes = 0
+    total = 0
+    for feature, count in features.items():
+        lanes += count * _feature_lanes(feature)
+        total += count
+    mask = (1 << LANE) - 1
+    fingerprint = 0
+    for bit in range(64):
+        if 2 * (lanes >> (LANE * bit) & mask) > total:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def content_hash(text):
+    ''' 64-bit hash of a page's text, ignoring differences in whitespace. '''
+    return int.from_bytes(
+        blake2b(" ".join(text.split()).encode(), digest_size=8).digest(), "little")
+
+
+def fingerprint(text, words):
+    ''' Returns the content hash and SimHash DuplicateIndex.add takes, for a page
+        with this text and words. Needs no index, so it can run in another process. '''
+    return content_hash(text), simhash(shingles(words))
+
+
+class DuplicateIndex(object):
+    ''' Content hashes and SimHashes of the pages crawled so far, shared by
+        every worker.
+
+        A page is an exact duplicate if its text hash was seen, and a near
+        duplicate if a SimHash of its word shingles within distance bits was
+        seen. SimHashes are split into distance + 1 bands, so any two within
+        distance bits agree on at least one band and a lookup only compares
+        the fingerprints in one bucket per band. '''
+    def __init__(self, distance=3):
+        self.distance = distance
+        count = distance + 1
+        self.bands = []     # (shift, mask) of each band
+        start = 0
+        for i in range(count):
+            width = (64 - start) // (count - i)
+            self.bands.append((start, (1 << width) - 1))
+            start += width
+        self.buckets = [dict() for _ in self.bands]     # band value -> fingerprints
+        self.hashes = set()
+        self.new = []       # (content hash, simhash) added since take_new
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _near(self, fingerprint):
+        for (shift, mask), buckets in zip(self.bands, self.buckets):
+            for other in buckets.get(fingerprint >> shift & mask, ()):
+                if bin(fingerprint ^ other).count("1") <= self.distance:
+                    return True
+        return False
+
+    def _add(self, page_hash, fingerprint):
+        self.hashes.add(page_hash)
+        for (shift, mask), buckets in zip(self.bands, self.buckets):
+            buckets.setdefault(fingerprint >> shift & mask, []).append(fingerprint)
+
+    fingerprint = staticmethod(fingerprint)
+
+    def add(self, page_hash, fingerprint):
+        ''' Returns "exact" or "near" if the page with this content hash and
+            SimHash (see fingerprint) duplicates a page seen before, otherwise
+            adds it to the index and returns None. '''
+        with self.lock:
+            if page_hash in self.hashes:
+                return "exact"
+            if self._near(fingerprint):
+                return "near"
+            self._add(page_hash, fingerprint)
+            self.new.append((page_hash, fingerprint))
+        return None
+
+    def load(self, pages):
+        ''' Adds saved (content hash, simhash) pairs. '''
+        with self.lock:
+            for page_hash, fingerprint in pages:
+                self._add(page_hash, fingerprint)
+
+    def take_new(self):
+        ''' Returns the pages added since the last call, for saving. '''
+        with self.lock:
+            new, self.new = self.new, []
+        return new
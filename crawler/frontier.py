@@ -1,18 +1,74 @@
 import os
-import shelve
+import pickle
+import time
 
-from threading import Thread, RLock
-from queue import Queue, Empty
+from hashlib import sha256
+from inspect import getsource
+from itertools import count
+from heapq import heappush, heappop, nlargest
+from threading import Lock, RLock, Condition
+from urllib.parse import urlparse
 
-from utils import get_logger, get_urlhash, normalize
-from scraper import is_valid
+from crawler.hosts import HostMonitor
+from crawler.priority import Priority, parse_weights
+from crawler.robots import RobotsCache
+from crawler.seen import SeenIndex
+from crawler.spill import SpillStore
+from crawler.store import open_store
+from crawler.traps import TrapDetector
+from utils import get_logger, get_urlhash, canonicalize
+from utils.metrics import metrics
+import scraper
+from scraper import filter_valid
 
 class Frontier(object):
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
-        self.to_be_downloaded = list()
-        
+
+        # One heap of (score, order, url, depth) per netloc, best url first.
+        # A host with queued urls that is not being fetched waits in
+        # waiting_hosts, a heap of (ready time, netloc), until its politeness
+        # window ends, then moves to ready_hosts, a heap of (score, order,
+        # netloc) by the score of its best url plus its own. Entries of
+        # ready_hosts whose score is no longer the host's are skipped.
+        # Past FRONTIER_MEMORY_URLS queued urls, the worst urls of the
+        # longest queues are spilled to disk (see _spill), and read back once
+        # they hold the host's best url, so a host's heap always starts
+        # with its best url.
+        self.lock = RLock()
+        self.has_work = Condition(self.lock)
+        self.priority = Priority(parse_weights(config.priority))
+        self.order = count()            # breaks ties first in, first out
+        self.host_queues = dict()
+        self.waiting_hosts = list()
+        self.ready_hosts = list()
+        self.ready_scores = dict()      # netloc -> its score in ready_hosts
+        self.next_allowed = dict()      # netloc -> earliest time of next fetch
+        self.host_delays = dict()       # netloc -> Crawl-delay from robots.txt
+        self.active_hosts = dict()      # netloc -> url currently handed out
+        self.active_depths = dict()     # netloc -> depth of that url
+        self.in_progress = 0
+        # url -> depth of urls crawled but not yet complete in the save file
+        self.uncommitted = dict()
+        self.queued_in_memory = 0
+        self.memory_cap = config.frontier_memory_urls
+        self.spill = SpillStore(config.save_file + ".spill", config.frontier_hot_urls)
+        # spilled urls completed after the snapshot they were restored from
+        self.completed_spilled = set()
+        # spilled urls of segments below this are checked by the filter again
+        self.revalidate_below = 0
+        self.completed_since_checkpoint = 0
+        self.checkpoint_lock = Lock()
+        # Every urlhash ever added, so that adds never probe the save file.
+        self.seen = SeenIndex(bloom_capacity=self.config.seen_bloom_capacity)
+        self.snapshot_file = self.config.save_file + ".snapshot"
+        self.robots = RobotsCache(self.config, on_crawl_delay=self.set_host_delay)
+        self.traps = TrapDetector(self.config)
+        self.hosts = HostMonitor(self.config)
+        # Pending urls in a snapshot are re-validated if the filter changed.
+        self.filter_version = sha256(getsource(scraper).encode()).hexdigest()
+
         if not os.path.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
             self.logger.info(
@@ -23,50 +79,427 @@ class Frontier(object):
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
             os.remove(self.config.save_file)
+        if restart and os.path.exists(self.snapshot_file):
+            os.remove(self.snapshot_file)
+        if restart:
+            self.spill.clear()
         # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
+        self.save = open_store(self.config, restart)
         if restart:
             for url in self.config.seed_urls:
                 self.add_url(url)
         else:
             # Set the frontier state with contents of save file.
-            self._parse_save_file()
-            if not self.save:
+            start = time.perf_counter()
+            with self.lock:
+                source = "snapshot"
+                if not self._load_snapshot():
+                    source = "full scan"
+                    self._parse_save_file()
+            self.logger.info(
+                f"Restored frontier by {source} in "
+                f"{time.perf_counter() - start:.3f}s.")
+            if not self.seen:
                 for url in self.config.seed_urls:
                     self.add_url(url)
 
+        metrics.gauge("frontier_queued_urls", self.queued_count)
+        metrics.gauge("frontier_queued_hosts", lambda: len(self.host_queues))
+        metrics.gauge("frontier_in_progress", lambda: self.in_progress)
+        metrics.gauge("frontier_seen_urls", lambda: len(self.seen))
+        metrics.gauge("frontier_trap_rejected", lambda: self.traps.rejected)
+        metrics.gauge("frontier_host_backlog", self.host_backlog)
+        metrics.gauge("hosts_paused", self.hosts.open_circuits)
+        metrics.gauge("hosts_slowest_seconds", self.hosts.slowest)
+
+    def queued_count(self):
+        with self.lock:
+            return self.queued_in_memory + self.spill.total
+
+    def host_backlog(self, count=10):
+        ''' Queued urls of the count hosts with the most. '''
+        with self.lock:
+            return dict(nlargest(
+                count, ((netloc, len(queue) + self.spill.counts.get(netloc, 0))
+                        for netloc, queue in self.host_queues.items()),
+                key=lambda item: item[1]))
+
     def _parse_save_file(self):
-        ''' This function can be overridden for alternate saving techniques. '''
-        total_count = len(self.save)
-        tbd_count = 0
-        for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                tbd_count += 1
+        ''' This function can be overridden for alternate saving techniques.
+            The save file does not keep depths, so every pending url restarts
+            at depth 0. '''
+        self.spill.clear()
+        pending = dict()
+        for urlhash, url, completed in self.save.records():
+            if self.seen.add(urlhash):
+                self.traps.admit(url)
+            if completed:
+                pending.pop(urlhash, None)
+            else:
+                pending[urlhash] = url
+        total_count = len(self.seen)
+        tbd_urls = filter_valid(pending.values())
+        for url in tbd_urls:
+            self._enqueue(url)
+        tbd_count = len(tbd_urls)
         self.logger.info(
             f"Found {tbd_count} urls to be downloaded from {total_count} "
             f"total urls discovered.")
 
-    def get_tbd_url(self):
+    def _load_snapshot(self):
+        ''' Restores the seen index and pending urls from the last checkpoint
+            and replays the save file records written after it. Returns False
+            if there is no usable snapshot. '''
+        if not os.path.exists(self.snapshot_file):
+            return False
         try:
-            return self.to_be_downloaded.pop()
-        except IndexError:
-            return None
+            with open(self.snapshot_file, "rb") as snapshot_file:
+                snapshot = pickle.load(snapshot_file)
+        except (OSError, EOFError, pickle.UnpicklingError) as err:
+            self.logger.warning(f"Ignoring unreadable snapshot: {err}")
+            return False
+        tail = self.save.records_since(snapshot["marker"])
+        if tail is None:
+            self.logger.info("Snapshot is older than the save file, ignoring it.")
+            return False
 
-    def add_url(self, url):
-        url = normalize(url)
-        urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
-            self.save.sync()
-            self.to_be_downloaded.append(url)
-    
-    def mark_url_complete(self, url):
+        self.seen = SeenIndex.from_bytes(
+            snapshot["seen"], snapshot["seen_count"],
+            bloom_capacity=self.config.seen_bloom_capacity)
+        self.traps.restore(snapshot.get("traps", ()))
+        self.priority.restore(snapshot.get("priority", {}))
+        self.spill.restore(snapshot.get("spill"))
+        self.completed_spilled = set(snapshot.get("spill_completed", ()))
+        # url -> depth; snapshots of older versions kept only urls
+        pending = dict(
+            entry if isinstance(entry, tuple) else (entry, 0)
+            for entry in snapshot["pending"])
+        replayed = 0
+        for urlhash, url, completed in tail:
+            if self.seen.add(urlhash):
+                self.traps.admit(url)
+            if completed:
+                if pending.pop(url, None) is None and self.spill.total:
+                    self.completed_spilled.add(url)
+            else:
+                # the save file does not keep depths
+                pending.setdefault(url, 0)
+            replayed += 1
+        revalidate = snapshot["filter_version"] != self.filter_version
+        tbd_urls = filter_valid(pending) if revalidate else list(pending)
+        if revalidate:
+            self.revalidate_below = self.spill.number
+        for url in tbd_urls:
+            self._enqueue(url, pending[url])
+        for netloc in list(self.spill.runs):
+            self._refill(netloc)
+        tbd_count = len(tbd_urls) + self.spill.total
+        self.logger.info(
+            f"Found {tbd_count} urls to be downloaded from {len(self.seen)} "
+            f"total urls discovered ({replayed} records after the snapshot"
+            f"{', filter changed' if revalidate else ''}).")
+        return True
+
+    def checkpoint(self):
+        ''' Writes a snapshot of the seen index and pending urls, tied to the
+            current position of the save file. '''
+        # Held from taking the snapshot to writing it, so that snapshots
+        # are written in the order they were taken.
+        with self.checkpoint_lock, metrics.timer("checkpoint"):
+            with self.lock:
+                marker = self.save.marker()
+                if marker is None:
+                    # no snapshot refers to spilled segments
+                    self.spill.remove(self.spill.take_spent())
+                    return
+                snapshot = {
+                    "marker": marker,
+                    "filter_version": self.filter_version,
+                    "seen": self.seen.to_bytes(),
+                    "seen_count": len(self.seen),
+                    "pending": self._pending(),
+                    "traps": self.traps.state(),
+                    "priority": self.priority.state(),
+                    "spill": self.spill.state(),
+                    "spill_completed": list(self.completed_spilled),
+                }
+                spent = self.spill.take_spent()
+                self.completed_since_checkpoint = 0
+            tmp_file = self.snapshot_file + ".tmp"
+            with open(tmp_file, "wb") as snapshot_file:
+                pickle.dump(snapshot, snapshot_file, pickle.HIGHEST_PROTOCOL)
+                snapshot_file.flush()
+                os.fsync(snapshot_file.fileno())
+            os.replace(tmp_file, self.snapshot_file)
+            self.spill.remove(spent)
+
+    def _pending(self):
+        ''' The (url, depth) of every url being crawled, not yet committed or
+            queued in memory, in crawl order, so that a restart keeps the
+            order of ties. '''
+        return list(self.uncommitted.items()) + [
+            (url, self.active_depths[netloc])
+            for netloc, url in self.active_hosts.items()] + [
+            (url, depth) for queue in self.host_queues.values()
+            for _, _, url, depth in sorted(queue)]
+
+    def _enqueue(self, url, depth=0):
+        ''' Adds url to its host queue, scheduling the host if it was idle. '''
+        netloc = urlparse(url).netloc
+        queue = self.host_queues.get(netloc)
+        if queue is None:
+            queue = self.host_queues[netloc] = list()
+        entry = (self.priority.url_score(url, depth), next(self.order), url, depth)
+        heappush(queue, entry)
+        self.queued_in_memory += 1
+        if netloc not in self.active_hosts:
+            if len(queue) == 1:
+                self._schedule(netloc)
+            elif queue[0] is entry and netloc in self.ready_scores:
+                # the host's best url changed while it was ready
+                self._make_ready(netloc)
+        if self.memory_cap and self.queued_in_memory > self.memory_cap:
+            self._spill()
+
+    def _spill(self):
+        ''' Moves the worst urls of the longest host queues to disk, keeping
+            FRONTIER_HOT_URLS of each, then a single one if that is not enough,
+            until a quarter of FRONTIER_MEMORY_URLS is free. '''
+        target = self.memory_cap * 3 // 4
+        longest = sorted(self.host_queues, key=lambda netloc: -len(self.host_queues[netloc]))
+        tails = dict()
+        for keep in (self.config.frontier_hot_urls, 1):
+            for netloc in longest:
+                queue = self.host_queues[netloc]
+                if self.queued_in_memory <= target or len(queue) <= keep:
+                    break
+                # a sorted list is a heap, and its best url stays first
+                queue.sort()
+                tails[netloc] = queue[keep:] + tails.get(netloc, [])
+                self.queued_in_memory -= len(queue) - keep
+                del queue[keep:]
+            longest.sort(key=lambda netloc: -len(self.host_queues[netloc]))
+        if tails:
+            with metrics.timer("frontier_spill"):
+                self.spill.spill(tails)
+
+    def _refill(self, netloc):
+        ''' Reads back the next chunk of netloc's spilled urls once it holds
+            the host's best url, scheduling the host if its queue was empty. '''
+        queue = self.host_queues.get(netloc)
+        while True:
+            head = self.spill.head(netloc)
+            if head is None or (queue and queue[0] < head):
+                return
+            with metrics.timer("frontier_refill"):
+                entries, segment = self.spill.load(netloc)
+            if segment < self.revalidate_below:
+                valid = set(filter_valid([entry[2] for entry in entries]))
+                entries = [entry for entry in entries if entry[2] in valid]
+            if self.completed_spilled:
+                entries = [entry for entry in entries
+                           if entry[2] not in self.completed_spilled]
+            if not entries:
+                continue
+            if queue is None:
+                queue = self.host_queues[netloc] = list()
+            scheduled = bool(queue) or netloc in self.active_hosts
+            for entry in entries:
+                heappush(queue, entry)
+            self.queued_in_memory += len(entries)
+            if not scheduled:
+                self._schedule(netloc)
+
+    def _schedule(self, netloc):
+        ready_time = max(time.monotonic(), self.next_allowed.get(netloc, 0))
+        heappush(self.waiting_hosts, (ready_time, netloc))
+        self.has_work.notify()
+
+    def _make_ready(self, netloc):
+        score = self.host_queues[netloc][0][0] + self.priority.host_score(netloc)
+        self.ready_scores[netloc] = score
+        heappush(self.ready_hosts, (score, next(self.order), netloc))
+
+    def _poll(self):
+        ''' Pops the best url of the ready hosts. Otherwise returns the time
+            until the next host is ready, or None if no url is queued at all. '''
+        now = time.monotonic()
+        while self.waiting_hosts and self.waiting_hosts[0][0] <= now:
+            self._make_ready(heappop(self.waiting_hosts)[1])
+        while self.ready_hosts:
+            score, _, netloc = heappop(self.ready_hosts)
+            if self.ready_scores.get(netloc) == score:
+                break
+        else:
+            if not self.waiting_hosts:
+                return None, None
+            return None, self.waiting_hosts[0][0] - now
+        del self.ready_scores[netloc]
+        queue = self.host_queues[netloc]
+        _, _, url, depth = heappop(queue)
+        self.queued_in_memory -= 1
+        self.active_hosts[netloc] = url
+        self.active_depths[netloc] = depth
+        self.in_progress += 1
+        if netloc in self.spill.runs:
+            self._refill(netloc)
+        if not queue:
+            del self.host_queues[netloc]
+        return url, 0
+
+    def _finished(self):
+        ''' With no url queued, tells whether the crawl is over: no url is
+            being crawled, so no more can be found. '''
+        return not self.in_progress
+
+    def get_tbd_url(self):
+        ''' Returns a url whose host is past its politeness window, blocking
+            until one is ready. Returns None once the frontier is empty and
+            no other worker can add to it. '''
+        with self.lock:
+            while True:
+                url, wait = self._poll()
+                if url is not None:
+                    return url
+                if wait is None and self._finished():
+                    self.has_work.notify_all()
+                    return None
+                # Urls being crawled right now may still add new ones.
+                self.has_work.wait(wait)
+
+    def poll_tbd_url(self, idle_wait=0.1):
+        ''' Non-blocking get_tbd_url for callers that cannot block a thread.
+            Returns (url, 0), or (None, seconds to wait before polling again),
+            or (None, None) once the frontier is empty for good. '''
+        with self.lock:
+            url, wait = self._poll()
+            if url is None and wait is None:
+                if self._finished():
+                    return None, None
+                wait = idle_wait
+            return url, wait
+
+    def set_host_delay(self, netloc, delay):
+        ''' Spaces fetches from netloc by delay seconds if that is more than
+            the configured politeness. '''
+        with self.lock:
+            self.host_delays[netloc] = delay
+
+    def depth(self, url):
+        ''' Number of links followed from a seed to url, which is being crawled. '''
+        with self.lock:
+            return self.active_depths.get(urlparse(url).netloc, 0)
+
+    def record_yield(self, url, useful):
+        ''' Counts whether a page of url's host was worth crawling, for the
+            host's yield in the crawl order. '''
+        with self.lock:
+            self.priority.record(urlparse(url).netloc, useful)
+
+    def record_fetch(self, url, seconds, status):
+        ''' Counts a download of url, which took seconds and gave status,
+            towards the spacing of its host's fetches. '''
+        self.hosts.record(urlparse(url).netloc, seconds, status)
+
+    def add_url(self, url, depth=0):
+        link = canonicalize(url)
+        if link is not None:
+            self.add_urls([link], depth)
+
+    def add_urls(self, links, depth=0):
+        ''' Adds the (url, urlhash) pairs from canonicalize of a page's links,
+            all found depth links from a seed, under one hold of the lock. '''
+        with self.lock:
+            for url, urlhash in links:
+                # Urls of a template over its budget are dropped, not marked seen,
+                # so they are counted again if the budget is raised on a restart.
+                if urlhash in self.seen or not self.traps.admit(url):
+                    continue
+                self.seen.add(urlhash)
+                self.save[urlhash] = (url, False)
+                self._enqueue(url, depth)
+
+    def mark_url_complete(self, url, fetched=True, commit=True):
+        ''' Completes url, which was being crawled. With commit False, url is
+            written as complete to the save file only by commit, once the
+            stats counting its page are saved, and a restart before that
+            crawls it again. '''
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            # This should not happen.
-            self.logger.error(
-                f"Completed url {url}, but have not seen it before.")
+        netloc = urlparse(url).netloc
+        with self.lock:
+            if urlhash not in self.seen:
+                # This should not happen.
+                self.logger.error(
+                    f"Completed url {url}, but have not seen it before.")
+
+            # Start the host's politeness window once its fetch is done,
+            # urls completed without fetching them leave it as it was.
+            depth = 0
+            if self.active_hosts.get(netloc) == url:
+                del self.active_hosts[netloc]
+                depth = self.active_depths.pop(netloc)
+                self.in_progress -= 1
+                if fetched:
+                    self.next_allowed[netloc] = self.hosts.next_fetch(netloc, max(
+                        self.config.time_delay, self.host_delays.get(netloc, 0)))
+                if netloc in self.host_queues:
+                    self._schedule(netloc)
+            if not self.in_progress:
+                self.has_work.notify_all()
+            if not commit:
+                self.uncommitted[url] = depth
+                return
+            self.save[urlhash] = (url, True)
+            checkpoint = self._count_completed(1)
+        if checkpoint:
+            self.checkpoint()
+
+    def commit(self, urls):
+        ''' Writes urls completed with commit False as complete to the save file. '''
+        with self.lock:
+            for url in urls:
+                self.uncommitted.pop(url, None)
+                self.save[get_urlhash(url)] = (url, True)
+            checkpoint = self._count_completed(len(urls))
+        if checkpoint:
+            self.checkpoint()
 
-        self.save[urlhash] = (url, True)
-        self.save.sync()
+    def _count_completed(self, count):
+        ''' Counts urls written as complete, returns True if a checkpoint is due. '''
+        self.completed_since_checkpoint += count
+        return self.completed_since_checkpoint >= self.config.checkpoint_interval
+
+    def defer(self, url, until):
+        ''' Puts url, which is being crawled, back in its host queue, and
+            fetches nothing from its host before until (time.monotonic). '''
+        netloc = urlparse(url).netloc
+        with self.lock:
+            if self.active_hosts.get(netloc) != url:
+                return
+            del self.active_hosts[netloc]
+            depth = self.active_depths.pop(netloc)
+            self.in_progress -= 1
+            self.next_allowed[netloc] = max(until, self.hosts.next_fetch(
+                netloc, max(self.config.time_delay, self.host_delays.get(netloc, 0))))
+            # _enqueue only schedules a host whose queue was empty
+            queued = bool(self.host_queues.get(netloc))
+            self._enqueue(url, depth)
+            if queued:
+                self._schedule(netloc)
+
+    def release(self, url):
+        ''' Completes url if it is still being crawled, for a worker that
+            failed part way through it. Returns True if it was. '''
+        with self.lock:
+            if self.active_hosts.get(urlparse(url).netloc) != url:
+                return False
+        self.mark_url_complete(url)
+        return True
+
+    def close(self):
+        ''' Checkpoints and commits anything the save file still buffers. '''
+        self.logger.info(
+            f"Dropped {self.traps.rejected} urls of templates over budget.")
+        self.checkpoint()
+        with self.lock:
+            self.save.close()
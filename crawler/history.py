@@ -0,0 +1,137 @@
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+
+from hashlib import blake2b
+from threading import Lock
+
+from utils import get_urlhash
+
+
+class PageHistory(object):
+    ''' SQLite file of what each crawled url returned last time: its
+        ETag and Last-Modified, a hash of its body, the analyzed page
+        (scraper.Page), when it was last fetched and changed, and how often
+        it was checked and found changed.
+
+        A later crawl (launch.py --recrawl) uses it to skip work:
+        - a url fetched less than its revisit interval ago is not downloaded
+          at all, its saved page is used instead;
+        - a downloaded page with the same ETag, or the same body, is not
+          parsed again.
+        The revisit interval starts at RECRAWL_MIN_INTERVAL, doubles each
+        time the page is found unchanged and halves each time it changed,
+        staying between RECRAWL_MIN_INTERVAL and RECRAWL_MAX_INTERVAL.
+
+        Writes are buffered and committed in batches of batch_size. '''
+    def __init__(self, path, min_interval, max_interval, batch_size=100):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.pending = dict()       # urlhash -> row not yet written
+        self.lock = Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                "urlhash TEXT PRIMARY KEY, url TEXT NOT NULL, etag TEXT, "
+                "last_modified TEXT, body_hash BLOB, fetched REAL, changed REAL, "
+                "checks INTEGER, changes INTEGER, interval REAL, page BLOB)")
+
+    @staticmethod
+    def remove(path):
+        for name in (path, path + "-wal", path + "-shm"):
+            if os.path.exists(name):
+                os.remove(name)
+
+    @staticmethod
+    def validators(resp):
+        ''' (ETag, Last-Modified, body hash) of a downloaded page, None if
+            it has no body. '''
+        raw = resp.raw_response
+        if raw is None:
+            return None
+        return (raw.headers.get("ETag"), raw.headers.get("Last-Modified"),
+                blake2b(raw.content, digest_size=16).digest())
+
+    def _get(self, urlhash):
+        row = self.pending.get(urlhash)
+        if row is None:
+            row = self.db.execute(
+                "SELECT * FROM history WHERE urlhash = ?", (urlhash,)).fetchone()
+        return list(row) if row is not None else None
+
+    def _put(self, row):
+        self.pending[row[0]] = tuple(row)
+        if len(self.pending) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self.pending.values())
+        self.pending.clear()
+
+    @staticmethod
+    def _page(blob):
+        page = pickle.loads(zlib.decompress(blob))
+        # pages saved by older versions have links without their hashes
+        if page.links and isinstance(page.links[0], str) \
+                or page.localLinks and isinstance(page.localLinks[0], str):
+            page = page._replace(
+                links=[(url, get_urlhash(url)) for url in page.links],
+                localLinks=[(url, get_urlhash(url)) for url in page.localLinks])
+        return page
+
+    def _interval(self, interval):
+        # kept within the current settings, which may differ from the last crawl's
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def fresh(self, url):
+        ''' Returns the saved page of url if it was fetched less than its
+            revisit interval ago, otherwise None. '''
+        with self.lock:
+            row = self._get(get_urlhash(url))
+        if row is None or time.time() - row[5] >= self._interval(row[9]):
+            return None
+        return self._page(row[10])
+
+    def unchanged(self, url, validators):
+        ''' Returns the saved page of url if the download with these
+            validators shows it did not change, and counts the check. '''
+        etag, _, body_hash = validators
+        with self.lock:
+            row = self._get(get_urlhash(url))
+            if row is None or not (body_hash == row[4] or (etag and etag == row[2])):
+                return None
+            row[5] = time.time()
+            row[7] += 1
+            row[9] = self._interval(row[9] * 2)
+            self._put(row)
+        return self._page(row[10])
+
+    def update(self, url, validators, page):
+        ''' Saves the page url changed to, or was for the first time. '''
+        etag, last_modified, body_hash = validators
+        urlhash = get_urlhash(url)
+        blob = zlib.compress(pickle.dumps(page, pickle.HIGHEST_PROTOCOL))
+        now = time.time()
+        with self.lock:
+            row = self._get(urlhash)
+            if row is None:
+                checks, changes, interval = 1, 0, self.min_interval
+            else:
+                checks, changes = row[7] + 1, row[8] + 1
+                interval = self._interval(row[9] / 2)
+            self._put((urlhash, url, etag, last_modified, body_hash, now, now,
+                       checks, changes, interval, blob))
+
+    def close(self):
+        with self.lock:
+            if self.pending:
+                self._flush()
+            self.db.close()
@@ -0,0 +1,99 @@
+import time
+
+from heapq import nlargest
+from threading import Lock
+
+from utils import get_logger
+
+
+ALPHA = 0.2         # weight of the newest sample in the moving averages
+MAX_BACKOFF = 5     # error streaks double the delay at most this many times
+
+
+class HostState(object):
+    __slots__ = ("latency", "error_rate", "streak", "trips", "open_until")
+
+    def __init__(self):
+        self.latency = None         # moving average of download seconds
+        self.error_rate = 0.0       # moving average of 1 per error, 0 per success
+        self.streak = 0             # errors in a row
+        self.trips = 0              # times the breaker opened in a row
+        self.open_until = 0.0       # no fetches until then (time.monotonic)
+
+
+class HostMonitor(object):
+    ''' Response times and errors of each host, to space fetches from it.
+
+        A host's delay is HOST_LATENCY_FACTOR times its average response
+        time, never below the politeness delay nor above HOST_MAX_DELAY, and
+        doubles with each error in a row (status 400 and up). After
+        HOST_FAILURE_STREAK errors in a row the host's circuit breaker opens:
+        nothing is fetched from it for HOST_COOLDOWN seconds, twice as long
+        each time the first fetch after a cooldown fails again. A success
+        closes it. The frontier keeps the host's urls meanwhile. '''
+    def __init__(self, config):
+        self.logger = get_logger("HOSTS")
+        self.latency_factor = config.host_latency_factor
+        self.max_delay = config.host_max_delay
+        self.failure_streak = config.host_failure_streak
+        self.cooldown = config.host_cooldown
+        self.hosts = dict()         # netloc -> HostState
+        self.lock = Lock()
+
+    def record(self, netloc, seconds, status):
+        ''' Counts one download from netloc that took seconds (None if not
+            known) and gave status. '''
+        error = status >= 400
+        with self.lock:
+            host = self.hosts.get(netloc)
+            if host is None:
+                host = self.hosts[netloc] = HostState()
+            if seconds is not None:
+                host.latency = seconds if host.latency is None \
+                    else ALPHA * seconds + (1 - ALPHA) * host.latency
+            host.error_rate = ALPHA * error + (1 - ALPHA) * host.error_rate
+            if not error:
+                host.streak = host.trips = 0
+                return
+            host.streak += 1
+            if host.streak < self.failure_streak:
+                return
+            host.trips += 1
+            cooldown = self.cooldown * 2 ** min(host.trips - 1, 4)
+            host.open_until = time.monotonic() + cooldown
+        self.logger.warning(
+            f"{netloc} failed {host.streak} times in a row, "
+            f"pausing it for {cooldown:.0f}s.")
+
+    def delay(self, netloc, floor):
+        ''' Seconds to wait between fetches from netloc, at least floor. '''
+        host = self.hosts.get(netloc)
+        if host is None:
+            return floor
+        delay = floor
+        if host.latency is not None:
+            delay = max(floor, min(self.max_delay, self.latency_factor * host.latency))
+        if host.streak:
+            delay = min(max(self.max_delay, floor), delay * 2 ** min(host.streak, MAX_BACKOFF))
+        return delay
+
+    def next_fetch(self, netloc, floor):
+        ''' The earliest time (time.monotonic) to fetch from netloc again, after
+            a fetch that just finished. '''
+        with self.lock:
+            ready = time.monotonic() + self.delay(netloc, floor)
+            host = self.hosts.get(netloc)
+            return max(ready, host.open_until) if host is not None else ready
+
+    def open_circuits(self):
+        now = time.monotonic()
+        with self.lock:
+            return sum(1 for host in self.hosts.values() if host.open_until > now)
+
+    def slowest(self, count=10):
+        ''' Average response seconds of the count slowest hosts. '''
+        with self.lock:
+            return {netloc: round(host.latency, 3) for netloc, host in nlargest(
+                count, ((netloc, host) for netloc, host in self.hosts.items()
+                        if host.latency is not None),
+                key=lambda item: item[1].latency)}
@@ -0,0 +1,68 @@
+from math import log2
+
+
+# Features of a url, scored once when it is queued: f(url, depth), where depth
+# is the number of links followed from a seed to reach it.
+URL_FEATURES = {
+    "depth": lambda url, depth: depth,
+    "length": lambda url, depth: len(url) / 100,
+}
+
+# Features of a host, scored whenever it becomes ready to fetch from: f(good,
+# bad), its counts of useful pages and of errors, duplicates and pages too
+# small to count.
+HOST_FEATURES = {
+    # share of bad pages, starting from one of each so new hosts score 0.5
+    "yield": lambda good, bad: (bad + 1) / (good + bad + 2),
+    # hosts crawled less go first
+    "diversity": lambda good, bad: log2(1 + good + bad),
+}
+
+
+def parse_weights(spec):
+    ''' Reads "depth:1, length:0.5" into {"depth": 1.0, "length": 0.5}. '''
+    weights = dict()
+    for item in spec.split(","):
+        if item.strip():
+            name, _, weight = item.partition(":")
+            weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+class Priority(object):
+    ''' Scores the urls and hosts of the frontier, lower first, as the sum of
+        the weighted features named in PRIORITY. A new feature only needs an
+        entry in URL_FEATURES or HOST_FEATURES. With no weights every score
+        is 0 and the frontier is first in, first out. '''
+    def __init__(self, weights):
+        unknown = set(weights) - set(URL_FEATURES) - set(HOST_FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown PRIORITY features: {', '.join(sorted(unknown))}")
+        self.url_weights = [(URL_FEATURES[name], weight)
+                            for name, weight in weights.items()
+                            if name in URL_FEATURES and weight]
+        self.host_weights = [(HOST_FEATURES[name], weight)
+                             for name, weight in weights.items()
+                             if name in HOST_FEATURES and weight]
+        self.hosts = dict()         # netloc -> [good pages, bad pages]
+
+    def url_score(self, url, depth):
+        return sum(weight * feature(url, depth) for feature, weight in self.url_weights)
+
+    def host_score(self, netloc):
+        if not self.host_weights:
+            return 0
+        good, bad = self.hosts.get(netloc, (0, 0))
+        return sum(weight * feature(good, bad) for feature, weight in self.host_weights)
+
+    def record(self, netloc, useful):
+        counts = self.hosts.get(netloc)
+        if counts is None:
+            counts = self.hosts[netloc] = [0, 0]
+        counts[0 if useful else 1] += 1
+
+    def state(self):
+        return {netloc: tuple(counts) for netloc, counts in self.hosts.items()}
+
+    def restore(self, state):
+        self.hosts = {netloc: list(counts) for netloc, counts in state.items()}
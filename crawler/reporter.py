@@ -1,13 +1,62 @@
-from collections import defaultdict
+from collections import defaultdict, Counter
+from threading import Lock, RLock, Thread
 from urllib.parse import urlparse
+import heapq
+import os
 import pickle
+import time
 
 import scraper
+from utils import get_logger
+from utils.metrics import metrics
+from crawler.archive import PageArchive
+from crawler.dedup import DuplicateIndex
+from crawler.history import PageHistory
+from crawler.statstore import StatsStore
+from crawler.wordfreq import SpaceSaving
+
+REPORT_WORDS = 50       # most common words listed in the report
+STOPWORDS = frozenset(["i", "me", "my", "myself", "we", "our", "ours", "ourselves", "you", "your", "yours", "yourself", "yourselves", "he", "him", "his", "himself", "she", "her", "hers", "herself", "it", "its", "itself", "they", "them", "their", "theirs", "themselves", "what", "which", "who", "whom", "this", "that", "these", "those", "am", "is", "are", "was", "were", "be", "been", "being", "have", "has", "had", "having", "do", "does", "did", "doing", "a", "an", "the", "and", "but", "if", "or", "because", "as", "until", "while", "of", "at", "by", "for", "with", "about", "against", "between", "into", "through", "during", "before", "after", "above", "below", "to", "from", "up", "down", "in", "out", "on", "off", "over", "under", "again", "further", "then", "once", "here", "there", "when", "where", "why", "how", "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no", "nor", "not", "only", "own", "same", "so", "than", "too", "very", "s", "t", "can", "will", "just", "don", "should", "now"])
 
 class Reporter(object):
-  def __init__(self, restart):
-    self.save_file = 'stats.pkl'
-    self.freq_file = 'freq.pkl'
+  def __init__(self, config, restart, on_save=None):
+    self.config = config
+    self.logger = get_logger("REPORTER")
+    self.save_file = config.stats_file
+    self.pickle_files = ('stats.pkl', 'freq.pkl')      # save files of older versions
+    self.lock = RLock()     # workers count words in local shards, merged under this lock
+    self.report_lock = Lock()       # held while a background report is being made
+    self.report_thread = None       # the last background report
+    self.write_lock = Lock()        # serializes writes of report.txt
+
+    # changes since the last save, which only writes these
+    self.freq_delta = Counter()
+    self.subdomain_delta = Counter()
+    self.pages_since_save = 0
+    self.last_save = time.monotonic()
+    # urls of the pages merged by merge_pages since the last save, passed to
+    # on_save once it saved their stats, so the frontier completes them then
+    self.unsaved_urls = []
+    self.on_save = on_save
+
+    if restart:
+        for path in (self.save_file, self.save_file + '-wal', self.save_file + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+    self.store = StatsStore(self.save_file)
+    # fingerprints of the pages counted so far, to skip copies of them
+    self.dedup = DuplicateIndex(config.simhash_distance) if config.dedup else None
+    # downloaded pages, kept for reprocess.py
+    self.archive = PageArchive(
+        config.archive_dir, config.archive_segment_size, config.archive_compression,
+        restart) if config.archive_dir else None
+    # what each url returned last time, kept by --recrawl to skip unchanged pages
+    self.history = None
+    if config.history_file:
+        if restart and not config.recrawl:
+            PageHistory.remove(config.history_file)
+        self.history = PageHistory(
+            config.history_file, config.recrawl_min_interval, config.recrawl_max_interval)
     if restart: 
         self.stats = dict()
         self.stats['page_count'] = 0                        # counts number of crawls
@@ -15,9 +64,16 @@ class Reporter(object):
         self.stats['longest_page_words'] = 0
         self.stats['icsSubdomains'] = self.dd()
 
-        self.all_freq = self.dd()
+        self.all_freq = self.new_freq()
     else:
         self.readSaveFile()
+    metrics.gauge('pages_counted', lambda: self.stats['page_count'])
+
+  def new_freq(self):
+    ''' Word counts for the whole crawl, bounded to FREQ_CAPACITY words if set. '''
+    if self.config.freq_capacity:
+        return SpaceSaving(self.config.freq_capacity)
+    return self.dd()
 
   # to make pickling possible for defaultdicts
   def dd(self):
@@ -25,106 +81,248 @@ class Reporter(object):
 
   
   def readSaveFile(self):
-    ''' Reads saved data from pickle file. '''
-    s_file = open(self.save_file, 'rb')
-    self.stats = pickle.load(s_file)
+    ''' Reads saved data from the stats database, importing pickle save files once if there are any. '''
+    stats, subdomains = self.store.load_stats()
+    if not stats and all(os.path.exists(path) for path in self.pickle_files):
+        self.readPickleFiles()
+        return
+
+    self.stats = {'page_count': 0, 'longest_page': '', 'longest_page_words': 0}
+    self.stats.update(stats)
+    self.stats['icsSubdomains'] = self.dd()
+    self.stats['icsSubdomains'].update(subdomains)
+
+    self.all_freq = self.new_freq()
+    self.all_freq.update(self.store.load_freq(limit=self.config.freq_capacity))
+    if self.dedup is not None:
+        self.dedup.load(self.store.load_pages())
+
+
+  def readPickleFiles(self):
+    ''' Imports the pickle save files written by older versions into the database. '''
+    stats_file, freq_file = self.pickle_files
+    with open(stats_file, 'rb') as s_file:
+        self.stats = pickle.load(s_file)
+    with open(freq_file, 'rb') as f_file:
+        freq = pickle.load(f_file)
 
-    f_file = open(self.freq_file, 'rb')
-    self.all_freq = pickle.load(f_file)
+    self.all_freq = self.new_freq()
+    self.merge_freq(freq)
+    self.subdomain_delta.update(self.stats['icsSubdomains'])
+    self.writeSaveFile()
 
   
   def writeSaveFile(self):
-    ''' Writes save data to pickle file. '''
-    s_file = open(self.save_file, 'wb')
-    pickle.dump(self.stats, s_file)
+    ''' Saves the stats, and the counts added since the last save, in one transaction. '''
+    with self.lock, metrics.timer('persist_stats'):
+        self.store.save(
+            {key: self.stats[key] for key in ('page_count', 'longest_page', 'longest_page_words')},
+            self.subdomain_delta, self.freq_delta,
+            self.dedup.take_new() if self.dedup is not None else ())
+        self.subdomain_delta.clear()
+        self.freq_delta.clear()
+        self.pages_since_save = 0
+        self.last_save = time.monotonic()
+        urls, self.unsaved_urls = self.unsaved_urls, []
+    if urls and self.on_save is not None:
+        self.on_save(urls)
+
 
-    f_file = open(self.freq_file, 'wb')
-    pickle.dump(self.all_freq, f_file)
+  def close(self):
+    ''' Writes the final report once any background report is done, so that one cannot
+        replace it, then saves whatever changed since the last save and closes the stats
+        database, the archive and the page history. '''
+    if self.report_thread is not None:
+        self.report_thread.join()
+    self.writeReport()
+    self.writeSaveFile()
+    self.store.close()
+    if self.archive is not None:
+        self.archive.close()
+    if self.history is not None:
+        self.history.close()
 
   
+  def merge_freq(self, freq):
+    ''' Adds a worker's local word counts to all_freq and clears them. '''
+    with self.lock:
+        self._merge_freq(freq)
+    freq.clear()
+
+
+  def _merge_freq(self, freq):
+    if isinstance(self.all_freq, SpaceSaving):
+        self.all_freq.update(freq)
+    else:
+        for word, count in freq.items():
+            self.all_freq[word] += count
+    self.freq_delta.update(freq)
+
+
+  def merge_pages(self, pages, freq):
+    ''' Collects the data of a worker's pages, (url, word count) pairs, together
+        with their word counts, and clears both. A save holds either all or none
+        of a page's stats, and passes its url to on_save once it holds them. '''
+    with self.lock:
+        for url, wordCount in pages:
+            self._collect_data(url, wordCount)
+        self._merge_freq(freq)
+        self.unsaved_urls.extend(url for url, _ in pages)
+        save = self._save_due()
+    pages.clear()
+    freq.clear()
+    if save:
+        self.writeSaveFile()
+
+
+  def merge_stats_file(self, path):
+    ''' Adds the stats saved in another stats database, a shard of the crawl's
+        counts such as a cluster node's: page, subdomain and word counts are
+        summed and the longest page is the longer of the two. Pages are not
+        checked for duplicates across shards. '''
+    store = StatsStore(path)
+    try:
+        stats, subdomains = store.load_stats()
+        freq = store.load_freq()
+    finally:
+        store.close()
+    with self.lock:
+        self.stats['page_count'] += stats.get('page_count', 0)
+        if stats.get('longest_page_words', 0) > self.stats['longest_page_words']:
+            self.stats['longest_page_words'] = stats['longest_page_words']
+            self.stats['longest_page'] = stats['longest_page']
+        for subdomain, count in subdomains.items():
+            self.stats['icsSubdomains'][subdomain] += count
+        self.subdomain_delta.update(subdomains)
+        self._merge_freq(freq)
+
+
   def addPage(self, url):
     ''' Increments page count and ics.uci.edu subdomain count if appropriate. '''
+    with self.lock:
+        self._addPage(url)
+
+
+  def _addPage(self, url):
     self.stats['page_count'] += 1
 
     parsed = urlparse(url)
     # record subdomains in ics.uci.edu
     if parsed.netloc.endswith('.ics.uci.edu'):
         self.stats['icsSubdomains'][parsed.scheme + '://' + parsed.netloc] += 1
-        print(parsed.scheme + '://' + parsed.netloc, self.stats['icsSubdomains'][parsed.scheme + '://' + parsed.netloc])
+        self.subdomain_delta[parsed.scheme + '://' + parsed.netloc] += 1
 
 
   def collect_data(self, tbd_url, wordCount):
     ''' Called for every crawled URL, collecting data about the page for the report:
         page count, word frequencies, page length in words, ics.uci.edu subdomains '''
-    self.addPage(tbd_url)
-    print(self.stats['page_count'])
+    with self.lock:
+        self._collect_data(tbd_url, wordCount)
+        save = self._save_due()
+    if save:
+        self.writeSaveFile()
+
+
+  def _collect_data(self, tbd_url, wordCount):
+    self._addPage(tbd_url)
+    self.logger.debug('Page %d: %s, %d words', self.stats['page_count'], tbd_url, wordCount)
 
     # tokenize page text and count frequencies
     # wordCount = scraper.tokenFrequencies(page_text, self.all_freq)
     # check if longest page yet
-    print('page size in words:', wordCount)
     if wordCount > self.stats['longest_page_words']:
         self.stats['longest_page_words'] = wordCount
         self.stats['longest_page'] = tbd_url
-        print('new longest page!', self.stats['longest_page_words'], 'words')
+        self.logger.info(f'New longest page {tbd_url}, {wordCount} words')
 
     # report stats every 20 crawls  
     elif self.stats['page_count'] % 20 == 0:
-        self.report()
-        self.writeReport()
+        self.reportInBackground()
 
-    self.writeSaveFile()
+    self.pages_since_save += 1
+
+
+  def _save_due(self):
+    ''' Saves are made every STATS_SAVE_PAGES pages or STATS_SAVE_INTERVAL seconds. '''
+    return self.pages_since_save >= self.config.stats_save_pages or \
+        time.monotonic() - self.last_save >= self.config.stats_save_interval
+
+
+  def snapshot(self):
+    ''' Copies what the report needs under the lock, and ranks the words after releasing
+        it, so workers merging their counts don't wait on the ranking. The most common
+        words are picked with a heap over the non-stop words instead of sorting the whole
+        vocabulary. '''
+    with self.lock:
+        snapshot = {
+            'page_count': self.stats['page_count'],
+            'longest_page': self.stats['longest_page'],
+            'longest_page_words': self.stats['longest_page_words'],
+            'subdomains': list(self.stats['icsSubdomains'].items()),
+        }
+        freq = dict(self.all_freq.items())
+    snapshot['common_words'] = heapq.nlargest(
+        REPORT_WORDS, (word for word in freq if word not in STOPWORDS), key=freq.__getitem__)
+    snapshot['subdomains'].sort()
+    return snapshot
+
+
+  def reportInBackground(self):
+    ''' Prints and writes the report on another thread, so workers don't wait on it.
+        Skipped if the previous report is still being made. '''
+    if not self.report_lock.acquire(blocking=False):
+        return
+    def run():
+        try:
+            snapshot = self.snapshot()
+            self.report(snapshot)
+            self.writeReport(snapshot)
+        finally:
+            self.report_lock.release()
+    self.report_thread = Thread(target=run, daemon=True)
+    self.report_thread.start()
 
 
-  def report(self):
+  def report(self, snapshot=None):
     ''' Prints report data. '''
+    if snapshot is None:
+        snapshot = self.snapshot()
     print('---------------------------')
-    print('Unique pages:', self.stats['page_count'])
+    print('Unique pages:', snapshot['page_count'])
     print('---------------------------')
-    print('Longest page:', self.stats['longest_page'])
-    print('\thad', self.stats['longest_page_words'], 'words')
+    print('Longest page:', snapshot['longest_page'])
+    print('\thad', snapshot['longest_page_words'], 'words')
     print('---------------------------')
     print('Most common words:')
-    stopwords = ["i", "me", "my", "myself", "we", "our", "ours", "ourselves", "you", "your", "yours", "yourself", "yourselves", "he", "him", "his", "himself", "she", "her", "hers", "herself", "it", "its", "itself", "they", "them", "their", "theirs", "themselves", "what", "which", "who", "whom", "this", "that", "these", "those", "am", "is", "are", "was", "were", "be", "been", "being", "have", "has", "had", "having", "do", "does", "did", "doing", "a", "an", "the", "and", "but", "if", "or", "because", "as", "until", "while", "of", "at", "by", "for", "with", "about", "against", "between", "into", "through", "during", "before", "after", "above", "below", "to", "from", "up", "down", "in", "out", "on", "off", "over", "under", "again", "further", "then", "once", "here", "there", "when", "where", "why", "how", "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no", "nor", "not", "only", "own", "same", "so", "than", "too", "very", "s", "t", "can", "will", "just", "don", "should", "now"]
-    count = 0
-    # sort word frequencies by most frequent to least frequent
-    for word in sorted(self.all_freq.keys(), key=(lambda k: self.all_freq[k]), reverse=True):
-        if word not in stopwords:  # skip stop words
-          print(word)
-          count += 1
-          if count == 50:
-            break
+    for word in snapshot['common_words']:
+        print(word)
     print('---------------------------')
     print('Subdomains in ics.uci.edu:')
-    # sort subdomains alphabetically, print their name and count
-    for subdomain in sorted(self.stats['icsSubdomains']):
-        print(subdomain + ',', self.stats['icsSubdomains'][subdomain], 'pages')
+    # subdomains alphabetically, with their count
+    for subdomain, count in snapshot['subdomains']:
+        print(subdomain + ',', count, 'pages')
     print('---------------------------')
 
 
-  def writeReport(self):
-    ''' Writes report data to file. '''
-    with open('report.txt', 'w+') as file:
-        file.write('---------------------------\n')
-        file.write('Unique pages: {}\n'.format(self.stats['page_count']))
-        file.write('---------------------------\n')
-        file.write('Longest page: {}\n'.format(self.stats['longest_page']))
-        file.write('\thad {} words\n'.format(self.stats['longest_page_words']))
-        file.write('---------------------------\n')
-        file.write('Most common words:\n')
-        stopwords = ["i", "me", "my", "myself", "we", "our", "ours", "ourselves", "you", "your", "yours", "yourself", "yourselves", "he", "him", "his", "himself", "she", "her", "hers", "herself", "it", "its", "itself", "they", "them", "their", "theirs", "themselves", "what", "which", "who", "whom", "this", "that", "these", "those", "am", "is", "are", "was", "were", "be", "been", "being", "have", "has", "had", "having", "do", "does", "did", "doing", "a", "an", "the", "and", "but", "if", "or", "because", "as", "until", "while", "of", "at", "by", "for", "with", "about", "against", "between", "into", "through", "during", "before", "after", "above", "below", "to", "from", "up", "down", "in", "out", "on", "off", "over", "under", "again", "further", "then", "once", "here", "there", "when", "where", "why", "how", "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no", "nor", "not", "only", "own", "same", "so", "than", "too", "very", "s", "t", "can", "will", "just", "don", "should", "now"]
-        count = 0
-        # sort word frequencies by most frequent to least frequent
-        for word in sorted(self.all_freq.keys(), key=(lambda k: self.all_freq[k]), reverse=True):
-            if word not in stopwords:  # skip stop words
-              file.write('{}\n'.format(word))
-              count += 1
-              if count == 50:
-                break
-        file.write('---------------------------\n')
-        file.write('Subdomains in ics.uci.edu:\n')
-        # sort subdomains alphabetically, print their name and count
-        for subdomain in sorted(self.stats['icsSubdomains']):
-            file.write('{}, {}\n'.format(subdomain, self.stats['icsSubdomains'][subdomain]))
-        file.write('---------------------------\n')
+  def writeReport(self, snapshot=None):
+    ''' Writes report data to file, replacing the old report only once it is complete. '''
+    if snapshot is None:
+        snapshot = self.snapshot()
+    lines = ['---------------------------',
+             'Unique pages: {}'.format(snapshot['page_count']),
+             '---------------------------',
+             'Longest page: {}'.format(snapshot['longest_page']),
+             '\thad {} words'.format(snapshot['longest_page_words']),
+             '---------------------------',
+             'Most common words:']
+    lines += snapshot['common_words']
+    lines += ['---------------------------',
+              'Subdomains in ics.uci.edu:']
+    # subdomains alphabetically, with their count
+    lines += ['{}, {}'.format(subdomain, count) for subdomain, count in snapshot['subdomains']]
+    lines.append('---------------------------')
 
+    with self.write_lock:
+        with open(self.config.report_file + '.tmp', 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(self.config.report_file + '.tmp', self.config.report_file)
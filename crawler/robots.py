@@ -0,0 +1,99 @@
+import time
+
+from collections import OrderedDict
+from threading import Lock, Event
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+from utils import get_logger
+from utils.metrics import metrics
+from utils.download import download
+
+
+class RobotsCache(object):
+    ''' Parsed robots.txt rules shared by every worker, keyed by scheme://netloc.
+
+        robots.txt goes through the cache server like any other page. A 200
+        is parsed, 401/403 disallow the whole site, any other 4xx allows it,
+        and 5xx or connection failures mark the site unreachable (see
+        unreachable). Parsed rules live for ROBOTS_TTL seconds and the others
+        for ROBOTS_NEGATIVE_TTL, at most ROBOTS_CACHE_SIZE sites are kept
+        (least recently used first out), and only one fetch per site runs at
+        a time.
+        A Crawl-delay is passed to on_crawl_delay(netloc, seconds). '''
+    def __init__(self, config, on_crawl_delay=None):
+        self.logger = get_logger("ROBOTS")
+        self.config = config
+        self.on_crawl_delay = on_crawl_delay
+        self.entries = OrderedDict()    # origin -> (expires, rules)
+        self.fetching = dict()          # origin -> Event set when fetched
+        self.failures = dict()          # origin -> unreachable fetches in a row
+        self.lock = Lock()
+
+    def get(self, url):
+        ''' Returns the RobotFileParser for url's site, or None if the site's
+            robots.txt could not be reached. '''
+        parsed = urlparse(url)
+        origin = parsed.scheme + '://' + parsed.netloc
+        while True:
+            with self.lock:
+                entry = self.entries.get(origin)
+                if entry is not None and entry[0] > time.monotonic():
+                    self.entries.move_to_end(origin)
+                    return entry[1]
+                fetched = self.fetching.get(origin)
+                if fetched is None:
+                    fetched = self.fetching[origin] = Event()
+                    break
+            # Another worker is fetching this site's robots.txt already.
+            fetched.wait()
+
+        try:
+            rules, ttl = self._fetch(origin)
+            with self.lock:
+                if rules is None:
+                    self.failures[origin] = self.failures.get(origin, 0) + 1
+                else:
+                    self.failures.pop(origin, None)
+                self.entries[origin] = (time.monotonic() + ttl, rules)
+                self.entries.move_to_end(origin)
+                while len(self.entries) > self.config.robots_cache_size:
+                    self.failures.pop(self.entries.popitem(last=False)[0], None)
+        finally:
+            with self.lock:
+                del self.fetching[origin]
+            fetched.set()
+
+        if rules is not None and self.on_crawl_delay is not None:
+            delay = rules.crawl_delay('*')
+            if delay:
+                self.on_crawl_delay(parsed.netloc, float(delay))
+        return rules
+
+    def unreachable(self, url):
+        ''' Returns (times in a row the robots.txt of url's site could not be
+            reached, when it will be fetched again as time.monotonic). '''
+        parsed = urlparse(url)
+        origin = parsed.scheme + '://' + parsed.netloc
+        with self.lock:
+            entry = self.entries.get(origin)
+            return self.failures.get(origin, 0), entry[0] if entry is not None else 0
+
+    def _fetch(self, origin):
+        ''' Returns (rules, seconds to cache them). '''
+        rules = RobotFileParser(origin + '/robots.txt')
+        metrics.inc("robots_fetches")
+        # a robots.txt that could not be downloaded is a 599
+        resp = download(origin + '/robots.txt', self.config, self.logger)
+        if resp.status == 200 and resp.raw_response is not None:
+            text = resp.raw_response.content.decode('utf-8', errors='replace')
+            rules.parse(text.splitlines())
+            return rules, self.config.robots_ttl
+        if resp.status in (401, 403):
+            rules.disallow_all = True
+        elif 400 <= resp.status < 500:
+            rules.allow_all = True
+        else:
+            return None, self.config.robots_negative_ttl
+        rules.modified()
+        return rules, self.config.robots_negative_ttl
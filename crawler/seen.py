@@ -0,0 +1,111 @@
+from array import array
+from math import ceil, log
+
+
+def url_key(urlhash):
+    ''' Truncates a sha256 hex urlhash to a non-zero 64 bit integer. '''
+    return int(urlhash[:16], 16) or 1
+
+
+class BloomFilter(object):
+    ''' Bloom filter over 64 bit keys, sized for capacity keys at error_rate. '''
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(64, int(-capacity * log(error_rate) / log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * log(2)))
+        self.bits = bytearray(ceil(self.size / 8))
+
+    def _positions(self, key):
+        # Double hashing on the two halves of the key.
+        h1, h2 = key & 0xFFFFFFFF, (key >> 32) | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7))
+                   for pos in self._positions(key))
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+
+class SeenIndex(object):
+    ''' Set of urlhashes kept as 8 byte digests in an open-addressing table.
+
+        Two different urls collide only if their sha256 digests share the
+        first 64 bits, which is negligible even at tens of millions of urls.
+        With bloom_capacity set, a Bloom filter answers most lookups of
+        unseen urls before the table is probed. '''
+    def __init__(self, capacity=0, bloom_capacity=0):
+        size = 1024
+        while size < 2 * capacity:
+            size *= 2
+        self.table = array("Q", [0]) * size
+        self.mask = size - 1
+        self.count = 0
+        self.bloom = BloomFilter(bloom_capacity) if bloom_capacity else None
+
+    def _slot(self, key):
+        ''' Returns the slot holding key, or the empty slot it belongs in. '''
+        table, mask = self.table, self.mask
+        slot = key & mask
+        while table[slot] and table[slot] != key:
+            slot = (slot + 1) & mask
+        return slot
+
+    def __contains__(self, urlhash):
+        key = url_key(urlhash)
+        if self.bloom is not None and key not in self.bloom:
+            return False
+        return self.table[self._slot(key)] == key
+
+    def add(self, urlhash):
+        ''' Adds urlhash, returning False if it was already present. '''
+        key = url_key(urlhash)
+        slot = self._slot(key)
+        if self.table[slot] == key:
+            return False
+        self.table[slot] = key
+        self.count += 1
+        if self.bloom is not None:
+            self.bloom.add(key)
+        if 2 * self.count > len(self.table):
+            self._grow()
+        return True
+
+    def _grow(self):
+        old = self.table
+        self.table = array("Q", [0]) * (2 * len(old))
+        self.mask = len(self.table) - 1
+        for key in old:
+            if key:
+                self.table[self._slot(key)] = key
+
+    def __len__(self):
+        return self.count
+
+    def to_bytes(self):
+        return self.table.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, count, bloom_capacity=0):
+        ''' Restores an index saved with to_bytes. '''
+        index = cls(bloom_capacity=bloom_capacity)
+        index.table = array("Q")
+        index.table.frombytes(data)
+        index.mask = len(index.table) - 1
+        index.count = count
+        if index.bloom is not None:
+            for key in index.table:
+                if key:
+                    index.bloom.add(key)
+        return index
+
+    @property
+    def nbytes(self):
+        return (self.table.itemsize * len(self.table)
+                + (self.bloom.nbytes if self.bloom is not None else 0))
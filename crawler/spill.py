@@ -0,0 +1,154 @@
+import os
+import pickle
+import shutil
+
+from collections import deque
+from heapq import merge
+
+SEGMENT = "spill-{:06d}"
+MAX_RUNS = 8        # runs per host before a spill merges them into one
+
+
+class SpillStore(object):
+    ''' The cold tails of the frontier's host queues, kept on disk.
+
+        Each spill writes one segment file with a sorted run of (score, order,
+        url, depth) entries per host, pickled in chunks of chunk_size entries.
+        Only the first entry and offset of each chunk stay in memory, so the
+        best spilled entry of a host is known without reading it, and the
+        frontier reads chunks back one at a time as the host's queue drains.
+        A host with more than MAX_RUNS runs has them merged into one by its
+        next spill. A segment whose chunks were all read is deleted once a
+        checkpoint no longer refers to it (see take_spent). '''
+    def __init__(self, directory, chunk_size):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self._reset()
+
+    def _path(self, segment):
+        return os.path.join(self.directory, SEGMENT.format(segment))
+
+    def _reset(self):
+        self.runs = dict()      # netloc -> runs, deques of (first entry, segment, offset, count)
+        self.counts = dict()    # netloc -> entries spilled
+        self.total = 0
+        self.chunks = dict()    # segment -> chunks not read back yet
+        self.spent = list()     # segments read back entirely
+        self.number = 0         # of the next segment
+
+    def clear(self):
+        ''' Deletes every segment. '''
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+        self._reset()
+
+    def _read(self, segment, offset):
+        with open(self._path(segment), "rb") as segment_file:
+            segment_file.seek(offset)
+            return pickle.load(segment_file)
+
+    def _drain(self, run):
+        ''' Yields the entries of run, releasing its chunks as they are read. '''
+        while run:
+            _, segment, offset, _ = run.popleft()
+            chunk = self._read(segment, offset)
+            self._release(segment)
+            yield from chunk
+
+    def _release(self, segment):
+        self.chunks[segment] -= 1
+        if not self.chunks[segment]:
+            del self.chunks[segment]
+            self.spent.append(segment)
+
+    def spill(self, tails):
+        ''' Writes tails, netloc -> its sorted entries, as one new segment. '''
+        segment = self.number
+        self.number += 1
+        os.makedirs(self.directory, exist_ok=True)
+        chunks = 0
+        with open(self._path(segment), "wb") as segment_file:
+            for netloc, entries in tails.items():
+                runs = self.runs.setdefault(netloc, list())
+                if len(runs) >= MAX_RUNS:
+                    entries = merge(entries, *map(self._drain, runs))
+                    runs.clear()
+                run = deque()
+                chunk = list()
+                for entry in entries:
+                    chunk.append(entry)
+                    if len(chunk) == self.chunk_size:
+                        run.append((chunk[0], segment, segment_file.tell(), len(chunk)))
+                        pickle.dump(chunk, segment_file, pickle.HIGHEST_PROTOCOL)
+                        chunk = list()
+                if chunk:
+                    run.append((chunk[0], segment, segment_file.tell(), len(chunk)))
+                    pickle.dump(chunk, segment_file, pickle.HIGHEST_PROTOCOL)
+                chunks += len(run)
+                runs.append(run)
+                self.total -= self.counts.get(netloc, 0)
+                self.counts[netloc] = sum(chunk[3] for run in runs for chunk in run)
+                self.total += self.counts[netloc]
+            # a checkpoint may refer to the segment as soon as it is spilled
+            segment_file.flush()
+            os.fsync(segment_file.fileno())
+        self.chunks[segment] = chunks
+
+    def head(self, netloc):
+        ''' The best spilled entry of netloc, None if it has none. '''
+        runs = self.runs.get(netloc)
+        if not runs:
+            return None
+        return min(run[0][0] for run in runs)
+
+    def load(self, netloc):
+        ''' Reads back the chunk of netloc with the best entry. Returns its
+            entries and the segment they were in. '''
+        runs = self.runs[netloc]
+        run = min(runs, key=lambda run: run[0][0])
+        _, segment, offset, count = run.popleft()
+        if not run:
+            runs.remove(run)
+        if runs:
+            self.counts[netloc] -= count
+        else:
+            del self.runs[netloc]
+            del self.counts[netloc]
+        self.total -= count
+        chunk = self._read(segment, offset)
+        self._release(segment)
+        return chunk, segment
+
+    def take_spent(self):
+        ''' Returns the segments read back since the last call, to remove once
+            a checkpoint without them is written. '''
+        spent, self.spent = self.spent, list()
+        return spent
+
+    def remove(self, segments):
+        for segment in segments:
+            if os.path.exists(self._path(segment)):
+                os.remove(self._path(segment))
+
+    def state(self):
+        return {"number": self.number, "chunks": dict(self.chunks),
+                "runs": {netloc: [list(run) for run in runs]
+                         for netloc, runs in self.runs.items()}}
+
+    def restore(self, state):
+        ''' Takes back the runs of a checkpoint, deleting segments it does not
+            refer to. '''
+        if not state:
+            self.clear()
+            return
+        self._reset()
+        self.number = state["number"]
+        self.chunks = dict(state["chunks"])
+        for netloc, runs in state["runs"].items():
+            self.runs[netloc] = [deque(run) for run in runs]
+            self.counts[netloc] = sum(chunk[3] for run in runs for chunk in run)
+            self.total += self.counts[netloc]
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if not name.startswith("spill-") or int(name[6:]) not in self.chunks:
+                    os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,79 @@
+import sqlite3
+
+from threading import Lock
+
+
+def _signed(value):
+    ''' SQLite integers are signed 64-bit. '''
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def _unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class StatsStore(object):
+    ''' SQLite file holding the Reporter's counters.
+
+        Each save is one transaction that upserts only what changed since
+        the previous save: the scalar stats, and the increments of the
+        subdomain and word counts. A crash leaves the last committed save. '''
+    def __init__(self, path):
+        self.lock = Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value)")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS subdomains "
+                "(name TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS freq "
+                "(word TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS pages "
+                "(content_hash INTEGER PRIMARY KEY, simhash INTEGER NOT NULL)")
+
+    def load_stats(self):
+        with self.lock:
+            stats = dict(self.db.execute("SELECT key, value FROM stats"))
+            subdomains = dict(self.db.execute("SELECT name, count FROM subdomains"))
+        return stats, subdomains
+
+    def load_freq(self, limit=None):
+        ''' Returns word counts, only the limit most frequent if given. '''
+        query = "SELECT word, count FROM freq ORDER BY count DESC"
+        with self.lock:
+            if limit:
+                return dict(self.db.execute(query + " LIMIT ?", (limit,)))
+            return dict(self.db.execute(query))
+
+    def load_pages(self):
+        ''' Returns the (content hash, simhash) of every distinct page. '''
+        with self.lock:
+            return [(_unsigned(page_hash), _unsigned(fingerprint))
+                    for page_hash, fingerprint in self.db.execute(
+                        "SELECT content_hash, simhash FROM pages")]
+
+    def save(self, stats, subdomain_deltas, freq_deltas, pages=()):
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT INTO stats VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                stats.items())
+            self.db.executemany(
+                "INSERT INTO subdomains VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET count = count + excluded.count",
+                subdomain_deltas.items())
+            self.db.executemany(
+                "INSERT INTO freq VALUES (?, ?) "
+                "ON CONFLICT(word) DO UPDATE SET count = count + excluded.count",
+                freq_deltas.items())
+            self.db.executemany(
+                "INSERT OR IGNORE INTO pages VALUES (?, ?)",
+                [(_signed(page_hash), _signed(fingerprint))
+                 for page_hash, fingerprint in pages])
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,235 @@
+import dbm
+import os
+import pickle
+import shelve
+
+from uuid import uuid4
+from threading import Thread, RLock, Event
+
+from utils import get_logger
+from utils.metrics import metrics
+
+
+LEGACY_SAVE = "frontier.shelve"     # the SAVE of versions before the journal
+
+
+def open_store(config, restart=False):
+    ''' Opens the frontier save file with the backend chosen in the config.
+        Unless restarting, a new journal starts from the shelve save file an
+        older version left next to it. '''
+    if config.store == "shelve":
+        return ShelveStore(config.save_file)
+    legacy = os.path.join(os.path.dirname(config.save_file), LEGACY_SAVE)
+    migrate = (not restart and not os.path.exists(config.save_file)
+               and dbm.whichdb(legacy))
+    store = JournalStore(
+        config.save_file, batch_size=config.journal_batch_size,
+        flush_interval=config.journal_flush_interval)
+    if migrate:
+        import_shelve(legacy, store)
+    return store
+
+
+def import_shelve(path, store):
+    ''' Copies the records of the shelve save file at path into a new store,
+        so a crawl saved by an older version resumes instead of restarting. '''
+    legacy = ShelveStore(path, flag="r")
+    count = 0
+    for urlhash, url, completed in legacy.records():
+        store[urlhash] = (url, completed)
+        count += 1
+    legacy.close()
+    store.flush()
+    store.logger.warning(
+        f"Imported {count} urls from the old save file {path} into "
+        f"{store.path}; {path} is no longer used and can be deleted.")
+
+
+class ShelveStore(object):
+    ''' The original backend: a shelve synced after every write. '''
+    def __init__(self, path, flag="c"):
+        self.save = shelve.open(path, flag)
+
+    def __setitem__(self, urlhash, value):
+        self.save[urlhash] = value
+        self.save.sync()
+
+    def records(self):
+        ''' Yields the (urlhash, url, completed) state of every url. '''
+        for urlhash, (url, completed) in self.save.items():
+            yield urlhash, url, completed
+
+    def marker(self):
+        # A shelve has no position to resume from.
+        return None
+
+    def records_since(self, marker):
+        return None
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.save.close()
+
+
+class JournalStore(object):
+    ''' Append-only log of (urlhash, url, completed) records.
+
+        Writes are buffered and group-committed once batch_size records are
+        pending or flush_interval seconds have passed, whichever is first.
+        Records are committed in the order they were written, so a page's
+        completion is never durable before the links it added. Nothing is
+        kept in memory besides the buffer; the log is rewritten in the
+        background with one record per url once it has grown compact_ratio
+        times since it was opened or last compacted.
+
+        Every log starts with a (None, generation, None) header that changes
+        on each rewrite, so a (generation, offset) marker names one exact
+        position in the log's history. '''
+    def __init__(self, path, batch_size=512, flush_interval=1.0,
+                 compact_ratio=2.0, compact_min=1 << 22):
+        self.logger = get_logger("JOURNAL", "FRONTIER")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+
+        self.lock = RLock()
+        self.buffer = list()
+        self.compacting = False
+
+        self.log = open(self.path, "ab")
+        if self.log.tell() == 0:
+            self.generation = uuid4().hex
+            self.log.write(pickle.dumps((None, self.generation, None)))
+            self.log.flush()
+        else:
+            self.generation = self._read_generation()
+        self.base_size = self.log.tell()    # log size when opened or compacted
+        self.closed = Event()
+        self.flusher = Thread(target=self._flush_loop, daemon=True)
+        self.flusher.start()
+
+    def _read_generation(self):
+        with open(self.path, "rb") as log:
+            try:
+                urlhash, generation, _ = pickle.load(log)
+            except Exception:
+                return None
+        return generation if urlhash is None else None
+
+    def _read(self, path, start=0, end=None):
+        ''' Yields records of the log at path from offset start, stopping at
+            end or at a torn trailing record, which is cut off the log. '''
+        with open(path, "rb") as log:
+            log.seek(start)
+            while end is None or log.tell() < end:
+                offset = log.tell()
+                try:
+                    record = pickle.load(log)
+                except EOFError:
+                    # a record cut off after its first byte also ends this way
+                    if offset < os.fstat(log.fileno()).st_size:
+                        self._truncate(path, offset)
+                    break
+                except (pickle.UnpicklingError, ValueError, TypeError):
+                    self._truncate(path, offset)
+                    break
+                yield record
+
+    def _truncate(self, path, offset):
+        self.logger.warning(f"Dropping torn record at offset {offset} of {path}.")
+        os.truncate(path, offset)
+
+    def records(self):
+        ''' Replays the log in write order. Must run before the first write. '''
+        for record in self._read(self.path):
+            if record[0] is not None:
+                yield record
+
+    def marker(self):
+        ''' Commits the buffer and returns the position reached in the log. '''
+        with self.lock:
+            self.flush()
+            if self.generation is None:
+                return None
+            return (self.generation, self.log.tell())
+
+    def records_since(self, marker):
+        ''' Returns the records written after marker, or None if the log has
+            been rewritten since. Must run before the first write. '''
+        generation, offset = marker
+        if (generation != self.generation
+                or offset > os.path.getsize(self.path)):
+            return None
+        return self._read(self.path, start=offset)
+
+    def __setitem__(self, urlhash, value):
+        url, completed = value
+        with self.lock:
+            self.buffer.append((urlhash, url, completed))
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        ''' Group-commits every buffered record with a single write. '''
+        with self.lock:
+            if self.buffer:
+                with metrics.timer("persist_frontier"):
+                    self.log.write(b"".join(
+                        pickle.dumps(record) for record in self.buffer))
+                    self.log.flush()
+                    os.fsync(self.log.fileno())
+                self.buffer.clear()
+
+    def _flush_loop(self):
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+            size = self.log.tell()
+            if (not self.compacting and size > self.compact_min
+                    and size > self.compact_ratio * self.base_size):
+                self.compact()
+
+    def compact(self):
+        ''' Rewrites the log with the latest record of every url. Records
+            appended while the rewrite runs are copied over before the swap. '''
+        with self.lock:
+            self.flush()
+            self.compacting = True
+            offset = self.log.tell()
+        tmp_path = self.path + ".compact"
+        try:
+            latest = dict()
+            for urlhash, url, completed in self._read(self.path, end=offset):
+                if urlhash is not None:
+                    latest[urlhash] = (url, completed)
+            generation = uuid4().hex
+            with open(tmp_path, "wb") as tmp:
+                pickle.dump((None, generation, None), tmp)
+                for urlhash, (url, completed) in latest.items():
+                    pickle.dump((urlhash, url, completed), tmp)
+                with self.lock:
+                    self.flush()
+                    with open(self.path, "rb") as log:
+                        log.seek(offset)
+                        tmp.write(log.read())
+                    tmp.flush()
+                    os.fsync(tmp.fileno())
+                    self.log.close()
+                    os.replace(tmp_path, self.path)
+                    self.log = open(self.path, "ab")
+                    self.generation = generation
+                    self.base_size = self.log.tell()
+            self.logger.info(
+                f"Compacted {self.path} to {len(latest)} records.")
+        finally:
+            self.compacting = False
+
+    def close(self):
+        self.closed.set()
+        self.flusher.join()
+        with self.lock:
+            self.flush()
+            self.log.close()
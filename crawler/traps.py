@@ -0,0 +1,83 @@
+import re
+
+from collections import OrderedDict
+from threading import Lock
+from urllib.parse import urlsplit
+
+
+DATE = re.compile(r"\d{4}-\d{1,2}(?:-\d{1,2})?|\d{1,2}-\d{1,2}-\d{4}")
+DIGITS = re.compile(r"\d+")
+
+
+def url_template(url):
+    ''' The pattern url belongs to: the host and the path with dates and other
+        numbers collapsed, plus the sorted query keys without their values.
+        e.g. https://wics.ics.uci.edu/events/2019-05-01/?ical=1&page=2
+        -> wics.ics.uci.edu/events/<date>/?ical&page '''
+    parsed = urlsplit(url)
+    path = DIGITS.sub("<n>", DATE.sub("<date>", parsed.path))
+    keys = sorted({field.partition("=")[0] for field in parsed.query.split("&") if field})
+    return f"{parsed.netloc.lower()}{path}?{'&'.join(keys)}"
+
+
+class TrapDetector(object):
+    ''' Caps the number of urls crawled per url template, across all workers.
+
+        Calendars, paginated listings and diff views produce endless urls
+        that differ only in numbers, dates or query values. Each template
+        may admit TRAP_TEMPLATE_LIMIT urls (TRAP_DATE_LIMIT if it contains a
+        date), and a template is cut off once TRAP_ERROR_LIMIT of its urls
+        failed to download. Counts are kept for the TRAP_TEMPLATES most
+        recently seen templates. '''
+    def __init__(self, config):
+        self.template_limit = config.trap_template_limit
+        self.date_limit = config.trap_date_limit
+        self.error_limit = config.trap_error_limit
+        self.capacity = config.trap_templates
+        self.counts = OrderedDict()     # template -> [admitted, errors]
+        self.rejected = 0
+        self.lock = Lock()
+
+    def _counts(self, template):
+        counts = self.counts.get(template)
+        if counts is None:
+            counts = self.counts[template] = [0, 0]
+            if len(self.counts) > self.capacity:
+                self.counts.popitem(last=False)
+        else:
+            self.counts.move_to_end(template)
+        return counts
+
+    def admit(self, url):
+        ''' Counts url against its template. Returns False, without counting
+            it, if the template is over budget. '''
+        template = url_template(url)
+        limit = self.date_limit if "<date>" in template else self.template_limit
+        with self.lock:
+            counts = self._counts(template)
+            if counts[0] >= limit or counts[1] >= self.error_limit:
+                self.rejected += 1
+                return False
+            counts[0] += 1
+            return True
+
+    def blocked(self, url):
+        ''' Returns True if url's template has had too many download errors. '''
+        template = url_template(url)
+        with self.lock:
+            counts = self.counts.get(template)
+            return counts is not None and counts[1] >= self.error_limit
+
+    def record_error(self, url):
+        template = url_template(url)
+        with self.lock:
+            self._counts(template)[1] += 1
+
+    def state(self):
+        with self.lock:
+            return list(self.counts.items())
+
+    def restore(self, state):
+        with self.lock:
+            self.counts = OrderedDict(
+                (template, list(counts)) for template, counts in state)
@@ -0,0 +1,51 @@
+from heapq import heapify, heappush, heappop
+
+
+class SpaceSaving(object):
+    ''' Approximate word counts holding at most capacity words (Metwally et
+        al.'s space-saving algorithm). A new word evicts the least counted
+        one and inherits its count, so every count is an overestimate by at
+        most the evicted count, and any word more frequent than
+        total / capacity is guaranteed to be kept. '''
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = dict()
+        self.heap = list()      # (count, word), may hold stale counts
+
+    def update(self, freq):
+        ''' Adds a mapping of word -> count. '''
+        for word, count in freq.items():
+            if word in self.counts:
+                self.counts[word] += count
+            elif len(self.counts) < self.capacity:
+                self.counts[word] = count
+            else:
+                count += self._evict()
+                self.counts[word] = count
+            heappush(self.heap, (self.counts[word], word))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(count, word) for word, count in self.counts.items()]
+            heapify(self.heap)
+
+    def _evict(self):
+        while True:
+            count, word = heappop(self.heap)
+            if self.counts.get(word) == count:
+                del self.counts[word]
+                return count
+
+    def __getitem__(self, word):
+        return self.counts.get(word, 0)
+
+    def __contains__(self, word):
+        return word in self.counts
+
+    def __len__(self):
+        return len(self.counts)
+
+    def keys(self):
+        return self.counts.keys()
+
+    def items(self):
+        return self.counts.items()
+
@@ -1,14 +1,17 @@
-from threading import Thread
+from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 from inspect import getsource
-from utils.download import download
+from utils.download import download, async_download, async_session
 from utils import get_logger
-from collections import defaultdict
-from urllib.parse import urlparse
-import requests
+from utils.metrics import metrics
+from collections import Counter, deque
+import asyncio
+import multiprocessing
+import os
 
 import scraper
-import time
+from crawler.archive import ArchivedPage
 
 
 class Worker(Thread):
@@ -18,79 +21,330 @@ class Worker(Thread):
         self.frontier = frontier
         self.reporter = reporter
 
-        self.similar_count = 0      # counts number of subsequent URLs in the frontier
-        self.prev_url = ''          # keep track of previous crawled URL to detect similarities
-        self.bad_url = True         # keep track of URLs which give a non-200 status code
+        self.freq = Counter()       # word counts not yet merged into the reporter
+        self.pages = list()         # (url, word count) of the pages counted in self.freq
 
         # basic check for requests in scraper
         assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {-1}, "Do not use requests from scraper.py"
         super().__init__(daemon=True)
-        
+
     def run(self):
         while True:
             tbd_url = self.frontier.get_tbd_url()
             if not tbd_url:
                 self.logger.info("Frontier is empty. Stopping Crawler.")
                 break
-            parsed = urlparse(tbd_url)
-            print('Scraping', tbd_url)
-            
-            # don't crawl too many similar URL's subsequently, to avoid loops
-            # too many URL's with dates in a row tend to have little info
-            if scraper.mostlySimilar(tbd_url, self.prev_url) or scraper.containsDate(tbd_url):
-                print('similar:', self.similar_count)
-                self.prev_url = tbd_url
-                self.similar_count += 1
-                if self.similar_count > 10:
-                    self.reporter.addPage(tbd_url)
-                    self.frontier.mark_url_complete(tbd_url)
-                    continue
-                
-                # avoid URL's that gave download errors on previous crawls
-                if self.bad_url:
-                    self.frontier.mark_url_complete(tbd_url)
-                    continue
-            else:
-                self.similar_count = 0      # different URL, reset count
-            
-            self.prev_url = tbd_url
+            self.crawl(tbd_url)
+
+        # report statistics when finished
+        self.reporter.merge_pages(self.pages, self.freq)
+        self.reporter.writeReport()
+
+    def crawl(self, tbd_url):
+        ''' Downloads and processes tbd_url, unless skip says not to. Always
+            completes it, since other workers wait for it to finish. '''
+        try:
+            if self.skip(tbd_url):
+                return
 
             # download URL
             resp = download(tbd_url, self.config, self.logger)
-            self.logger.info(
-                f"Downloaded {tbd_url}, status <{resp.status}>, "
-                f"using cache {self.config.cache_server}.")
-            if resp.status != 200:
-                print(tbd_url, 'gave error code', resp.status)
-                self.bad_url = True
-                self.frontier.mark_url_complete(tbd_url)
-                continue
-            else:
-                self.bad_url = False
+            self.process(tbd_url, resp)
+        except Exception:
+            self.fail(tbd_url)
+        finally:
+            self.frontier.release(tbd_url)
 
-            # check if site has a robots.txt file
-            hasRobots = False
-            try:
-                robotsResp = requests.get(parsed.scheme + '://' + parsed.netloc + '/robots.txt')
-                if robotsResp.status_code == 200:
-                    hasRobots = True
-            except :
-                print('connection refused')
-                time.sleep(2)
-                self.frontier.mark_url_complete(tbd_url)
-                continue
+    def fail(self, tbd_url):
+        ''' Counts an unexpected error while crawling tbd_url like a download
+            error, against its url template and its host. '''
+        self.logger.exception(f"Error crawling {tbd_url}, skipping it.")
+        metrics.inc("crawl_errors")
+        self.frontier.traps.record_error(tbd_url)
+        self.frontier.record_fetch(tbd_url, None, 599)
+
+    def skip(self, tbd_url):
+        ''' Marks tbd_url complete without downloading it if URLs like it keep giving
+            download errors, the site's robots.txt does not allow it, or its page
+            from an earlier crawl is recent enough to reuse. Puts it back in the
+            frontier for later if the site's robots.txt is unreachable. '''
+        self.logger.debug("Scraping %s", tbd_url)
+
+        # avoid URL's like ones that gave download errors before, e.g. a broken calendar
+        if self.frontier.traps.blocked(tbd_url):
+            self.logger.info(f"Skipped {tbd_url}, too many errors for URLs like it.")
+            metrics.inc("trap_blocked")
+            self.frontier.mark_url_complete(tbd_url)
+            return True
 
-            # scrape URLs from webpage, also get page contents
-            scraped_urls, word_count = scraper.scraper(tbd_url, resp, self.reporter.all_freq, robots=hasRobots)
-            if word_count >= 0:
-                self.reporter.collect_data(tbd_url, word_count)
+        # respect the site's robots.txt
+        with metrics.timer("robots"):
+            rules = self.frontier.robots.get(tbd_url)
+        if rules is None:
+            # the site may be down for now, so try again once robots.txt is
+            # fetched again rather than lose its urls
+            metrics.inc("robots_unreachable")
+            failures, retry_at = self.frontier.robots.unreachable(tbd_url)
+            if failures <= self.config.robots_retries:
+                self.logger.info(f"Deferred {tbd_url}, robots.txt unreachable.")
+                self.frontier.record_fetch(tbd_url, None, 599)
+                self.frontier.defer(tbd_url, retry_at)
+                return True
+            self.logger.info(f"Crawling {tbd_url} without robots.txt, it stayed unreachable.")
+        elif not rules.can_fetch('*', tbd_url):
+            self.logger.info(f"Skipped {tbd_url}, not allowed by robots.txt.")
+            metrics.inc("robots_disallowed")
+            self.frontier.mark_url_complete(tbd_url)
+            return True
+
+        # reuse the page fetched last time if it is not due for a revisit yet
+        if self.reporter.history is not None:
+            page = self.reporter.history.fresh(tbd_url)
+            if page is not None:
+                self.logger.debug("Reused %s, fetched recently.", tbd_url)
+                metrics.inc("pages_reused")
+                scraped_urls, word_count = scraper.recordPage(
+                    page, self.freq, robots=rules, dedup=self.reporter.dedup)
+                self.record(tbd_url, scraped_urls, word_count, fetched=False)
+                return True
+        return False
+
+    def process(self, tbd_url, resp):
+        ''' Scrapes a downloaded page, records its data and adds its links to the frontier. '''
+        if not self.check_status(tbd_url, resp):
+            return
+
+        # scrape URLs from webpage, also get page contents, in the steps of
+        # scraper.scraper but keeping the links' hashes for the frontier
+        rules = self.frontier.robots.get(tbd_url)
+        history = self.reporter.history
+        validators = history.validators(resp) if history is not None else None
+        page = self.unchanged(tbd_url, validators) if validators is not None else None
+        if page is None:
+            page = self.analyze(tbd_url, resp)
+            if page is not None and validators is not None:
+                history.update(tbd_url, validators, page)
+        scraped_urls, word_count = scraper.recordPage(
+            page, self.freq, robots=rules, dedup=self.reporter.dedup) \
+            if page is not None else ([], -1)
+        self.record(tbd_url, scraped_urls, word_count)
 
-            # add scraped URLs to frontier
-            for scraped_url in scraped_urls:
-                self.frontier.add_url(scraped_url)
+    def unchanged(self, tbd_url, validators):
+        ''' Returns the page saved for tbd_url if the download shows it did
+            not change since, so it need not be parsed again. '''
+        page = self.reporter.history.unchanged(tbd_url, validators)
+        if page is not None:
+            self.logger.debug("%s did not change, reusing its last scrape.", tbd_url)
+            metrics.inc("pages_unchanged")
+        return page
+
+    def analyze(self, tbd_url, resp):
+        ''' Returns the scraper.Page of a downloaded page, None if the scraper failed. '''
+        raw = resp.raw_response
+        dedup = self.reporter.dedup
+        try:
+            return scraper.analyzePage(
+                raw.url, raw.content, raw.headers.get('Content-Type', ''),
+                dedup.fingerprint if dedup is not None else None,
+                self.config.max_page_size)
+        except Exception:
+            self.logger.exception(f"Error scraping {tbd_url}, skipping the page.")
+            return None
+
+    def check_status(self, tbd_url, resp):
+        ''' Returns True if the download succeeded, otherwise marks tbd_url complete. '''
+        self.logger.debug(
+            "Downloaded %s, status <%s>, using cache %s.",
+            tbd_url, resp.status, self.config.cache_server)
+        self.frontier.record_fetch(tbd_url, resp.elapsed, resp.status)
+        if resp.status != 200:
+            self.logger.info(f"Downloading {tbd_url} gave error code {resp.status}.")
+            metrics.inc("download_errors")
+            self.frontier.traps.record_error(tbd_url)
+            self.frontier.record_yield(tbd_url, False)
             self.frontier.mark_url_complete(tbd_url)
-            time.sleep(self.config.time_delay)
-        
+            return False
+        if self.reporter.archive is not None:
+            self.archive_page(tbd_url, resp)
+        return True
+
+    def archive_page(self, tbd_url, resp):
+        raw = resp.raw_response
+        if raw is not None:
+            self.reporter.archive.append(ArchivedPage(
+                tbd_url, raw.url, resp.status, dict(raw.headers), raw.content))
+
+    def record(self, tbd_url, scraped_urls, word_count, fetched=True):
+        ''' Records a scraped page's data and adds its links, (url, urlhash)
+            pairs from scraper.recordPage, to the frontier. fetched is False
+            for a page reused without downloading it. '''
+        # pages that were skipped, duplicates or errors count against their host
+        self.frontier.record_yield(tbd_url, word_count > 0)
+        if word_count < 0:
+            metrics.inc("pages_failed")
+        else:
+            metrics.inc("pages_scraped")
+            self.pages.append((tbd_url, word_count))
+
+        # add scraped URLs to frontier, hashed by the scraper rather than under its lock
+        depth = self.frontier.depth(tbd_url) + 1
+        with metrics.timer("frontier_add"):
+            self.frontier.add_urls(scraped_urls, depth)
+        metrics.inc("urls_scraped", len(scraped_urls))
+        # a counted page's url is committed by the frontier once its stats are saved,
+        # so a crash before that crawls it again rather than lose its counts
+        self.frontier.mark_url_complete(tbd_url, fetched, commit=word_count < 0)
+        if len(self.pages) >= self.config.freq_merge_interval:
+            self.reporter.merge_pages(self.pages, self.freq)
+
+
+class AsyncWorker(Worker):
+    ''' Keeps up to ASYNC_CONCURRENCY downloads in flight over pooled keep-alive
+        connections to the cache server. Pages are processed one at a time on
+        a separate thread so the event loop only waits on the network. The
+        frontier still hands out one url per host at a time. '''
+    def run(self):
+        with ThreadPoolExecutor(max_workers=1) as self.executor:
+            asyncio.run(self._crawl())
+
+        # report statistics when finished
+        self.reporter.merge_pages(self.pages, self.freq)
+        self.reporter.writeReport()
+
+    async def _crawl(self):
+        async with async_session(self.config) as session:
+            await asyncio.gather(*(
+                self._crawl_loop(session)
+                for _ in range(self.config.async_concurrency)))
+
+    async def _crawl_loop(self, session):
+        loop = asyncio.get_running_loop()
+        while True:
+            tbd_url, wait = self.frontier.poll_tbd_url()
+            if wait is None:
+                self.logger.info("Frontier is empty. Stopping Crawler.")
+                break
+            if not tbd_url:
+                await asyncio.sleep(wait)
+                continue
+            # caught here, as raising would cancel every other loop of gather.
+            # Failing and releasing take the frontier's lock, and releasing may
+            # write a checkpoint, so they run off the event loop like process
+            try:
+                if await loop.run_in_executor(self.executor, self.skip, tbd_url):
+                    continue
+
+                # download URL
+                resp = await async_download(tbd_url, self.config, session, self.logger)
+                await loop.run_in_executor(self.executor, self.process, tbd_url, resp)
+            except Exception:
+                await loop.run_in_executor(self.executor, self.fail, tbd_url)
+            finally:
+                await loop.run_in_executor(self.executor, self.frontier.release, tbd_url)
+
+
+_parse_pool = None
+_parse_pool_lock = Lock()
+
+def get_parse_pool(config):
+    ''' Returns the process-wide pool of PARSE_PROCESSES processes that analyze
+        pages for every PipelineWorker. '''
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # spawned, not forked: forking copies locks other threads may hold
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=config.parse_processes or os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"))
+        return _parse_pool
+
+def _analyze(pickled_response, fingerprint, max_size):
+    ''' Runs in a parse process: returns the analyzed page with the stage
+        timings it took, for the crawler process's metrics. '''
+    return scraper.analyzeResponse(pickled_response, fingerprint, max_size), metrics.take_timers()
+
+
+class PipelineWorker(Worker):
+    ''' Downloads pages and hands them to a pool of processes shared by all
+        workers, which parse, tokenize and filter them outside this process's
+        GIL and send back only the links, word count and word frequencies.
+        Each worker keeps downloading while up to PARSE_BACKLOG of its pages
+        are being parsed, then waits for the oldest. '''
+    def __init__(self, worker_id, config, frontier, reporter):
+        super().__init__(worker_id, config, frontier, reporter)
+        self.pool = get_parse_pool(config)
+        self.fingerprint = reporter.dedup.fingerprint if reporter.dedup is not None else None
+
+    def run(self):
+        pending = deque()       # (url, validators, future) of pages being parsed, oldest first
+        while True:
+            if pending and (len(pending) >= self.config.parse_backlog or pending[0][2].done()):
+                self.finish(*pending.popleft())
+                continue
+            tbd_url, _ = self.frontier.poll_tbd_url()
+            if not tbd_url:
+                if pending:
+                    # nothing to download yet, so wait for a page instead
+                    self.finish(*pending.popleft())
+                    continue
+                tbd_url = self.frontier.get_tbd_url()
+                if not tbd_url:
+                    self.logger.info("Frontier is empty. Stopping Crawler.")
+                    break
+            # a url handed to the pool is completed by finish, any other here
+            try:
+                submitted = self.submit(tbd_url)
+            except Exception:
+                self.fail(tbd_url)
+                submitted = None
+            if submitted is None:
+                self.frontier.release(tbd_url)
+            else:
+                pending.append((tbd_url, *submitted))
+
         # report statistics when finished
+        self.reporter.merge_pages(self.pages, self.freq)
         self.reporter.writeReport()
 
+    def submit(self, tbd_url):
+        ''' Downloads tbd_url and hands its page to the pool. Returns the page's
+            validators and future, or None if the url needs no parsing. '''
+        if self.skip(tbd_url):
+            return None
+
+        # download URL
+        resp = download(tbd_url, self.config, self.logger)
+        if not self.check_status(tbd_url, resp):
+            return None
+        pickled = resp.pickled_response
+        history = self.reporter.history
+        validators = history.validators(resp) if history is not None else None
+        page = self.unchanged(tbd_url, validators) if validators is not None else None
+        if page is not None:
+            rules = self.frontier.robots.get(tbd_url)
+            self.record(tbd_url, *scraper.recordPage(
+                page, self.freq, robots=rules, dedup=self.reporter.dedup))
+            return None
+        return validators, self.pool.submit(
+            _analyze, pickled, self.fingerprint, self.config.max_page_size)
+
+    def finish(self, tbd_url, validators, future):
+        ''' Records a page once its process has analyzed it. '''
+        try:
+            try:
+                page, timers = future.result()
+            except Exception:
+                self.logger.exception(f"Error scraping {tbd_url}, skipping the page.")
+                scraped_urls, word_count = [], -1
+            else:
+                metrics.merge_timers(timers)
+                if validators is not None:
+                    self.reporter.history.update(tbd_url, validators, page)
+                rules = self.frontier.robots.get(tbd_url)
+                scraped_urls, word_count = scraper.recordPage(
+                    page, self.freq, robots=rules, dedup=self.reporter.dedup)
+            self.record(tbd_url, scraped_urls, word_count)
+        except Exception:
+            self.fail(tbd_url)
+        finally:
+            self.frontier.release(tbd_url)
@@ -4,20 +4,41 @@ from argparse import ArgumentParser
 from utils.server_registration import get_cache_server
 from utils.config import Config
 from crawler import Crawler
+from crawler.cluster import ClusterFrontier, configure_node
+from crawler.frontier import Frontier
+from crawler.worker import Worker, AsyncWorker, PipelineWorker
 
+WORKERS = {"threaded": Worker, "async": AsyncWorker, "pipeline": PipelineWorker}
 
-def main(config_file, restart):
+
+def main(config_file, restart, node_id, recrawl=False):
     cparser = ConfigParser()
     cparser.read(config_file)
     config = Config(cparser)
+    if recrawl and not config.history_file:
+        print(f"No page history to recrawl with, set HISTORY_FILE in {config_file}.")
+        return
+    # a new crawl that keeps the page history, to skip unchanged pages
+    config.recrawl = recrawl
+    restart = restart or recrawl
+    frontier_factory = Frontier
+    if config.cluster_nodes:
+        # one process of a cluster crawl, see [CLUSTER] in config.ini
+        configure_node(config, node_id)
+        frontier_factory = ClusterFrontier
     config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
+    worker_factory = WORKERS.get(config.engine, Worker)
+    crawler = Crawler(
+        config, restart, frontier_factory=frontier_factory,
+        worker_factory=worker_factory)
     crawler.start()
 
 
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--restart", action="store_true", default=False)
+    parser.add_argument("--recrawl", action="store_true", default=False)
     parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--node_id", type=int, default=0)
     args = parser.parse_args()
-    main(args.config_file, args.restart)
+    main(args.config_file, args.restart, args.node_id, args.recrawl)
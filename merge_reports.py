@@ -0,0 +1,50 @@
+''' Combines the stats of every node of a cluster crawl (see [CLUSTER] in
+    config.ini), each saved in its own stats database, into one stats database
+    and report, as if the crawl had run in one process.
+
+    Run it once the nodes are done, or to see the progress of a running crawl
+    as of the nodes' last saves.
+
+    python3 merge_reports.py [--config_file config.ini]
+'''
+import os
+
+from argparse import ArgumentParser
+from copy import copy
+from configparser import ConfigParser
+
+from crawler.cluster import configure_node
+from crawler.reporter import Reporter
+from utils.config import Config
+
+
+def main(config_file):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    if not config.cluster_nodes:
+        print(f"No cluster to merge, set NODES in the [CLUSTER] section of {config_file}.")
+        return
+    config.archive_dir = ""
+    config.history_file = ""
+    reporter = Reporter(config, True)
+    merged = 0
+    for node_id in range(len(config.cluster_nodes)):
+        stats_file = configure_node(copy(config), node_id).stats_file
+        if not os.path.exists(stats_file):
+            print(f"No stats from node {node_id}, {stats_file} not found.")
+            continue
+        reporter.merge_stats_file(stats_file)
+        merged += 1
+
+    reporter.report()
+    reporter.close()
+    print(f"Merged the stats of {merged} of {len(config.cluster_nodes)} nodes "
+          f"into {config.stats_file}. Report written to {config.report_file}.")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    args = parser.parse_args()
+    main(args.config_file)
@@ -0,0 +1,115 @@
+''' Reruns the scraper on the pages a crawl archived (see ARCHIVE_DIR in
+    config.ini) and writes a new report, without downloading anything.
+
+    Pages are analyzed in a pool of processes, chunks of each segment read
+    through mmap, and recorded in archive order so duplicates are decided as
+    in the crawl. robots.txt is not checked again.
+
+    python3 reprocess.py [--config_file config.ini] [--archive dir]
+        [--processes N] [--report report.reprocess.txt]
+'''
+import multiprocessing
+import os
+import time
+
+from argparse import ArgumentParser
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from configparser import ConfigParser
+
+import scraper
+from crawler.archive import segments, read_index, read_records
+from crawler.reporter import Reporter
+from utils.config import Config
+
+CHUNK = 256     # pages per task
+
+
+def content_type(headers):
+    for name, value in headers.items():
+        if name.lower() == "content-type":
+            return value
+    return ""
+
+
+def analyze(segment, entries, fingerprint, max_size):
+    ''' Returns (url, Page) of each page in entries of segment, Page None if
+        the scraper failed on it. '''
+    pages = []
+    for page in read_records(segment, entries):
+        try:
+            analyzed = scraper.analyzePage(
+                page.final_url, page.content, content_type(page.headers), fingerprint,
+                max_size)
+        except Exception:
+            analyzed = None
+        pages.append((page.url, analyzed))
+    return pages
+
+
+def main(config_file, archive_dir, processes, report_file):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    archive_dir = archive_dir or config.archive_dir
+    if not archive_dir or not segments(archive_dir):
+        print(f"No archive found in {archive_dir!r}, set ARCHIVE_DIR in {config_file}.")
+        return
+    # keeps the crawl's own stats and report
+    config.stats_file = os.path.splitext(report_file)[0] + ".db"
+    config.report_file = report_file
+    config.archive_dir = ""
+    config.history_file = ""
+    reporter = Reporter(config, True)
+    fingerprint = reporter.dedup.fingerprint if reporter.dedup is not None else None
+    tasks = [(segment, entries[i:i + CHUNK])
+             for segment in segments(archive_dir)
+             for entries in [read_index(segment)]
+             for i in range(0, len(entries), CHUNK)]
+
+    start = time.perf_counter()
+    count = links = 0
+    freq = Counter()
+
+    def record(pages):
+        nonlocal count, links
+        for url, page in pages:
+            count += 1
+            if page is None:
+                continue
+            scraped_urls, word_count = scraper.recordPage(page, freq, dedup=reporter.dedup)
+            links += len(scraped_urls)
+            reporter.collect_data(url, word_count)
+        reporter.merge_freq(freq)
+
+    if processes == 1:
+        for task in tasks:
+            record(analyze(*task, fingerprint, config.max_page_size))
+    else:
+        processes = processes or os.cpu_count()
+        with ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn")) as pool:
+            pending = deque()       # in archive order
+            for task in tasks:
+                if len(pending) >= 2 * processes:
+                    record(pending.popleft().result())
+                pending.append(pool.submit(analyze, *task, fingerprint, config.max_page_size))
+            while pending:
+                record(pending.popleft().result())
+
+    elapsed = time.perf_counter() - start
+    reporter.report()
+    reporter.close()
+    print(f"Reprocessed {count} pages ({links} links) in {elapsed:.1f}s, "
+          f"{count / elapsed:.0f} pages/sec. Report written to {report_file}.")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--archive", type=str, default=None)
+    parser.add_argument("--processes", type=int, default=0)
+    parser.add_argument("--report", type=str, default="report.reprocess.txt")
+    args = parser.parse_args()
+    main(args.config_file, args.archive, args.processes, args.report)
@@ -1,67 +1,100 @@
-from math import fabs
 import re
-from urllib.parse import urlparse, urldefrag, parse_qsl
-import urllib.robotparser
-from nltk.tokenize import word_tokenize
-from collections import defaultdict
-from bs4 import BeautifulSoup
-from difflib import SequenceMatcher
-
-def scraper(url, resp, allFreq, robots=False):
-    links, numWords = extract_next_links(url, resp, allFreq, robots)
-    return ([link for link in links if is_valid(link)], numWords)
-
-def mostlySimilar(a, b):
-    ''' Returns true if (1) the two URL's share the same scheme, domain, and path, or (2) if they are 95% textually similar '''
-    aParsed = urlparse(a)
-    bParsed = urlparse(b)
-
-    # if all matching except query or
-    # if URL's are 95% similar
-    return (aParsed.scheme == bParsed.scheme and aParsed.netloc == bParsed.netloc and \
-    (aParsed.path == bParsed.path or (aParsed.path != '' and bParsed.path != '' and aParsed.path.split('/')[:-1] == bParsed.path.split('/')[:-1]))) or \
-        (SequenceMatcher(None, a, b).ratio() >= 0.95)
-        
-def containsDate(s):
-    parts = s.split('-')
-    if len(parts) < 3:
-        return False
-    middleIndex = -1
-    for i in range(len(parts)):
-        if len(parts[i]) == 2:
-            middleIndex = i
-            break
-    if middleIndex == -1 or not parts[middleIndex].isdigit():
-        return False
-    if middleIndex + 1 < len(parts) and len(parts[middleIndex+1]) >= 2 and not parts[middleIndex+1][0:2].isdigit():
-        return False
-    if middleIndex - 1 >= 0 and len(parts[middleIndex-1]) >= 2 and not parts[middleIndex-1][-2:].isdigit():
-        return False
-    print('contains date')
-    return True
-
+import pickle
+import time
+from urllib.parse import urlparse
+from collections import Counter, namedtuple
+from lxml import etree
+from utils import get_logger, canonicalize
+from utils.metrics import metrics
+
+logger = get_logger("SCRAPER")
+
+# default of MAX_PAGE_SIZE in config.ini, in bytes
+maxPageSize = 3000000
+
+def scraper(url, resp, allFreq, robots=None, dedup=None, maxSize=maxPageSize):
+    # extract_next_links returns only valid links
+    return extract_next_links(url, resp, allFreq, robots, dedup, maxSize)
+
+# alphabetic words of 2+ letters that are not part of a longer token like
+# 'x86', 'e-mail', 'o'neil', 'café', 'www.ics.uci.edu', 'file.html', 'and/or'
+# or '~user', which word_tokenize also dropped: a word ends at a space or at
+# punctuation word_tokenize splits off, and at a period only before a space,
+# another period or the end, as at the end of a sentence. Like word_tokenize,
+# "don't" counts as 'do' and "it's" as it, a quote opening a word is split off
+# it ('quoted' counts as quoted) but a clitic like 're or 'll is one token
+wordPattern = re.compile(
+    r"(?<![\w/~^+=|\\-])(?<![\w\0]')(?<!(?<!\.)\.)(?!(?<=')(?<!'')(?:re|ve|ll)\b)"
+    r"[a-z]{2,}(?=\0|(?:n't|'(?:s|m|d|ll|re|ve)?)?"
+    r"(?:''|'?(?:[\s;@#$%&?!()\[\]{}<>\",*`:]|\.(?:[\s.]|$)|$)))")
+
+# words word_tokenize splits in two wherever they are, marked off by NULs,
+# which end a word but do not make a period before them end a sentence
+splitWords = {'cannot': '\0can\0not\0', 'gimme': '\0gim\0me\0', 'gonna': '\0gon\0na\0',
+              'gotta': '\0got\0ta\0', 'lemme': '\0lem\0me\0', 'wanna': '\0wan\0na\0',
+              "more'n": "\0more\0'n\0"}
+splitPattern = re.compile(r'\b(?:' + '|'.join(splitWords) + r')\b')
+
+def pageWords(text: str):
+    ''' Returns the words of the text in order. '''
+    text = splitPattern.sub(lambda match: splitWords[match.group()], text.lower())
+    return wordPattern.findall(text)
 
-        
 def tokenFrequencies(text: str, freq: dict):
-    ''' Counts occurrences of words in the text and records their frequencies. Returns number of words in the text. '''
-    if len(text) == 0: 
-        return 0
-    tokens = word_tokenize(text)
-    alpha = re.compile(r'^[a-zA-Z]+$')
-    numWords = 0
-    pageFreq = defaultdict(int)
+    ''' Counts occurrences of words in the text and records their frequencies. Returns number of words in the text
+        and the page's own word frequencies. '''
+    pageFreq = Counter(pageWords(text))
+    for word, count in pageFreq.items():
+        freq[word] += count
+
+    return (sum(pageFreq.values()), pageFreq)
+
+
+class PageExtractor(object):
+    ''' lxml parser target that collects the visible text and the anchor hrefs
+        of a page in one pass, without building a tree. '''
+    hidden = frozenset(['script', 'style'])
+
+    def __init__(self):
+        self.text = []
+        self.hrefs = []
+        self.hiddenDepth = 0
+
+    def start(self, tag, attrib):
+        if tag in self.hidden:
+            self.hiddenDepth += 1
+        elif tag == 'a':
+            href = attrib.get('href')
+            if href is not None:
+                self.hrefs.append(href)
 
-    # count how many appearances of each token in the token list
-    for t in tokens:
-        if len(t) > 1 and re.match(alpha, t):
-            freq[t.lower()] += 1
-            pageFreq[t.lower()] += 1
-            numWords += 1
+    def end(self, tag):
+        if tag in self.hidden:
+            self.hiddenDepth -= 1
 
-    return (numWords, pageFreq)
+    def data(self, data):
+        if not self.hiddenDepth:
+            self.text.append(data)
 
+    def close(self):
+        return (''.join(self.text), self.hrefs)
 
-def extract_next_links(url, resp, allFreq, hasRobots):
+
+def parsePage(content):
+    ''' Returns the visible text of an HTML page and the hrefs of its anchors. '''
+    if not content:
+        return ('', [])
+    try:
+        # undeclared pages are usually utf-8, which lxml would read as latin-1
+        content = content.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
+    parser = etree.HTMLParser(target=PageExtractor())
+    parser.feed(content)
+    return parser.close()
+
+
+def extract_next_links(url, resp, allFreq, robots, dedup=None, maxSize=maxPageSize):
     # Implementation required.
     # url: the URL that was used to get the page
     # resp.url: the actual url of the page
@@ -70,131 +103,257 @@ def extract_next_links(url, resp, allFreq, hasRobots):
     # resp.raw_response: this is where the page actually is. More specifically, the raw_response has two parts:
     #         resp.raw_response.url: the url, again
     #         resp.raw_response.content: the content of the page!
-
-    pageText = ''
-    scrapedURLs = []
-    numWords = 0
     try:
-        if resp.status == 200:
-            parentURL = urlparse(resp.raw_response.url)
-
-            # skip files that are too large in bytes (greater than 3 MB)
-            print('page size in bytes:', len(resp.raw_response.content))
-            if len(resp.raw_response.content) > 3000000:
-                print('PAGE TOO LARGE')
-                return([], 0)
-
-            # create robots file parser if the site has a robots.txt file
-            rfp = None
-            if hasRobots:
-                print('HAS ROBOTS.TXT', parentURL.scheme + '://' + parentURL.netloc + '/robots.txt')
-                rfp = urllib.robotparser.RobotFileParser()
-                rfp.set_url(parentURL.scheme + '://' + parentURL.netloc + '/robots.txt')
-                rfp.read()
-                if not rfp.can_fetch('*', resp.raw_response.url):
-                    return ([], 0)
-
-            # parse page content from response
-            soup = BeautifulSoup(resp.raw_response.content, "lxml")
-            
-            # tokenize page content
-            pageText = soup.get_text().lower()
-
-            numWords, pageFreq = tokenFrequencies(pageText, allFreq)
-
-            # skip pages with very few distinct words
-            if len(pageFreq.keys()) < 10:
-                return ([], 0)
-
-            # skip pages that have spam words
-            if len(pageFreq.keys()) > 0 and pageFreq[sorted(pageFreq.keys(), key=(lambda x: pageFreq[x]), reverse=True)[0]] / float(numWords) >= 0.5:
-                return ([],  0)
-
-            # don't parse extremely large files or extremely small files
-            if numWords > 50000 or numWords < 50:
-                return([], 0)
-
-            # find every link on the page
-            for link in soup.find_all('a'):
-                pageURL = link.get('href')
-                # invalid URL's
-                if pageURL == None or len(pageURL) < 5 or type(pageURL) != str:
-                    continue
-
-                urlParts = urlparse(pageURL)
-
-                # remove fragment
-                pageURL = urldefrag(pageURL).url
-
-                # skip duplicate URLs (leads to the same page)
-                if pageURL == urldefrag(resp.raw_response.url).url:
-                    continue
-
-                # check if crawling is allowed in robots.txt
-                if rfp != None and not rfp.can_fetch('*', pageURL):
-                    print('NO PERMISSIONS')
-                    continue
-
-                # for relative paths, convert back to absolute paths
-                if urlParts.scheme not in set(["http", "https"]) and urlParts.netloc == '':
-                    if pageURL.startswith('//'):
-                        pageURL = parentURL.scheme + ':' + pageURL
-                    else:
-                        pageURL = parentURL.scheme + '://' + parentURL.netloc + pageURL
-
-                # add url to list
-                scrapedURLs.append(pageURL)
-        else:
+        if resp.status != 200:
             return ([], -1)
-
-
-        # prioritize links from a different domain
-        # secondarily, prioritize short links (tend to give more info)
-        scrapedURLs.sort(key=(lambda u: (urlparse(u).netloc == parentURL.netloc, len(u))))
-
+        raw = resp.raw_response
+        page = analyzePage(raw.url, raw.content, raw.headers.get('Content-Type', ''),
+                           dedup.fingerprint if dedup != None else None, maxSize)
+        links, numWords = recordPage(page, allFreq, robots, dedup)
+        # Return a list with the hyperlinks scrapped from resp.raw_response.content
+        return ([link for link, _ in links], numWords)
     except:
-        print('ERROR CAUGHT, SKIP PAGE')
+        logger.exception('Error scraping %s, skipping the page', url)
         return ([], -1)
 
-    # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
-    return (scrapedURLs, numWords)
 
-def is_valid(url):
-    # Decide whether to crawl this url or not. 
-    # If you decide to crawl it, return True; otherwise return False.
-    # There are already some conditions that return False.
-    try:
+# what analyzePage keeps of a page: the valid links to other sites and to the page's
+# own site, as (url, urlhash) pairs from canonicalize, the word count used for the
+# report (0 if the page is skipped), the page's word frequencies and its duplicate
+# fingerprint
+Page = namedtuple('Page', ['links', 'localLinks', 'numWords', 'pageFreq', 'fingerprint'])
+
+def skippedPage(pageFreq=None, fingerprint=None):
+    return Page([], [], 0, pageFreq if pageFreq != None else Counter(), fingerprint)
+
+
+def analyzePage(url, content, contentType, fingerprint=None, maxSize=maxPageSize):
+    ''' Parses a downloaded page into a Page. Uses no shared state, so pages can be
+        analyzed in other processes, recordPage then adds the results to the crawl.
+        fingerprint(text, words) computes the page's duplicate fingerprint, if given. '''
+
+    # skip files that are too large in bytes (greater than MAX_PAGE_SIZE)
+    logger.debug('%s: %d bytes', url, len(content))
+    if len(content) > maxSize:
+        logger.info('Skipped %s, page too large', url)
+        return skippedPage()
+
+    # skip files that are not text (images, pdfs, archives...)
+    if contentType and not (contentType.startswith('text/') or 'html' in contentType or 'xml' in contentType):
+        logger.info('Skipped %s, not text: %s', url, contentType)
+        return skippedPage()
+
+    # parse page content from response
+    with metrics.timer('parse'):
+        pageText, hrefs = parsePage(content)
+
+    # tokenize page content
+    with metrics.timer('tokenize'):
+        words = pageWords(pageText)
+        pageFreq = Counter(words)
+        numWords = len(words)
+    pageFingerprint = None
+    if fingerprint != None:
+        with metrics.timer('fingerprint'):
+            pageFingerprint = fingerprint(pageText, words)
+
+    # skip pages with very few distinct words
+    if len(pageFreq.keys()) < 10:
+        return skippedPage(pageFreq, pageFingerprint)
+
+    # skip pages that have spam words
+    if len(pageFreq.keys()) > 0 and pageFreq[sorted(pageFreq.keys(), key=(lambda x: pageFreq[x]), reverse=True)[0]] / float(numWords) >= 0.5:
+        return skippedPage(pageFreq, pageFingerprint)
+
+    # don't parse extremely large files or extremely small files
+    if numWords > 50000 or numWords < 50:
+        return skippedPage(pageFreq, pageFingerprint)
+
+    # find every link on the page, each once
+    filterStart = time.perf_counter()
+    links = []
+    localLinks = []
+    parentURL = canonicalize(url)
+    seen = set([parentURL[1]]) if parentURL != None else set()
+    site = urlparse(parentURL[0] if parentURL != None else url).netloc
+    for pageURL in hrefs:
+        # invalid URL's
+        if pageURL == None or type(pageURL) != str:
+            continue
+
+        # resolve relative paths against the page, and write every variant of a url
+        # (host case, default port, fragment, tracking fields, query order) the same way
+        link = canonicalize(pageURL, url)
+
+        # skip links that are not web pages and duplicate URLs (lead to the same page)
+        if link == None or link[1] in seen:
+            continue
+        seen.add(link[1])
+
+        # links to the same site still have to pass its robots.txt in recordPage
+        if sameSite(link[0], site):
+            localLinks.append(link)
+        else:
+            links.append(link)
+
+    # the frontier decides the crawl order (see PRIORITY in config.ini)
+    page = Page(filter_valid_links(links), filter_valid_links(localLinks), numWords, pageFreq, pageFingerprint)
+    metrics.observe('filter', time.perf_counter() - filterStart)
+    return page
+
+
+def sameSite(canonicalURL, netloc):
+    ''' Returns true if a url from canonicalize is on the site netloc, without parsing it. '''
+    rest = canonicalURL.partition('://')[2]
+    return rest.startswith(netloc) and rest[len(netloc):len(netloc) + 1] in ('', '/', '?')
+
+
+def analyzeResponse(pickledResponse, fingerprint=None, maxSize=maxPageSize):
+    ''' analyzePage for a pickled requests.Response, to run in another process. '''
+    raw = pickle.loads(pickledResponse)
+    return analyzePage(raw.url, raw.content, raw.headers.get('Content-Type', ''), fingerprint, maxSize)
+
+
+def recordPage(page, allFreq, robots=None, dedup=None):
+    ''' Adds an analyzed page to the crawl: skips it if it duplicates a page seen before,
+        otherwise counts its words and returns its links the site's robots.txt allows,
+        as (url, urlhash) pairs for Frontier.add_urls, with its word count. '''
+    # skip copies of pages already crawled, their words and links were counted
+    if dedup != None and page.fingerprint != None:
+        duplicate = dedup.add(*page.fingerprint)
+        if duplicate:
+            metrics.inc('duplicate_pages')
+            return ([], 0)
+
+    for word, count in page.pageFreq.items():
+        allFreq[word] += count
+
+    # check if crawling is allowed by this site's robots.txt
+    # (links to other sites are checked before they are downloaded)
+    localLinks = page.localLinks
+    if robots != None:
+        localLinks = []
+        for link in page.localLinks:
+            if robots.can_fetch('*', link[0]):
+                localLinks.append(link)
+            else:
+                metrics.inc('robots_disallowed')
+
+    # Return a list with the hyperlinks scrapped from resp.raw_response.content, hashed already
+    return (page.links + localLinks, page.numWords)
+
+class UrlFilter(object):
+    ''' The rules of is_valid, compiled once: a trie of the allowed domain suffixes,
+        a set of skipped file extensions and one pattern for the skipped query keywords. '''
+    def __init__(self, domains, paths, extensions, queryKeywords, maxQueryFields=5):
+        # reversed domain labels, e.g. {'edu': {'uci': {'ics': {None: True}}}}
+        self.domains = dict()
+        for domain in domains:
+            node = self.domains
+            for label in reversed(domain.split('.')):
+                node = node.setdefault(label, dict())
+            node[None] = True
+        self.depth = max(len(domain.split('.')) for domain in domains)
+        self.paths = dict(paths)            # host -> the only path prefix allowed on it
+        self.extensions = frozenset(extensions)
+        self.queryPattern = re.compile('|'.join(map(re.escape, queryKeywords)))
+        # query fields parse_qsl keeps: ones with a non-empty value
+        self.queryField = re.compile(r'(?:^|&)[^&=]*=[^&]')
+        self.maxQueryFields = maxQueryFields
+
+    # urls plain enough to split with one regex, anything else goes through urlparse
+    plainUrl = re.compile(r'([a-zA-Z][a-zA-Z0-9+.\-]*):(?://([^/?#]*))?([^?#]*)(?:\?([^#]*))?(?:#.*)?')
+    unsafeChars = re.compile(r'[\x00-\x20\x7f\[\];]')
+
+    def split(self, url):
+        ''' Returns the scheme, netloc, path and query urlparse would give for url. '''
+        match = self.plainUrl.fullmatch(url)
+        if match and url.isascii() and not self.unsafeChars.search(url):
+            scheme, netloc, path, query = match.groups()
+            return scheme.lower(), netloc or '', path, query or ''
         parsed = urlparse(url)
-        if parsed.scheme not in set(["http", "https"]):
-            return False
+        return parsed.scheme, parsed.netloc, parsed.path, parsed.query
+
+    def inDomain(self, netloc):
+        ''' Returns true if netloc is a subdomain of one of the domains. '''
+        labels = netloc.rsplit('.', self.depth)
+        node = self.domains
+        # stop before the first label, a subdomain needs one more than the domain
+        for i in range(len(labels) - 1, 0, -1):
+            node = node.get(labels[i])
+            if node is None:
+                return False
+            if None in node:
+                return True
+        return False
 
-        # check if in subdomain 
-        if not (parsed.netloc.endswith('.ics.uci.edu')) and \
-            not (parsed.netloc.endswith('.cs.uci.edu')) and \
-                not (parsed.netloc.endswith('.informatics.uci.edu')) and \
-                    not (parsed.netloc.endswith('.stat.uci.edu')) and \
-                        not (parsed.netloc == 'today.uci.edu' and parsed.path.startswith('/department/information_computer_sciences/')):
+    def isValid(self, url):
+        scheme, netloc, path, query = self.split(url)
+        if scheme != 'http' and scheme != 'https':
             return False
 
+        # check if in subdomain
+        if not self.inDomain(netloc):
+            prefix = self.paths.get(netloc)
+            if prefix is None or not path.startswith(prefix):
+                return False
+
         # skip media files, social media redirects, search/filter results, comment threads, etc
-        if any(suffix in parsed.query for suffix in ['ical', 'png', 'jpg', 'gif', 'pdf', 'facebook', 'zip','twitter', 'difftype', 'filter', 'odc', 'replyto']) or url.endswith('.Z'):
+        # and queries with too many fields (these pages tend to be too specific, give little info)
+        if query and (self.queryPattern.search(query) or \
+            len(self.queryField.findall(query)) > self.maxQueryFields):
             return False
-
-        # check if too many query strings (these pages tend to be too specific, give little info)
-        if len(parse_qsl(parsed.query)) > 5:
+        if url.endswith('.Z'):
             return False
 
-        return not re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|ics|ical|ifb|pptx|ppsx|odc|war"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
+        _, dot, extension = path.rpartition('.')
+        return not (dot and extension.lower() in self.extensions)
+
+    def filterValid(self, urls):
+        ''' Returns the urls that are valid. '''
+        isValid = self.isValid
+        return [url for url in urls if isValid(url)]
+
+    def filterValidLinks(self, links):
+        ''' Returns the (url, urlhash) pairs whose url is valid. '''
+        isValid = self.isValid
+        return [link for link in links if isValid(link[0])]
+
+
+urlFilter = UrlFilter(
+    domains=['ics.uci.edu', 'cs.uci.edu', 'informatics.uci.edu', 'stat.uci.edu'],
+    paths={'today.uci.edu': '/department/information_computer_sciences/'},
+    extensions=[
+        'css', 'js', 'bmp', 'gif', 'jpg', 'jpeg', 'ico',
+        'png', 'tif', 'tiff', 'mid', 'mp2', 'mp3', 'mp4',
+        'wav', 'avi', 'mov', 'mpeg', 'ram', 'm4v', 'mkv', 'ogg', 'ogv', 'pdf',
+        'ps', 'eps', 'tex', 'ppt', 'pptx', 'doc', 'docx', 'xls', 'xlsx', 'names',
+        'data', 'dat', 'exe', 'bz2', 'tar', 'msi', 'bin', '7z', 'psd', 'dmg', 'iso',
+        'epub', 'dll', 'cnf', 'tgz', 'sha1',
+        'thmx', 'mso', 'arff', 'rtf', 'jar', 'csv',
+        'ics', 'ical', 'ifb', 'ppsx', 'odc', 'war',
+        'rm', 'smil', 'wmv', 'swf', 'wma', 'zip', 'rar', 'gz'],
+    queryKeywords=[
+        'ical', 'png', 'jpg', 'gif', 'pdf', 'facebook', 'zip', 'twitter',
+        'difftype', 'filter', 'odc', 'replyto'])
 
+
+def is_valid(url):
+    # Decide whether to crawl this url or not. 
+    # If you decide to crawl it, return True; otherwise return False.
+    # The rules are in urlFilter above.
+    try:
+        return urlFilter.isValid(url)
     except TypeError:
-        print ("TypeError for ", parsed)
+        print ("TypeError for ", url)
         raise
+
+
+def filter_valid(urls):
+    # Batch form of is_valid, returns the urls to crawl.
+    return urlFilter.filterValid(urls)
+
+
+def filter_valid_links(links):
+    # filter_valid for the (url, urlhash) pairs from canonicalize.
+    return urlFilter.filterValidLinks(links)
@@ -0,0 +1,28 @@
+import os
+
+from configparser import ConfigParser
+
+import pytest
+
+from utils.config import Config
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    ''' config.ini with every file a crawl writes kept in tmp_path, which is
+        also the working directory, and no politeness delay. '''
+    monkeypatch.chdir(tmp_path)
+    cparser = ConfigParser()
+    cparser.read(os.path.join(REPO, "config.ini"))
+    config = Config(cparser)
+    config.seed_urls = ["https://www.ics.uci.edu/"]
+    config.time_delay = 0
+    config.threads_count = 2
+    config.history_file = ""
+    config.archive_dir = ""
+    config.metrics_port = 0
+    config.metrics_file = ""
+    config.cache_server = ("127.0.0.1", 1)
+    return config
@@ -0,0 +1,123 @@
+import copy
+import os
+import time
+
+from configparser import ConfigParser
+from urllib.parse import urlparse
+
+import pytest
+
+import merge_reports
+from benchmarks.cluster import free_ports
+from crawler.cluster import ClusterFrontier, HashRing, configure_node
+from crawler.reporter import Reporter
+from tests.conftest import REPO
+from utils import canonicalize
+
+
+def link_of(owner):
+    ''' A canonicalized url of a host that node owner of two crawls. '''
+    ring = HashRing(range(2))
+    for i in range(100):
+        if ring.owner(f"h{i}.ics.uci.edu") == owner:
+            return canonicalize(f"https://h{i}.ics.uci.edu/page")
+
+
+@pytest.fixture
+def nodes(config):
+    ''' Configs of a cluster of two nodes, neither of them started, seeded
+        with a page of node 0. '''
+    config.cluster_nodes = [("127.0.0.1", port) for port in free_ports(2)]
+    config.cluster_flush_interval = 0.05
+    config.seed_urls = [link_of(0)[0]]
+    return [configure_node(copy.copy(config), node_id) for node_id in range(2)]
+
+
+def move_node(nodes, node_id):
+    ''' Gives node_id a new port, as the listener of a closed node stays
+        bound until its process exits. '''
+    peers = list(nodes[0].cluster_nodes)
+    peers[node_id] = ("127.0.0.1", free_ports(1)[0])
+    for config in nodes:
+        config.cluster_nodes = peers
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def crawl_seed(frontier, links):
+    ''' Finds links on the seed and completes it, as a worker does. '''
+    seed = frontier.get_tbd_url()
+    frontier.add_urls(links, 1)
+    frontier.mark_url_complete(seed)
+
+
+def queued(frontier, url):
+    queue = frontier.host_queues.get(urlparse(url).netloc, ())
+    return url in [entry[2] for entry in queue]
+
+
+@pytest.mark.parametrize("snapshot", [True, False])
+def test_unsent_urls_survive_a_restart(nodes, snapshot):
+    frontier = ClusterFrontier(nodes[0], True)
+    url, urlhash = link_of(1)
+    crawl_seed(frontier, [(url, urlhash)])
+    frontier.close()
+    if not snapshot:
+        os.remove(frontier.snapshot_file)
+
+    # node 1 was down, so node 0 sends the url once both are up
+    move_node(nodes, 0)
+    frontier = ClusterFrontier(nodes[0], False)
+    # the save file does not keep depths
+    assert frontier.outbox[1] == [(url, 1 if snapshot else 0)]
+    owner = ClusterFrontier(nodes[1], True)
+    try:
+        wait_for(lambda: frontier.sent == 1)
+        assert owner.received == 1
+        assert queued(owner, url)
+        assert not frontier.outbox[1]
+    finally:
+        frontier.close()
+        owner.close()
+
+
+def test_sent_urls_are_not_sent_again(nodes):
+    frontier = ClusterFrontier(nodes[0], True)
+    owner = ClusterFrontier(nodes[1], True)
+    try:
+        crawl_seed(frontier, [link_of(1)])
+        wait_for(lambda: frontier.sent == 1)
+    finally:
+        frontier.close()
+        owner.close()
+
+    move_node(nodes, 0)
+    frontier = ClusterFrontier(nodes[0], False)
+    try:
+        assert not frontier.outbox[1]
+    finally:
+        frontier.close()
+
+
+def test_merge_reports_combines_the_nodes(nodes):
+    for node_id, config in enumerate(nodes):
+        reporter = Reporter(config, True)
+        reporter.collect_data(link_of(node_id)[0], 10 * (node_id + 1))
+        reporter.close()
+    cparser = ConfigParser()
+    cparser.read(os.path.join(REPO, "config.ini"))
+    cparser["CLUSTER"]["NODES"] = ", ".join(
+        f"{host}:{port}" for host, port in nodes[0].cluster_nodes)
+    with open("config.ini", "w") as config_file:
+        cparser.write(config_file)
+
+    merge_reports.main("config.ini")
+    with open(nodes[0].report_file.rsplit(".node", 1)[0]) as report:
+        report = report.read()
+    assert "Unique pages: 2" in report
+    assert f"Longest page: {link_of(1)[0]}" in report
@@ -0,0 +1,87 @@
+import random
+
+from collections import Counter
+from hashlib import blake2b
+
+import pytest
+
+from crawler.dedup import (
+    DuplicateIndex, content_hash, fingerprint, shingles, simhash)
+
+WORDS = ("research student informatics computer science graduate faculty "
+         "seminar course lecture data learning systems software").split()
+
+
+def reference_simhash(features):
+    ''' SimHash computed one bit at a time. '''
+    sums = [0] * 64
+    for feature, count in features.items():
+        value = int.from_bytes(blake2b(feature.encode(), digest_size=8).digest(), "little")
+        for bit in range(64):
+            sums[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit in range(64) if sums[bit] > 0)
+
+
+def page(seed, count=300):
+    rng = random.Random(seed)
+    return [rng.choice(WORDS) + str(rng.randrange(50)) for _ in range(count)]
+
+
+def test_simhash_matches_bitwise_reference():
+    for seed in range(20):
+        features = shingles(page(seed, 50))
+        assert simhash(features) == reference_simhash(features)
+    assert simhash(Counter({"a b c": 3, "b c d": 1})) == reference_simhash(
+        Counter({"a b c": 3, "b c d": 1}))
+
+
+def test_shingles():
+    assert shingles(["a", "b", "c", "d"]) == Counter({"a b c": 1, "b c d": 1})
+    assert shingles(["a", "b"]) == Counter({"a b": 1})
+
+
+def test_content_hash_ignores_whitespace():
+    assert content_hash("a  b\n c ") == content_hash("a b c")
+    assert content_hash("a b c") != content_hash("a b d")
+
+
+def test_exact_and_near_duplicates():
+    index = DuplicateIndex(3)
+    words = page(0)
+    text = " ".join(words)
+    assert index.add(*fingerprint(text, words)) is None
+    assert index.add(content_hash(text + " "), simhash(shingles(words))) == "exact"
+    # one word of 300 changed
+    edited = words[:150] + ["changed"] + words[151:]
+    assert index.add(*fingerprint(" ".join(edited), edited)) == "near"
+    other = page(1)
+    assert index.add(*fingerprint(" ".join(other), other)) is None
+    assert len(index) == 2
+
+
+@pytest.mark.parametrize("distance", [0, 3, 6])
+def test_bands_find_every_fingerprint_within_distance(distance):
+    rng = random.Random(distance)
+    index = DuplicateIndex(distance)
+    base = rng.getrandbits(64)
+    index.add(1, base)
+    for _ in range(200):
+        flipped = base
+        for bit in rng.sample(range(64), rng.randrange(distance + 3)):
+            flipped ^= 1 << bit
+        near = bin(base ^ flipped).count("1") <= distance
+        assert index._near(flipped) == near
+
+
+def test_take_new_and_load():
+    index = DuplicateIndex(3)
+    index.add(1, 0xFF)
+    index.add(2, 0xFF00FF00FF00FF00)
+    saved = index.take_new()
+    assert saved == [(1, 0xFF), (2, 0xFF00FF00FF00FF00)]
+    assert index.take_new() == []
+    restored = DuplicateIndex(3)
+    restored.load(saved)
+    assert restored.add(1, 0) == "exact"
+    assert restored.add(3, 0xFE) == "near"
+    assert restored.take_new() == []
@@ -0,0 +1,47 @@
+import asyncio
+
+import scraper
+from utils.download import _read_capped, async_download, async_session, download
+
+
+class StreamedResponse(object):
+    def __init__(self, content, headers):
+        self.content = content
+        self.headers = headers
+
+    def iter_content(self, size):
+        for start in range(0, len(self.content), size):
+            yield self.content[start:start + size]
+
+
+def test_malformed_content_length_is_ignored():
+    resp = StreamedResponse(b"x" * 100, {"Content-Length": "12, 12"})
+    assert _read_capped(resp, 1000) == b"x" * 100
+    assert _read_capped(resp, 50) is None
+
+
+def test_content_length_over_the_limit_skips_the_body():
+    resp = StreamedResponse(b"", {"Content-Length": "5000"})
+    assert _read_capped(resp, 1000) is None
+
+
+def test_unreachable_cache_server_gives_an_error_response(config):
+    # the config fixture points at a port nothing listens on
+    resp = download("https://www.ics.uci.edu/", config)
+    assert resp.status == 599 and resp.error
+    assert resp.elapsed is not None
+
+
+def test_async_unreachable_cache_server_gives_an_error_response(config):
+    async def fetch():
+        async with async_session(config) as session:
+            return await async_download("https://www.ics.uci.edu/", config, session)
+    resp = asyncio.run(fetch())
+    assert resp.status == 599 and resp.error
+    assert resp.elapsed is not None
+
+
+def test_analyze_page_uses_the_size_limit_given():
+    content = b"<html><body>" + b"word " * 400 + b"</body></html>"
+    page = scraper.analyzePage("https://www.ics.uci.edu/", content, "text/html", maxSize=1000)
+    assert page.numWords == 0 and not page.pageFreq
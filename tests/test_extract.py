@@ -0,0 +1,38 @@
+import pytest
+
+import scraper
+
+pytest.importorskip("bs4")
+from benchmarks.extract import soup_parse, synthetic_corpus     # noqa: E402
+
+# pages written to hit what the two parsers could read differently
+PAGES = [
+    b"<html><body><p>Plain paragraph with <a href='/one'>a link</a>.</p></body></html>",
+    b"<p>No html or body tags, <b>bold</b> and <i>italic</i> <a href=two>two</a>",
+    b"<html><head><title>Title words</title><style>p { color: red }</style>"
+    b"<script>var hidden = 'not words';</script></head>"
+    b"<body>Visible<script>document.write('<a href=\"/x\">x</a>')</script> text</body></html>",
+    b"<p>Entities &amp; &lt;tags&gt; &eacute;t&eacute; &#8217;quoted&#8217; &nbsp;words</p>",
+    b"<p>Comment <!-- hidden <a href='/c'>c</a> --> after</p>",
+    b"<p>Unclosed <a href='/u'>anchor <p>next paragraph <a href='/v'>second",
+    b"<p>Anchor without href <a name='top'>top</a> and empty <a href=''>empty</a></p>",
+    b"<table><tr><td>cell one</td><td>cell two <a href='/t?a=1&amp;b=2#f'>t</a></td></tr></table>",
+    "<p>café naïve über don't e-mail x86 o'neil</p>".encode("utf-8"),
+    b"<ul><li>first<li>second<li><a href='/l'>third</a></ul>",
+    b"",
+]
+
+
+@pytest.mark.parametrize("content", PAGES + synthetic_corpus(100))
+def test_lxml_extraction_matches_beautifulsoup(content):
+    text, hrefs = scraper.parsePage(content)
+    soup_text, soup_hrefs = soup_parse(content) if content else ("", [])
+    assert hrefs == soup_hrefs
+    assert scraper.pageWords(text.lower()) == scraper.pageWords(soup_text.lower())
+
+
+def test_declared_charset_is_read():
+    # the one known difference: BeautifulSoup ignored the declared charset
+    # and read these words as caf\ufffd cr\ufffdme
+    content = "<meta charset='latin-1'><p>café crème</p>".encode("latin-1")
+    assert scraper.parsePage(content)[0] == "café crème"
@@ -0,0 +1,55 @@
+import pytest
+
+import scraper
+from benchmarks.url_filter import legacy_is_valid, synthetic_urls
+from utils import canonicalize
+
+EDGE_CASES = [
+    "https://ics.uci.edu/",                 # the domain itself is not a subdomain
+    "https://www.ics.uci.edu",
+    "https://www.ics.uci.edu.evil.com/",
+    "https://xics.uci.edu/",
+    "https://a.b.c.informatics.uci.edu/x",
+    "https://WWW.ICS.UCI.EDU/About",
+    "HTTPS://www.ics.uci.edu/",
+    "ftp://www.ics.uci.edu/file",
+    "https://today.uci.edu/department/information_computer_sciences/",
+    "https://today.uci.edu/department/information_computer_sciences",
+    "https://today.uci.edu/department/engineering/",
+    "https://www.ics.uci.edu/paper.PDF",
+    "https://www.ics.uci.edu/archive.tar.gz",
+    "https://www.ics.uci.edu/archive.tar.Z",
+    "https://www.ics.uci.edu/dir.pdf/",
+    "https://www.ics.uci.edu/page?file=a.pdf",
+    "https://www.ics.uci.edu/page#x.pdf",
+    "https://www.ics.uci.edu/a;b.png",
+    "https://www.ics.uci.edu/?a=1&b=2&c=3&d=4&e=5",
+    "https://www.ics.uci.edu/?a=1&b=2&c=3&d=4&e=5&f=6",
+    "https://www.ics.uci.edu/?a=1&b=2&c=3&d=4&e=5&f=",
+    "https://www.ics.uci.edu/?a&b&c&d&e&f&g",
+    "https://www.ics.uci.edu/?q=%20x+y",
+    "https://www.ics.uci.edu:8080/",
+    "https://user@www.ics.uci.edu/",
+    "https://www.ics.uci.edu/ space",
+    "https://www.ics.uci.edu/café",
+    "https://[::1]/",
+    "mailto:someone@ics.uci.edu",
+    "//www.ics.uci.edu/",
+    "",
+]
+
+
+@pytest.mark.parametrize("url", EDGE_CASES)
+def test_is_valid_matches_legacy_rules(url):
+    assert scraper.is_valid(url) == legacy_is_valid(url)
+
+
+def test_filter_valid_matches_legacy_rules():
+    urls = synthetic_urls(5000)
+    assert scraper.filter_valid(urls) == [url for url in urls if legacy_is_valid(url)]
+
+
+def test_filter_valid_links_keeps_the_pairs():
+    links = [canonicalize(url) for url in synthetic_urls(500) if canonicalize(url)]
+    assert scraper.filter_valid_links(links) == [
+        link for link in links if legacy_is_valid(link[0])]
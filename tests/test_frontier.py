@@ -0,0 +1,111 @@
+import time
+
+from threading import Thread
+
+from crawler.frontier import Frontier
+from utils import canonicalize
+
+
+def links(urls):
+    return [canonicalize(url) for url in urls]
+
+
+def drain(frontier):
+    ''' Crawls the frontier to the end on this thread, returning the urls in
+        the order they were handed out. '''
+    urls = []
+    while True:
+        url = frontier.get_tbd_url()
+        if url is None:
+            return urls
+        urls.append(url)
+        frontier.mark_url_complete(url)
+
+
+def test_one_url_per_host_at_a_time(config):
+    frontier = Frontier(config, True)
+    frontier.add_urls(links([
+        "https://www.ics.uci.edu/a", "https://www.ics.uci.edu/b",
+        "https://www.cs.uci.edu/a"]), 1)
+    first, _ = frontier.poll_tbd_url()
+    second, _ = frontier.poll_tbd_url()
+    third, wait = frontier.poll_tbd_url()
+    hosts = {first.split("/")[2], second.split("/")[2]}
+    assert hosts == {"www.ics.uci.edu", "www.cs.uci.edu"}
+    # every host is being crawled, so the rest wait for one to finish
+    assert third is None and wait is not None
+    frontier.mark_url_complete(first)
+    frontier.mark_url_complete(second)
+    assert len(drain(frontier)) == 2
+    frontier.close()
+
+
+def test_politeness_window(config):
+    config.time_delay = 0.2
+    frontier = Frontier(config, True)
+    frontier.add_urls(links(["https://www.ics.uci.edu/a"]), 1)
+    seed = frontier.get_tbd_url()
+    frontier.mark_url_complete(seed)
+    url, wait = frontier.poll_tbd_url()
+    assert url is None and 0 < wait <= 0.2
+    start = time.monotonic()
+    assert frontier.get_tbd_url() == "https://www.ics.uci.edu/a"
+    assert time.monotonic() - start >= 0.15
+    frontier.close()
+
+
+def test_get_tbd_url_waits_for_urls_in_progress(config):
+    frontier = Frontier(config, True)
+    seed = frontier.get_tbd_url()
+    got = []
+    waiter = Thread(target=lambda: got.append(frontier.get_tbd_url()))
+    waiter.start()
+    time.sleep(0.1)
+    # the seed is still being crawled and may add urls, so nothing is returned yet
+    assert waiter.is_alive()
+    frontier.add_urls(links(["https://www.cs.uci.edu/a"]), 1)
+    waiter.join(5)
+    assert got == ["https://www.cs.uci.edu/a"]
+    frontier.mark_url_complete(seed)
+    frontier.mark_url_complete(got[0])
+    assert frontier.get_tbd_url() is None
+    frontier.close()
+
+
+def test_every_worker_stops_once_the_last_url_completes(config):
+    frontier = Frontier(config, True)
+    seed = frontier.get_tbd_url()
+    got = []
+    waiters = [Thread(target=lambda: got.append(frontier.get_tbd_url()))
+               for _ in range(3)]
+    for waiter in waiters:
+        waiter.start()
+    frontier.mark_url_complete(seed)
+    for waiter in waiters:
+        waiter.join(5)
+        assert not waiter.is_alive()
+    assert got == [None, None, None]
+    frontier.close()
+
+
+def test_completed_urls_are_not_added_again(config):
+    frontier = Frontier(config, True)
+    assert drain(frontier) == ["https://www.ics.uci.edu"]
+    frontier.add_urls(links(["https://www.ics.uci.edu/"]), 1)
+    assert frontier.get_tbd_url() is None
+    frontier.close()
+
+
+def test_release_completes_only_urls_in_progress(config):
+    frontier = Frontier(config, True)
+    frontier.add_urls(links(["https://www.ics.uci.edu/a"]), 1)
+    seed = frontier.get_tbd_url()
+    frontier.mark_url_complete(seed)
+    url = frontier.get_tbd_url()
+    # the seed was completed already, releasing it must not free its host
+    assert not frontier.release(seed)
+    assert frontier.in_progress == 1
+    assert frontier.release(url)
+    assert frontier.in_progress == 0
+    assert frontier.get_tbd_url() is None
+    frontier.close()
@@ -0,0 +1,95 @@
+import pytest
+
+import crawler.hosts
+from crawler.hosts import HostMonitor
+
+HOST = "www.ics.uci.edu"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    ''' A time.monotonic for crawler.hosts that only moves when told to. '''
+    class Clock(object):
+        now = 1000.0
+
+        def __call__(self):
+            return self.now
+    clock = Clock()
+    monkeypatch.setattr(crawler.hosts.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def hosts(config):
+    config.host_latency_factor = 2
+    config.host_max_delay = 30
+    config.host_failure_streak = 3
+    config.host_cooldown = 60
+    return HostMonitor(config)
+
+
+def test_delay_follows_latency_between_floor_and_max(hosts):
+    assert hosts.delay(HOST, 0.5) == 0.5
+    hosts.record(HOST, 2.0, 200)
+    assert hosts.delay(HOST, 0.5) == 4.0
+    # a moving average, the newest sample weighted ALPHA
+    hosts.record(HOST, 7.0, 200)
+    assert hosts.delay(HOST, 0.5) == pytest.approx(2 * (0.2 * 7 + 0.8 * 2))
+    assert hosts.delay(HOST, 10) == 10
+    hosts.record("slow.ics.uci.edu", 100.0, 200)
+    assert hosts.delay("slow.ics.uci.edu", 0.5) == 30
+
+
+def test_errors_in_a_row_double_the_delay(hosts):
+    hosts.record(HOST, 1.0, 200)
+    hosts.record(HOST, None, 500)
+    assert hosts.delay(HOST, 0.5) == 4.0
+    hosts.record(HOST, None, 404)
+    assert hosts.delay(HOST, 0.5) == 8.0
+    hosts.record(HOST, None, 200)
+    assert hosts.delay(HOST, 0.5) == 2.0
+
+
+def test_backoff_is_capped(hosts):
+    hosts.record(HOST, 1.0, 200)
+    hosts.failure_streak = 100
+    for _ in range(10):
+        hosts.record(HOST, None, 500)
+    assert hosts.delay(HOST, 0.5) == 30
+    # a politeness above HOST_MAX_DELAY still holds
+    assert hosts.delay(HOST, 45) == 45
+
+
+def test_circuit_opens_after_a_failure_streak(hosts, clock):
+    for _ in range(2):
+        hosts.record(HOST, 0.1, 599)
+    assert hosts.next_fetch(HOST, 0.5) < clock.now + 60
+    hosts.record(HOST, 0.1, 599)
+    assert hosts.open_circuits() == 1
+    assert hosts.next_fetch(HOST, 0.5) == clock.now + 60
+    clock.now += 61
+    assert hosts.open_circuits() == 0
+
+
+def test_cooldown_doubles_while_the_host_keeps_failing(hosts, clock):
+    for _ in range(3):
+        hosts.record(HOST, None, 599)
+    assert hosts.next_fetch(HOST, 0.5) == clock.now + 60
+    clock.now += 60
+    hosts.record(HOST, None, 599)
+    assert hosts.next_fetch(HOST, 0.5) == clock.now + 120
+    clock.now += 120
+    # a success closes the breaker and resets the cooldown
+    hosts.record(HOST, 1.0, 200)
+    assert hosts.open_circuits() == 0
+    assert hosts.next_fetch(HOST, 0.5) == clock.now + hosts.delay(HOST, 0.5)
+    for _ in range(3):
+        hosts.record(HOST, None, 599)
+    assert hosts.next_fetch(HOST, 0.5) == clock.now + 60
+
+
+def test_slowest(hosts):
+    for i, seconds in enumerate([0.5, 3.0, 1.25]):
+        hosts.record(f"h{i}.ics.uci.edu", seconds, 200)
+    hosts.record("h3.ics.uci.edu", None, 500)
+    assert hosts.slowest(2) == {"h1.ics.uci.edu": 3.0, "h2.ics.uci.edu": 1.25}
@@ -0,0 +1,69 @@
+import pytest
+
+from crawler.frontier import Frontier
+from crawler.priority import Priority, parse_weights
+from tests.test_frontier import drain, links
+
+
+def test_parse_weights():
+    assert parse_weights("depth:1, length:0.5,yield") == {
+        "depth": 1.0, "length": 0.5, "yield": 1.0}
+    assert parse_weights("") == {}
+
+
+def test_unknown_features_are_rejected():
+    with pytest.raises(ValueError, match="breadth"):
+        Priority({"depth": 1, "breadth": 2})
+
+
+def test_scores_are_weighted_sums():
+    priority = Priority({"depth": 2, "length": 0.5, "yield": 4, "diversity": 1})
+    url = "https://www.ics.uci.edu/" + "a" * 76
+    assert priority.url_score(url, 3) == pytest.approx(2 * 3 + 0.5 * 1)
+    # a new host: yield 0.5 and nothing crawled
+    assert priority.host_score("www.ics.uci.edu") == pytest.approx(2)
+    for useful in (True, True, False):
+        priority.record("www.ics.uci.edu", useful)
+    assert priority.host_score("www.ics.uci.edu") == pytest.approx(4 * 2 / 5 + 2)
+    restored = Priority({"yield": 4, "diversity": 1})
+    restored.restore(priority.state())
+    assert restored.host_score("www.ics.uci.edu") == priority.host_score("www.ics.uci.edu")
+
+
+def test_no_weights_crawl_first_in_first_out(config):
+    config.priority = ""
+    frontier = Frontier(config, True)
+    urls = [f"https://www.ics.uci.edu/{'deep/' * (9 - i)}{i}" for i in range(10)]
+    for depth, link in enumerate(links(urls)):
+        frontier.add_urls([link], 10 - depth)
+    assert drain(frontier) == ["https://www.ics.uci.edu"] + urls
+    frontier.close()
+
+
+def test_shallow_and_short_urls_first(config):
+    config.priority = "depth:1, length:0.5"
+    frontier = Frontier(config, True)
+    frontier.add_urls(links(["https://www.ics.uci.edu/deep"]), 3)
+    frontier.add_urls(links(["https://www.ics.uci.edu/a/much/longer/path/" + "x" * 200]), 1)
+    frontier.add_urls(links(["https://www.ics.uci.edu/short"]), 1)
+    assert drain(frontier) == [
+        "https://www.ics.uci.edu", "https://www.ics.uci.edu/short",
+        "https://www.ics.uci.edu/a/much/longer/path/" + "x" * 200,
+        "https://www.ics.uci.edu/deep"]
+    frontier.close()
+
+
+def test_hosts_with_a_poor_yield_go_last(config):
+    config.priority = "yield:4"
+    frontier = Frontier(config, True)
+    for _ in range(5):
+        frontier.record_yield("https://www.cs.uci.edu/", False)
+    frontier.record_yield("https://www.stat.uci.edu/", True)
+    frontier.add_urls(links([
+        "https://www.cs.uci.edu/a", "https://www.informatics.uci.edu/a",
+        "https://www.stat.uci.edu/a"]), 1)
+    # new hosts tie at a yield of 0.5, in the order they were queued
+    assert drain(frontier) == [
+        "https://www.stat.uci.edu/a", "https://www.ics.uci.edu",
+        "https://www.informatics.uci.edu/a", "https://www.cs.uci.edu/a"]
+    frontier.close()
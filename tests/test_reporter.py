@@ -0,0 +1,60 @@
+import threading
+
+from collections import Counter
+
+from crawler.reporter import Reporter
+
+
+def test_close_writes_report_after_background_report(config):
+    reporter = Reporter(config, True)
+    reporter.collect_data("https://www.ics.uci.edu/a", 10)
+    stale = reporter.snapshot()
+    started, release = threading.Event(), threading.Event()
+
+    def slow_snapshot():
+        started.set()
+        release.wait()
+        return stale
+    reporter.snapshot = slow_snapshot
+    reporter.reportInBackground()
+    started.wait()
+    del reporter.snapshot
+    reporter.collect_data("https://www.ics.uci.edu/b", 20)
+    threading.Timer(0.1, release.set).start()
+    reporter.close()
+    with open(config.report_file) as report:
+        assert "Unique pages: 2" in report.read()
+
+
+def test_snapshot_ranks_words(config):
+    reporter = Reporter(config, True)
+    reporter.merge_freq(Counter({"crawler": 5, "the": 9, "uci": 7}))
+    snapshot = reporter.snapshot()
+    assert snapshot["common_words"][:2] == ["uci", "crawler"]
+    reporter.close()
+
+
+def test_merge_stats_file_sums_the_shards(config):
+    stats_file = config.stats_file
+    for node_id, (url, words) in enumerate([
+            ("https://vision.ics.uci.edu/a", 30), ("https://www.ics.uci.edu/b", 50)]):
+        config.stats_file = f"{stats_file}.node{node_id}"
+        node = Reporter(config, True)
+        node.collect_data(url, words)
+        node.collect_data("https://www.ics.uci.edu/c", 10)
+        node.merge_freq(Counter({"crawler": node_id + 1, "uci": 2}))
+        node.close()
+
+    config.stats_file = stats_file
+    reporter = Reporter(config, True)
+    for node_id in range(2):
+        reporter.merge_stats_file(f"{stats_file}.node{node_id}")
+    reporter.close()
+    merged = Reporter(config, False)
+    assert merged.stats["page_count"] == 4
+    assert merged.stats["longest_page"] == "https://www.ics.uci.edu/b"
+    assert merged.stats["longest_page_words"] == 50
+    assert dict(merged.stats["icsSubdomains"]) == {
+        "https://vision.ics.uci.edu": 1, "https://www.ics.uci.edu": 3}
+    assert merged.all_freq["crawler"] == 3 and merged.all_freq["uci"] == 4
+    merged.close()
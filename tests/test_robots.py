@@ -0,0 +1,110 @@
+import threading
+
+from types import SimpleNamespace
+
+import pytest
+
+import crawler.robots
+from crawler.robots import RobotsCache
+
+ROBOTS = b"User-agent: *\nDisallow: /private/\nCrawl-delay: 2\n"
+
+
+@pytest.fixture
+def site(monkeypatch):
+    ''' Serves robots.txt files from site.files ({origin: (status, body)}) to
+        RobotsCache, counting the fetches of each origin in site.fetches. '''
+    site = SimpleNamespace(files=dict(), fetches=dict(), gate=None)
+
+    def fake_download(url, config, logger=None):
+        origin = url[:-len("/robots.txt")]
+        site.fetches[origin] = site.fetches.get(origin, 0) + 1
+        if site.gate is not None:
+            site.gate.wait(5)
+        status, body = site.files.get(origin, (404, b""))
+        return SimpleNamespace(status=status, raw_response=SimpleNamespace(content=body))
+    monkeypatch.setattr(crawler.robots, "download", fake_download)
+    return site
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(crawler.robots.time, "monotonic", lambda: clock.now)
+    return clock
+
+
+def test_rules_are_parsed_and_cached(config, site):
+    site.files["https://www.ics.uci.edu"] = (200, ROBOTS)
+    delays = []
+    robots = RobotsCache(config, on_crawl_delay=lambda netloc, delay: delays.append((netloc, delay)))
+    rules = robots.get("https://www.ics.uci.edu/a")
+    assert rules.can_fetch("*", "https://www.ics.uci.edu/a")
+    assert not rules.can_fetch("*", "https://www.ics.uci.edu/private/b")
+    assert robots.get("https://www.ics.uci.edu/private/b") is rules
+    assert site.fetches == {"https://www.ics.uci.edu": 1}
+    assert delays == [("www.ics.uci.edu", 2.0)]
+
+
+def test_status_codes(config, site):
+    site.files["https://a.ics.uci.edu"] = (403, b"")
+    site.files["https://b.ics.uci.edu"] = (404, b"")
+    robots = RobotsCache(config)
+    assert not robots.get("https://a.ics.uci.edu/x").can_fetch("*", "https://a.ics.uci.edu/x")
+    assert robots.get("https://b.ics.uci.edu/x").can_fetch("*", "https://b.ics.uci.edu/x")
+
+
+def test_entries_expire_after_their_ttl(config, site, clock):
+    config.robots_ttl = 100
+    config.robots_negative_ttl = 10
+    site.files["https://www.ics.uci.edu"] = (200, ROBOTS)
+    robots = RobotsCache(config)
+    robots.get("https://www.ics.uci.edu/")
+    robots.get("https://www.cs.uci.edu/")
+    clock.now += 50
+    robots.get("https://www.ics.uci.edu/")
+    robots.get("https://www.cs.uci.edu/")
+    assert site.fetches == {"https://www.ics.uci.edu": 1, "https://www.cs.uci.edu": 2}
+    clock.now += 51
+    robots.get("https://www.ics.uci.edu/")
+    assert site.fetches["https://www.ics.uci.edu"] == 2
+
+
+def test_unreachable_sites_count_failures(config, site, clock):
+    config.robots_negative_ttl = 10
+    site.files["https://www.ics.uci.edu"] = (599, b"")
+    robots = RobotsCache(config)
+    assert robots.get("https://www.ics.uci.edu/") is None
+    assert robots.unreachable("https://www.ics.uci.edu/") == (1, clock.now + 10)
+    clock.now += 10
+    assert robots.get("https://www.ics.uci.edu/") is None
+    assert robots.unreachable("https://www.ics.uci.edu/")[0] == 2
+    site.files["https://www.ics.uci.edu"] = (200, ROBOTS)
+    clock.now += 10
+    assert robots.get("https://www.ics.uci.edu/") is not None
+    assert robots.unreachable("https://www.ics.uci.edu/")[0] == 0
+
+
+def test_least_recently_used_sites_are_evicted(config, site):
+    config.robots_cache_size = 2
+    robots = RobotsCache(config)
+    for host in ("a", "b", "a", "c", "a", "b"):
+        robots.get(f"https://{host}.ics.uci.edu/")
+    assert site.fetches == {
+        "https://a.ics.uci.edu": 1, "https://b.ics.uci.edu": 2, "https://c.ics.uci.edu": 1}
+
+
+def test_one_fetch_per_site_at_a_time(config, site):
+    site.files["https://www.ics.uci.edu"] = (200, ROBOTS)
+    site.gate = threading.Event()
+    robots = RobotsCache(config)
+    got = []
+    getters = [threading.Thread(target=lambda: got.append(robots.get("https://www.ics.uci.edu/")))
+               for _ in range(5)]
+    for getter in getters:
+        getter.start()
+    threading.Timer(0.2, site.gate.set).start()
+    for getter in getters:
+        getter.join(5)
+    assert site.fetches == {"https://www.ics.uci.edu": 1}
+    assert len(got) == 5 and all(rules is got[0] for rules in got)
@@ -0,0 +1,68 @@
+import pickle
+import zlib
+
+from collections import Counter
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+import scraper
+from crawler.history import PageHistory
+from utils import canonicalize
+from utils.response import Response
+
+WORDS = " ".join(f"word{chr(97 + i % 26)}{chr(97 + i // 26)}" for i in range(60))
+PAGE = (f"<html><body><p>{WORDS}</p>"
+        "<a href='/local?b=2&a=1#top'>local</a>"
+        "<a href='https://WWW.ics.uci.edu:443/local?a=1&b=2'>same page</a>"
+        "<a href='/private/page'>private</a>"
+        "<a href='https://www.cs.uci.edu/other'>other site</a>"
+        "<a href='https://www.example.com/'>not crawled</a>"
+        "<a href='/file.pdf'>pdf</a>"
+        "<a href=' /spaced '>spaced</a></body></html>").encode()
+
+
+def test_page_links_are_canonical_pairs():
+    page = scraper.analyzePage("https://www.ics.uci.edu/", PAGE, "text/html")
+    assert page.links == [canonicalize("https://www.cs.uci.edu/other")]
+    assert page.localLinks == [
+        canonicalize("https://www.ics.uci.edu/local?a=1&b=2"),
+        canonicalize("https://www.ics.uci.edu/private/page"),
+        canonicalize("https://www.ics.uci.edu/spaced")]
+
+
+def test_record_page_keeps_local_links_robots_allow():
+    page = scraper.analyzePage("https://www.ics.uci.edu/", PAGE, "text/html")
+    robots = RobotFileParser()
+    robots.parse(["User-agent: *", "Disallow: /private/"])
+    links, word_count = scraper.recordPage(page, Counter(), robots=robots)
+    assert links == [canonicalize("https://www.cs.uci.edu/other"),
+                     canonicalize("https://www.ics.uci.edu/local?a=1&b=2"),
+                     canonicalize("https://www.ics.uci.edu/spaced")]
+    assert word_count == page.numWords > 0
+
+
+def test_scraper_returns_urls():
+    raw = requests.Response()
+    raw.url, raw.status_code, raw._content = "https://www.ics.uci.edu/", 200, PAGE
+    raw.headers["Content-Type"] = "text/html"
+    resp = Response({"url": raw.url, "status": 200, "response": pickle.dumps(raw)})
+    links, word_count = scraper.scraper(raw.url, resp, Counter())
+    assert links == ["https://www.cs.uci.edu/other", "https://www.ics.uci.edu/local?a=1&b=2",
+                     "https://www.ics.uci.edu/private/page", "https://www.ics.uci.edu/spaced"]
+    assert word_count > 0
+
+
+def test_history_pages_of_older_versions_get_hashed_links(tmp_path):
+    history = PageHistory(str(tmp_path / "history.db"), 60, 3600)
+    url = "https://www.ics.uci.edu/"
+    history.update(url, (None, None, b"body"), scraper.Page([], [], 60, Counter(), None))
+    # saved before links were kept with their hashes
+    old = scraper.Page(["https://www.cs.uci.edu/other"],
+                       ["https://www.ics.uci.edu/local"], 60, Counter(), None)
+    row = list(history.pending.popitem()[1])
+    row[10] = zlib.compress(pickle.dumps(old))
+    history.pending[row[0]] = tuple(row)
+    page = history.fresh(url)
+    assert page.links == [canonicalize("https://www.cs.uci.edu/other")]
+    assert page.localLinks == [canonicalize("https://www.ics.uci.edu/local")]
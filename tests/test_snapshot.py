@@ -0,0 +1,86 @@
+import pickle
+
+import pytest
+
+from crawler.frontier import Frontier
+
+
+def crawl_all(frontier):
+    ''' Completes every queued url, returning {url: depth}. '''
+    urls = dict()
+    while True:
+        url = frontier.get_tbd_url()
+        if url is None:
+            return urls
+        urls[url] = frontier.depth(url)
+        frontier.mark_url_complete(url)
+
+
+@pytest.fixture
+def interrupted(config):
+    ''' A crawl stopped without closing its frontier, with a checkpoint taken
+        part way: /a and /b are pending at depth 2 in the snapshot, /c was
+        added after it and /a completed after it. '''
+    frontier = Frontier(config, True)
+    seed = frontier.get_tbd_url()
+    frontier.add_url("https://www.ics.uci.edu/a", 2)
+    frontier.add_url("https://www.ics.uci.edu/b", 2)
+    frontier.mark_url_complete(seed)
+    frontier.checkpoint()
+    a = frontier.get_tbd_url()
+    frontier.add_url("https://www.ics.uci.edu/c", 3)
+    frontier.mark_url_complete(a)
+    frontier.save.flush()
+    return a
+
+
+def test_resume_from_snapshot_replays_the_tail(config, interrupted, monkeypatch):
+    def full_scan(self):
+        raise AssertionError("resumed by a full scan of the save file")
+    monkeypatch.setattr(Frontier, "_parse_save_file", full_scan)
+    frontier = Frontier(config, False)
+    urls = crawl_all(frontier)
+    other = ({"https://www.ics.uci.edu/a", "https://www.ics.uci.edu/b"}
+             - {interrupted}).pop()
+    # depths come from the snapshot, the save file does not keep them
+    assert urls == {other: 2, "https://www.ics.uci.edu/c": 0}
+    frontier.close()
+
+
+def test_unreadable_snapshot_falls_back_to_a_full_scan(config, interrupted):
+    with open(config.save_file + ".snapshot", "wb") as snapshot_file:
+        snapshot_file.write(b"\x80\x05 torn")
+    frontier = Frontier(config, False)
+    assert set(crawl_all(frontier)) == {
+        "https://www.ics.uci.edu/a", "https://www.ics.uci.edu/b",
+        "https://www.ics.uci.edu/c"} - {interrupted}
+    frontier.close()
+
+
+def test_snapshot_of_a_rewritten_journal_is_ignored(config, interrupted):
+    with open(config.save_file + ".snapshot", "rb") as snapshot_file:
+        snapshot = pickle.load(snapshot_file)
+    snapshot["marker"] = ("another generation", snapshot["marker"][1])
+    with open(config.save_file + ".snapshot", "wb") as snapshot_file:
+        pickle.dump(snapshot, snapshot_file)
+    frontier = Frontier(config, False)
+    assert len(crawl_all(frontier)) == 2
+    frontier.close()
+
+
+def test_pending_urls_are_checked_again_if_the_filter_changed(config, interrupted):
+    with open(config.save_file + ".snapshot", "rb") as snapshot_file:
+        snapshot = pickle.load(snapshot_file)
+    snapshot["filter_version"] = "older scraper.py"
+    snapshot["pending"].append(("https://www.example.com/", 1))
+    with open(config.save_file + ".snapshot", "wb") as snapshot_file:
+        pickle.dump(snapshot, snapshot_file)
+    frontier = Frontier(config, False)
+    assert "https://www.example.com/" not in crawl_all(frontier)
+    frontier.close()
+
+
+def test_restart_deletes_the_snapshot(config, interrupted):
+    frontier = Frontier(config, True)
+    assert crawl_all(frontier) == {"https://www.ics.uci.edu": 0}
+    frontier.close()
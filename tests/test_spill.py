@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from crawler.frontier import Frontier
+from utils import canonicalize
+
+HOSTS = 10
+URLS = 600
+
+
+def links():
+    return [canonicalize(f"https://sub{i % HOSTS}.ics.uci.edu/page/{i}?id={i * 7}")
+            for i in range(URLS)]
+
+
+@pytest.fixture
+def capped(config):
+    ''' Spills past 60 queued urls, keeping 5 per host in memory. '''
+    config.seed_urls = [links()[0][0]]
+    config.trap_template_limit = URLS
+    config.frontier_memory_urls = 60
+    config.frontier_hot_urls = 5
+    return config
+
+
+def fill(frontier):
+    all_links = links()
+    for i in range(0, URLS, 50):
+        frontier.add_urls(all_links[i:i + 50], 1)
+
+
+def crawl(frontier, count=None):
+    ''' Completes up to count urls in the order they are handed out. '''
+    urls = []
+    while count is None or len(urls) < count:
+        url = frontier.get_tbd_url()
+        if url is None:
+            break
+        urls.append(url)
+        frontier.mark_url_complete(url, fetched=False)
+    return urls
+
+
+def segments(config):
+    directory = config.save_file + ".spill"
+    return os.listdir(directory) if os.path.isdir(directory) else []
+
+
+def test_spilling_keeps_the_crawl_order(capped):
+    frontier = Frontier(capped, True)
+    fill(frontier)
+    assert frontier.spill.total > 0
+    assert frontier.queued_in_memory <= capped.frontier_memory_urls
+    spilled = crawl(frontier)
+    frontier.close()
+
+    capped.frontier_memory_urls = 0
+    frontier = Frontier(capped, True)
+    fill(frontier)
+    assert crawl(frontier) == spilled
+    frontier.close()
+    assert len(spilled) == URLS
+
+
+def test_resume_with_spilled_urls_crawls_each_once(capped):
+    capped.checkpoint_interval = 100
+    frontier = Frontier(capped, True)
+    fill(frontier)
+    # stopped without closing, some urls completed after the last checkpoint
+    before = crawl(frontier, 250)
+    frontier.save.close()
+
+    frontier = Frontier(capped, False)
+    after = crawl(frontier)
+    frontier.close()
+    assert not set(before) & set(after)
+    assert sorted(before + after) == sorted({url for url, _ in links()})
+
+
+def test_spent_segments_are_removed(capped):
+    frontier = Frontier(capped, True)
+    fill(frontier)
+    assert segments(capped)
+    crawl(frontier)
+    frontier.close()
+    assert not segments(capped)
@@ -0,0 +1,130 @@
+import os
+import shelve
+
+import pytest
+
+from crawler.frontier import Frontier
+from crawler.store import JournalStore
+from utils import get_urlhash
+
+
+def write(store, urls, completed=False):
+    for url in urls:
+        store[get_urlhash(url)] = (url, completed)
+
+
+@pytest.fixture
+def journal_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / "frontier.journal")
+
+
+def test_records_are_replayed_in_write_order(journal_path):
+    store = JournalStore(journal_path, batch_size=2)
+    write(store, ["https://a.ics.uci.edu/1", "https://a.ics.uci.edu/2"])
+    write(store, ["https://a.ics.uci.edu/1"], completed=True)
+    store.close()
+    store = JournalStore(journal_path)
+    assert [(url, completed) for _, url, completed in store.records()] == [
+        ("https://a.ics.uci.edu/1", False), ("https://a.ics.uci.edu/2", False),
+        ("https://a.ics.uci.edu/1", True)]
+    store.close()
+
+
+@pytest.mark.parametrize("cut", [1, 2, 10])
+def test_torn_tail_is_dropped(journal_path, cut):
+    store = JournalStore(journal_path)
+    write(store, ["https://a.ics.uci.edu/1", "https://a.ics.uci.edu/2"])
+    store.close()
+    intact = os.path.getsize(journal_path)
+    store = JournalStore(journal_path)
+    write(store, ["https://a.ics.uci.edu/3"])
+    store.close()
+    # a crash in the middle of writing the last record
+    os.truncate(journal_path, intact + cut)
+
+    store = JournalStore(journal_path)
+    assert [url for _, url, _ in store.records()] == [
+        "https://a.ics.uci.edu/1", "https://a.ics.uci.edu/2"]
+    assert os.path.getsize(journal_path) == intact
+    # records written after the torn one was cut off replay too
+    write(store, ["https://a.ics.uci.edu/4"])
+    store.close()
+    store = JournalStore(journal_path)
+    assert [url for _, url, _ in store.records()][-1] == "https://a.ics.uci.edu/4"
+    store.close()
+
+
+def test_compaction_keeps_the_latest_record_of_each_url(journal_path):
+    store = JournalStore(journal_path, compact_min=0)
+    urls = [f"https://a.ics.uci.edu/{i}" for i in range(50)]
+    write(store, urls)
+    write(store, urls[:25], completed=True)
+    before = store.marker()
+    store.compact()
+    # the old position names nothing in the rewritten log
+    assert store.marker() != before
+    assert store.records_since(before) is None
+    write(store, urls[25:26], completed=True)
+    store.close()
+
+    store = JournalStore(journal_path)
+    records = [(url, completed) for _, url, completed in store.records()]
+    assert len(records) == 51
+    assert dict(records) == {url: urls.index(url) <= 25 for url in urls}
+    store.close()
+
+
+def test_records_since_marker(journal_path):
+    store = JournalStore(journal_path)
+    write(store, ["https://a.ics.uci.edu/1"])
+    marker = store.marker()
+    write(store, ["https://a.ics.uci.edu/2"])
+    store.close()
+    store = JournalStore(journal_path)
+    assert [url for _, url, _ in store.records_since(marker)] == [
+        "https://a.ics.uci.edu/2"]
+    store.close()
+
+
+def test_frontier_resumes_pending_urls(config):
+    frontier = Frontier(config, True)
+    seed = frontier.get_tbd_url()
+    frontier.add_url("https://www.ics.uci.edu/a", 1)
+    frontier.add_url("https://www.ics.uci.edu/b", 1)
+    frontier.mark_url_complete(seed)
+    frontier.save.close()
+
+    frontier = Frontier(config, False)
+    urls = set()
+    while True:
+        url = frontier.get_tbd_url()
+        if url is None:
+            break
+        urls.add(url)
+        frontier.mark_url_complete(url)
+    assert urls == {"https://www.ics.uci.edu/a", "https://www.ics.uci.edu/b"}
+    frontier.close()
+
+
+def test_legacy_shelve_is_imported(config):
+    with shelve.open("frontier.shelve") as legacy:
+        for url, completed in (("https://www.ics.uci.edu", True),
+                               ("https://www.ics.uci.edu/a", False)):
+            legacy[get_urlhash(url)] = (url, completed)
+
+    frontier = Frontier(config, False)
+    assert frontier.get_tbd_url() == "https://www.ics.uci.edu/a"
+    frontier.mark_url_complete("https://www.ics.uci.edu/a")
+    assert frontier.get_tbd_url() is None
+    frontier.close()
+    assert os.path.exists(config.save_file)
+
+
+def test_restart_ignores_legacy_shelve(config):
+    with shelve.open("frontier.shelve") as legacy:
+        url = "https://www.ics.uci.edu/a"
+        legacy[get_urlhash(url)] = (url, False)
+    frontier = Frontier(config, True)
+    assert frontier.get_tbd_url() == "https://www.ics.uci.edu"
+    frontier.close()
@@ -0,0 +1,54 @@
+import re
+
+from collections import defaultdict
+
+import pytest
+
+import scraper
+
+
+@pytest.mark.parametrize("text, words", [
+    ("Plain words, and more words.", ["plain", "words", "and", "more", "words"]),
+    ("he said 'quoted words' here", ["he", "said", "quoted", "words", "here"]),
+    ("('word') ''double'' 'tis", ["word", "double", "tis"]),
+    ("don't can't isn't", ["do", "ca", "is"]),
+    ("we're students' work", ["we", "students", "work"]),
+    # not words on their own, as word_tokenize keeps them whole
+    ("x86 e-mail o'neil café 're 'll a I", []),
+    ("visit www.ics.uci.edu or ~lopes today", ["visit", "or", "today"]),
+    ("see file.html, node.js and/or http://ics.uci.edu/a", ["see", "http"]),
+    # word_tokenize splits off the @, so the name counts but not the host
+    ("mail jdoe@ics.uci.edu now", ["mail", "jdoe", "now"]),
+    ("you cannot, we're gonna", ["you", "can", "not", "we", "gon", "na"]),
+    # a period ends a word only at the end of a sentence
+    ("the end. next u.s. e.g. mr.smith end...", ["the", "end", "next", "end"]),
+])
+def test_page_words_match_word_tokenize(text, words):
+    assert scraper.pageWords(text.lower()) == words
+
+
+# sentences of a page, one at a time: word_tokenize splits a text into
+# sentences first, which needs NLTK's punkt data
+SENTENCES = [
+    "The Donald Bren School of Information and Computer Sciences (ICS) at UC Irvine.",
+    "Contact jdoe@ics.uci.edu or visit https://www.ics.uci.edu/about/index.php for more.",
+    "Courses: CS 121/INF 141, and/or ICS 33 -- see syllabus.pdf, notes.html.",
+    "You cannot miss the deadline; we're gonna post it at www.ics.uci.edu/~lopes.",
+    "Students' \"projects\" aren't due 'til Friday [3pm], they'll say it's fine!",
+]
+
+
+@pytest.mark.parametrize("sentence", SENTENCES)
+def test_page_words_match_nltk(sentence):
+    tokenize = pytest.importorskip("nltk.tokenize").NLTKWordTokenizer().tokenize
+    words = [token.lower() for token in tokenize(sentence)
+             if len(token) > 1 and re.match(r"^[a-zA-Z]+$", token)]
+    assert scraper.pageWords(sentence) == words
+
+
+def test_token_frequencies_counts_into_freq():
+    freq = defaultdict(int, {"words": 1})
+    count, page_freq = scraper.tokenFrequencies("words and more words", freq)
+    assert count == 4
+    assert page_freq == {"words": 2, "and": 1, "more": 1}
+    assert freq["words"] == 3
@@ -0,0 +1,66 @@
+import pytest
+
+from crawler.traps import TrapDetector, url_template
+
+
+@pytest.fixture
+def traps(config):
+    config.trap_template_limit = 3
+    config.trap_date_limit = 2
+    config.trap_error_limit = 2
+    config.trap_templates = 4
+    return TrapDetector(config)
+
+
+@pytest.mark.parametrize("url, template", [
+    ("https://wics.ics.uci.edu/events/2019-05-01/?ical=1&page=2",
+     "wics.ics.uci.edu/events/<date>/?ical&page"),
+    ("https://WICS.ics.uci.edu/events/5-1-2019", "wics.ics.uci.edu/events/<date>?"),
+    ("https://www.ics.uci.edu/~eppstein/pubs/p123.html?b=2&a=1&b=3",
+     "www.ics.uci.edu/~eppstein/pubs/p<n>.html?a&b"),
+    ("https://www.ics.uci.edu/wiki/doku.php?do=diff&rev=1577836800&",
+     "www.ics.uci.edu/wiki/doku.php?do&rev"),
+    ("https://www.ics.uci.edu/", "www.ics.uci.edu/?"),
+])
+def test_url_template(url, template):
+    assert url_template(url) == template
+
+
+def test_templates_are_admitted_up_to_their_limit(traps):
+    pages = [f"https://www.ics.uci.edu/page/{i}" for i in range(5)]
+    assert [traps.admit(url) for url in pages] == [True, True, True, False, False]
+    days = [f"https://www.ics.uci.edu/events/2020-01-{i:02}" for i in range(1, 4)]
+    assert [traps.admit(url) for url in days] == [True, True, False]
+    assert traps.admit("https://www.ics.uci.edu/about")
+    assert traps.rejected == 3
+
+
+def test_download_errors_block_a_template(traps):
+    url = "https://www.ics.uci.edu/calendar?month=1"
+    assert traps.admit(url)
+    traps.record_error(url)
+    assert not traps.blocked("https://www.ics.uci.edu/calendar?month=2")
+    traps.record_error(url)
+    assert traps.blocked("https://www.ics.uci.edu/calendar?month=2")
+    assert not traps.admit("https://www.ics.uci.edu/calendar?month=3")
+    assert not traps.blocked("https://www.ics.uci.edu/calendar")
+
+
+def test_least_recently_seen_templates_are_forgotten(traps):
+    for i in range(3):
+        traps.admit("https://www.ics.uci.edu/page/1")
+    for host in ("a", "b", "c"):
+        traps.admit(f"https://{host}.ics.uci.edu/")
+    # seen again, so not the least recent
+    assert not traps.admit("https://www.ics.uci.edu/page/2")
+    traps.admit("https://d.ics.uci.edu/")
+    assert "a.ics.uci.edu/?" not in dict(traps.state())
+    assert traps.counts["www.ics.uci.edu/page/<n>?"] == [3, 0]
+
+
+def test_state_restores_the_counts(traps, config):
+    traps.admit("https://www.ics.uci.edu/page/1")
+    traps.record_error("https://www.ics.uci.edu/page/1")
+    restored = TrapDetector(config)
+    restored.restore(traps.state())
+    assert restored.counts == traps.counts
@@ -0,0 +1,177 @@
+import asyncio
+
+from threading import Thread, current_thread
+
+import aiohttp
+import pytest
+import requests
+
+import crawler.worker
+from crawler import Crawler
+from crawler.frontier import Frontier
+from crawler.reporter import Reporter
+from crawler.worker import AsyncWorker, PipelineWorker
+from utils import get_urlhash
+from utils.download import download, async_download
+from utils.stub_server import StubCacheServer
+
+WORDS = ("research student informatics computer science graduate faculty "
+         "seminar course lecture data learning systems software").split()
+
+
+def html(*hrefs):
+    ''' A page with enough distinct words to be counted, linking to hrefs. '''
+    text = " ".join(WORDS[i % len(WORDS)] for i in range(120))
+    anchors = "".join(f"<a href='{href}'>link</a>" for href in hrefs)
+    return f"<html><body><p>{text}</p>{anchors}</body></html>".encode()
+
+
+SITE = {
+    "https://www.ics.uci.edu": html("/a", "/b", "https://www.cs.uci.edu/c"),
+    "https://www.ics.uci.edu/a": html("/b"),
+    "https://www.ics.uci.edu/b": html("/a"),
+    "https://www.cs.uci.edu/c": html("https://www.ics.uci.edu/"),
+}
+
+
+def crawl(config, worker_factory=crawler.worker.Worker, timeout=30):
+    ''' Runs a crawl to the end, failing the test if it does not finish. '''
+    crawler_ = Crawler(config, True, worker_factory=worker_factory)
+    runner = Thread(target=crawler_.start, daemon=True)
+    runner.start()
+    runner.join(timeout)
+    assert not runner.is_alive(), "the crawl did not finish"
+    return crawler_
+
+
+@pytest.mark.parametrize("worker_factory", [crawler.worker.Worker, PipelineWorker])
+def test_crawl_finishes_when_a_download_raises(config, monkeypatch, worker_factory):
+    server = StubCacheServer(SITE).start()
+    config.cache_server = server.address
+    config.parse_processes = 1
+    failed = "https://www.ics.uci.edu/a"
+
+    def flaky_download(url, config, logger=None):
+        if url == failed:
+            raise requests.ConnectionError("cache server went away")
+        return download(url, config, logger)
+
+    monkeypatch.setattr(crawler.worker, "download", flaky_download)
+    try:
+        crawler_ = crawl(config, worker_factory)
+    finally:
+        server.stop()
+    assert crawler_.frontier.in_progress == 0
+    # the failure counts against the url's template, the other pages are crawled
+    assert crawler_.frontier.traps.counts["www.ics.uci.edu/a?"][1] == 1
+    assert crawler_.reporter.stats["page_count"] == 3
+    assert set(server.fetched) >= set(SITE) - {failed}
+
+
+def test_async_crawl_finishes_when_downloads_fail(config, monkeypatch):
+    server = StubCacheServer(SITE).start()
+    config.cache_server = server.address
+    config.async_concurrency = 4
+    failed = {"https://www.ics.uci.edu/a": aiohttp.ClientError("connection reset"),
+              "https://www.ics.uci.edu/b": asyncio.TimeoutError()}
+
+    async def flaky_download(url, config, session, logger=None):
+        if url in failed:
+            raise failed[url]
+        return await async_download(url, config, session, logger)
+
+    monkeypatch.setattr(crawler.worker, "async_download", flaky_download)
+    try:
+        crawler_ = crawl(config, AsyncWorker)
+    finally:
+        server.stop()
+    assert crawler_.frontier.in_progress == 0
+    assert crawler_.reporter.stats["page_count"] == 2
+
+
+def test_async_worker_fails_and_releases_off_the_event_loop(config, monkeypatch):
+    server = StubCacheServer(SITE).start()
+    config.cache_server = server.address
+    config.threads_count = 1
+    threads = []
+
+    async def failing_download(url, config, session, logger=None):
+        raise aiohttp.ClientError("connection reset")
+
+    def track(method):
+        def tracked(self, *args):
+            threads.append(current_thread())
+            return method(self, *args)
+        return tracked
+
+    monkeypatch.setattr(crawler.worker, "async_download", failing_download)
+    monkeypatch.setattr(AsyncWorker, "fail", track(AsyncWorker.fail))
+    monkeypatch.setattr(Frontier, "release", track(Frontier.release))
+    try:
+        crawler_ = crawl(config, AsyncWorker)
+    finally:
+        server.stop()
+    assert len(threads) == 2
+    assert not any(thread in crawler_.workers for thread in threads)
+
+
+class FlakyRobots(dict):
+    ''' SITE, with every robots.txt giving a 503 the first down times. '''
+    def __init__(self, pages, down):
+        super().__init__(pages)
+        self.down = down
+        self.fetches = 0
+
+    def get(self, url, default=None):
+        if url.endswith("/robots.txt"):
+            self.fetches += 1
+            if self.fetches <= self.down:
+                return (503, b"", {})
+        return super().get(url, default)
+
+
+@pytest.mark.parametrize("down", [1, 100])
+def test_unreachable_robots_defers_the_site(config, down):
+    # one site, so each robots.txt fetch is a retry of the same one
+    site = FlakyRobots({url: page for url, page in SITE.items()
+                        if "www.ics.uci.edu" in url}, down)
+    server = StubCacheServer(site).start()
+    config.cache_server = server.address
+    config.robots_negative_ttl = 0.05
+    config.robots_retries = 2
+    try:
+        crawler_ = crawl(config)
+    finally:
+        server.stop()
+    # the site's pages are crawled once robots.txt is back, or without it
+    # once it failed more than ROBOTS_RETRIES times in a row
+    assert crawler_.reporter.stats["page_count"] == 3
+    assert site.fetches >= min(down, config.robots_retries + 1)
+
+
+def test_counted_url_completes_once_its_stats_are_saved(config):
+    config.freq_merge_interval = 1
+    config.stats_save_pages = 2
+    config.stats_save_interval = 3600
+    frontier = Frontier(config, True)
+    reporter = Reporter(config, True, on_save=frontier.commit)
+    worker = crawler.worker.Worker(0, config, frontier, reporter)
+    seed, a = frontier.get_tbd_url(), "https://www.cs.uci.edu/a"
+    worker.freq["informatics"] += 1
+    worker.record(seed, [(a, get_urlhash(a))], 1)
+    assert reporter.stats["page_count"] == 1 and frontier.uncommitted == {seed: 0}
+
+    # stopped before the stats were saved: the seed is crawled again
+    frontier.save.flush()
+    resumed = Frontier(config, False)
+    assert Reporter(config, False).stats["page_count"] == 0
+    assert {resumed.get_tbd_url(), resumed.get_tbd_url()} == {seed, a}
+
+    # the next save holds both pages and completes their urls
+    assert frontier.get_tbd_url() == a
+    worker.record(a, [], 0)
+    assert not frontier.uncommitted
+    frontier.save.flush()
+    saved = Reporter(config, False)
+    assert saved.stats["page_count"] == 2 and saved.all_freq["informatics"] == 1
+    assert Frontier(config, False).get_tbd_url() is None
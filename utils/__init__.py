@@ -1,11 +1,25 @@
 import os
 import logging
+import re
+from functools import lru_cache
 from hashlib import sha256
-from urllib.parse import urlparse
+from urllib.parse import urljoin, urlparse
+
+LOG_LEVEL = logging.INFO
+_loggers = set()
+
+def set_log_level(level):
+    ''' Sets the level of every logger from get_logger, e.g. "DEBUG" to see the
+        per-page messages or "WARNING" to see only problems. '''
+    global LOG_LEVEL
+    LOG_LEVEL = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+    for name in _loggers:
+        logging.getLogger(name).setLevel(LOG_LEVEL)
 
 def get_logger(name, filename=None):
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+    logger.setLevel(LOG_LEVEL)
+    _loggers.add(name)
     if not os.path.exists("Logs"):
         os.makedirs("Logs")
     fh = logging.FileHandler(f"Logs/{filename if filename else name}.log")
@@ -22,14 +36,113 @@ def get_logger(name, filename=None):
     return logger
 
 
-def get_urlhash(url):
-    parsed = urlparse(url)
+def _hash_parts(netloc, path, params, query, fragment):
     # everything other than scheme.
     return sha256(
-        f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
-        f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
+        f"{netloc}/{path}/{params}/{query}/{fragment}".encode("utf-8")).hexdigest()
+
+def get_urlhash(url):
+    parsed = urlparse(url)
+    return _hash_parts(
+        parsed.netloc, parsed.path, parsed.params, parsed.query, parsed.fragment)
 
 def normalize(url):
     if url.endswith("/"):
         return url.rstrip("/")
     return url
+
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# query keys that only track where a visitor came from, dropped from urls
+TRACKING_PARAMS = frozenset([
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "_ga", "_gl", "ref_src", "phpsessid", "jsessionid"])
+
+# http(s) urls plain enough to split with one regex, anything else goes through
+# urlparse: scheme, host, port, path (with no params) and query
+_PLAIN_URL = re.compile(
+    r'(https?)://([a-z0-9.\-]+)(?::(\d{0,5}))?(/[^?#;]*)?(?:\?([^#]*))?(?:#.*)?', re.I)
+_UNSAFE = re.compile(r'[\x00-\x20\x7f]')
+
+def _plain(url):
+    if url.isascii() and not _UNSAFE.search(url):
+        return _PLAIN_URL.fullmatch(url)
+    return None
+
+@lru_cache(maxsize=64)
+def _origin(base):
+    match = _plain(base)
+    return f"{match.group(1)}://{match.group(2)}" + (
+        f":{match.group(3)}" if match.group(3) is not None else "") if match else None
+
+def _join(base, url):
+    # a path from the root with no dot segments needs only the base's origin
+    if url.startswith("/") and not url.startswith("//") and "/." not in url:
+        origin = _origin(base)
+        if origin is not None:
+            return origin + url
+    return urljoin(base, url)
+
+def _tracking(field):
+    key = field.partition("=")[0].lower()
+    return key.startswith("utm_") or key in TRACKING_PARAMS
+
+def canonicalize(url, base=None):
+    ''' Returns (url, get_urlhash(url)) of the canonical form of url, resolved
+        against base if it is relative: the scheme and host lowercased, no
+        default port, fragment or tracking parameters, the query fields
+        sorted by key and the trailing slashes normalize removes. Returns None
+        if url is not an http(s) url. Variants of a url all give the same
+        pair, and the hash comes from the same parse. '''
+    # hrefs often keep the whitespace around them, which browsers drop
+    url = url.strip()
+    match = _plain(url)
+    if match is None and base is not None:
+        url = _join(base, url)
+        match = _plain(url)
+    if match is not None:
+        scheme, host, port, path, query = match.groups()
+        scheme, netloc, params = scheme.lower(), host.lower(), ""
+        path, query = path or "", query or ""
+        if port:
+            if int(port) > 65535:
+                return None
+            if int(port) != DEFAULT_PORTS[scheme]:
+                netloc += f":{int(port)}"
+        if not netloc:
+            return None
+    else:
+        try:
+            parsed = urlparse(url)
+            host, port = parsed.hostname, parsed.port
+        except ValueError:
+            return None
+        scheme = parsed.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not host:
+            return None
+        netloc = f"[{host}]" if ":" in host else host
+        if port is not None and port != DEFAULT_PORTS[scheme]:
+            netloc += f":{port}"
+        userinfo, at, _ = parsed.netloc.rpartition("@")
+        if at:
+            netloc = userinfo + at + netloc
+        path, params, query = parsed.path, parsed.params, parsed.query
+    if query:
+        query = "&".join(sorted(
+            (field for field in query.split("&") if field.strip("/") and not _tracking(field)),
+            key=lambda field: field.partition("=")[0]))
+    # as normalize would strip them from the end of the url
+    query = query.rstrip("/")
+    if not query:
+        params = params.rstrip("/")
+        if not params:
+            path = path.rstrip("/")
+    url = f"{scheme}://{netloc}{path}"
+    if params:
+        url += ";" + params
+    if query:
+        url += "?" + query
+    if ";" in path:
+        # the stripped path may split into different params when parsed again
+        return url, get_urlhash(url)
+    return url, _hash_parts(netloc, path, params, query, "")
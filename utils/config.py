@@ -9,11 +9,66 @@ class Config(object):
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.store = config["LOCAL PROPERTIES"].get("STORE", "shelve")
+        self.journal_batch_size = config["LOCAL PROPERTIES"].getint("JOURNAL_BATCH_SIZE", 512)
+        self.journal_flush_interval = config["LOCAL PROPERTIES"].getfloat("JOURNAL_FLUSH_INTERVAL", 1.0)
+        self.seen_bloom_capacity = config["LOCAL PROPERTIES"].getint("SEEN_BLOOM_CAPACITY", 0)
+        self.checkpoint_interval = config["LOCAL PROPERTIES"].getint("CHECKPOINT_INTERVAL", 1000)
+        self.frontier_memory_urls = config["LOCAL PROPERTIES"].getint("FRONTIER_MEMORY_URLS", 0)
+        self.frontier_hot_urls = config["LOCAL PROPERTIES"].getint("FRONTIER_HOT_URLS", 256)
+        self.freq_merge_interval = config["LOCAL PROPERTIES"].getint("FREQ_MERGE_INTERVAL", 20)
+        self.freq_capacity = config["LOCAL PROPERTIES"].getint("FREQ_CAPACITY", 0)
+        self.stats_save_pages = config["LOCAL PROPERTIES"].getint("STATS_SAVE_PAGES", 100)
+        self.stats_save_interval = config["LOCAL PROPERTIES"].getfloat("STATS_SAVE_INTERVAL", 30.0)
+        self.stats_file = "stats.db"
+        self.archive_dir = config["LOCAL PROPERTIES"].get("ARCHIVE_DIR", "")
+        self.archive_segment_size = config["LOCAL PROPERTIES"].getint("ARCHIVE_SEGMENT_MB", 256) << 20
+        self.archive_compression = config["LOCAL PROPERTIES"].get("ARCHIVE_COMPRESSION", "gzip")
+        self.history_file = config["LOCAL PROPERTIES"].get("HISTORY_FILE", "")
+        self.recrawl = False        # set by launch.py --recrawl
+        self.log_level = config["LOCAL PROPERTIES"].get("LOG_LEVEL", "INFO")
+        self.metrics_port = config["LOCAL PROPERTIES"].getint("METRICS_PORT", 0)
+        self.metrics_file = config["LOCAL PROPERTIES"].get("METRICS_FILE", "")
+        self.metrics_interval = config["LOCAL PROPERTIES"].getfloat("METRICS_INTERVAL", 10.0)
+        self.report_file = "report.txt"
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        self.engine = config["CRAWLER"].get("ENGINE", "threaded")
+        self.async_concurrency = config["CRAWLER"].getint("ASYNC_CONCURRENCY", 32)
+        self.parse_processes = config["CRAWLER"].getint("PARSE_PROCESSES", 0)
+        self.parse_backlog = config["CRAWLER"].getint("PARSE_BACKLOG", 4)
+        self.robots_ttl = config["CRAWLER"].getfloat("ROBOTS_TTL", 3600)
+        self.robots_negative_ttl = config["CRAWLER"].getfloat("ROBOTS_NEGATIVE_TTL", 600)
+        self.robots_retries = config["CRAWLER"].getint("ROBOTS_RETRIES", 3)
+        self.robots_cache_size = config["CRAWLER"].getint("ROBOTS_CACHE_SIZE", 1024)
+        self.max_page_size = config["CRAWLER"].getint("MAX_PAGE_SIZE", 3000000)
+        self.trap_template_limit = config["CRAWLER"].getint("TRAP_TEMPLATE_LIMIT", 100)
+        self.trap_date_limit = config["CRAWLER"].getint("TRAP_DATE_LIMIT", 20)
+        self.trap_error_limit = config["CRAWLER"].getint("TRAP_ERROR_LIMIT", 10)
+        self.trap_templates = config["CRAWLER"].getint("TRAP_TEMPLATES", 100000)
+        self.dedup = config["CRAWLER"].getboolean("DEDUP", True)
+        self.simhash_distance = config["CRAWLER"].getint("SIMHASH_DISTANCE", 3)
+        self.host_latency_factor = config["CRAWLER"].getfloat("HOST_LATENCY_FACTOR", 2.0)
+        self.host_max_delay = config["CRAWLER"].getfloat("HOST_MAX_DELAY", 30.0)
+        self.host_failure_streak = config["CRAWLER"].getint("HOST_FAILURE_STREAK", 10)
+        self.host_cooldown = config["CRAWLER"].getfloat("HOST_COOLDOWN", 60.0)
+        self.recrawl_min_interval = config["CRAWLER"].getfloat("RECRAWL_MIN_INTERVAL", 86400.0)
+        self.recrawl_max_interval = config["CRAWLER"].getfloat("RECRAWL_MAX_INTERVAL", 2592000.0)
+        self.priority = config["CRAWLER"].get(
+            "PRIORITY", "depth:1, length:0.5, yield:4, diversity:0.5")
+
+        self.cluster_nodes = [
+            (host, int(port)) for host, port in (
+                node.strip().rsplit(":", 1)
+                for node in config.get("CLUSTER", "NODES", fallback="").split(",")
+                if node.strip())]
+        self.cluster_authkey = config.get("CLUSTER", "AUTHKEY", fallback="spacetime-crawler")
+        self.cluster_batch_size = config.getint("CLUSTER", "BATCH_SIZE", fallback=500)
+        self.cluster_flush_interval = config.getfloat("CLUSTER", "FLUSH_INTERVAL", fallback=0.5)
+        self.node_id = 0
 
         self.cache_server = None
\ No newline at end of file
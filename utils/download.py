@@ -1,21 +1,132 @@
 import requests
+import aiohttp
+import asyncio
 import cbor
 import time
 
+from threading import Lock
+
+from utils.metrics import metrics
 from utils.response import Response
 
-def download(url, config, logger=None):
-    host, port = config.cache_server
-    resp = requests.get(
-        f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+_session = None
+_session_lock = Lock()
+
+# Room for the CBOR envelope and pickled response around a page body.
+ENVELOPE_OVERHEAD = 1 << 16
+
+def _get_session(config):
+    ''' Returns the process-wide session, which keeps one pool of keep-alive
+        connections to the cache server shared by every worker thread. '''
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=max(config.threads_count, 1))
+            _session.mount("http://", adapter)
+        return _session
+
+def _params(url, config):
+    return [("q", f"{url}"), ("u", f"{config.user_agent}")]
+
+def _limit(config):
+    return config.max_page_size + ENVELOPE_OVERHEAD
+
+def _too_large(url, logger):
+    if logger:
+        logger.info(f"Skipped {url}, larger than the page size limit.")
+    return Response({
+        "error": f"Response for {url} is larger than the page size limit.",
+        "status": 413,
+        "url": url})
+
+def _unreachable(url, err, logger):
+    ''' The response for a download that got no reply, a server error to the
+        callers, so it counts against the url's template and host. '''
+    if logger:
+        logger.error(f"Could not download {url}: {err!r}")
+    return Response({
+        "error": f"Could not download {url}: {err!r}",
+        "status": 599,
+        "url": url})
+
+def _read_capped(resp, limit):
+    ''' Reads a streamed body into one buffer, or returns None as soon as it
+        is known to be larger than limit. '''
+    length = resp.headers.get("Content-Length", "")
+    if length.isdigit() and int(length) > limit:
+        return None
+    content = bytearray()
+    for chunk in resp.iter_content(1 << 16):
+        content += chunk
+        if len(content) > limit:
+            return None
+    return content
+
+async def _async_read_capped(resp, limit):
+    try:
+        length = resp.content_length
+    except ValueError:
+        length = None
+    if length is not None and length > limit:
+        return None
+    content = bytearray()
+    async for chunk in resp.content.iter_chunked(1 << 16):
+        content += chunk
+        if len(content) > limit:
+            return None
+    return content
+
+def _to_response(url, status, content, resp, logger):
+    metrics.inc("download_bytes", len(content))
     try:
-        if resp and resp.content:
-            return Response(cbor.loads(resp.content))
-    except (EOFError, ValueError) as e:
+        if status < 400 and content:
+            # cbor reads the buffer in place; the page itself stays pickled
+            # until Response.raw_response is first used.
+            return Response(cbor.loads(content))
+    except (EOFError, ValueError):
         pass
-    logger.error(f"Spacetime Response error {resp} with url {url}.")
+    if logger:
+        logger.error(f"Spacetime Response error {resp} with url {url}.")
     return Response({
         "error": f"Spacetime Response error {resp} with url {url}.",
-        "status": resp.status_code,
+        "status": status,
         "url": url})
+
+def _timed(start, response):
+    response.elapsed = time.perf_counter() - start
+    metrics.observe("download", response.elapsed)
+    return response
+
+def download(url, config, logger=None):
+    host, port = config.cache_server
+    start = time.perf_counter()
+    try:
+        with _get_session(config).get(
+                f"http://{host}:{port}/", params=_params(url, config),
+                stream=True) as resp:
+            content = _read_capped(resp, _limit(config))
+    except requests.RequestException as err:
+        return _timed(start, _unreachable(url, err, logger))
+    return _timed(start, _too_large(url, logger) if content is None
+                  else _to_response(url, resp.status_code, content, resp, logger))
+
+def async_session(config):
+    ''' Opens an aiohttp session holding up to ASYNC_CONCURRENCY keep-alive
+        connections to the cache server. '''
+    connector = aiohttp.TCPConnector(
+        limit=config.async_concurrency, keepalive_timeout=60)
+    return aiohttp.ClientSession(connector=connector)
+
+async def async_download(url, config, session, logger=None):
+    host, port = config.cache_server
+    start = time.perf_counter()
+    try:
+        async with session.get(
+                f"http://{host}:{port}/", params=_params(url, config)) as resp:
+            content = await _async_read_capped(resp, _limit(config))
+    except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+        return _timed(start, _unreachable(url, err, logger))
+    return _timed(start, _too_large(url, logger) if content is None
+                  else _to_response(url, resp.status, content, resp, logger))
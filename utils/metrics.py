@@ -0,0 +1,156 @@
+''' Counters, per-stage timers and gauges of a crawl.
+
+    Everything records into the process-wide `metrics`:
+
+        with metrics.timer("download"):
+            resp = download(url, config)
+        metrics.inc("download_errors")
+        metrics.gauge("frontier_queued_urls", frontier.queued_count)
+
+    serve(port) answers GET /metrics in the Prometheus text format and GET
+    /metrics.json with snapshot(); dump_every(path, seconds) writes the JSON
+    snapshot to a file instead.
+'''
+import json
+import os
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+
+class Metrics(object):
+    def __init__(self):
+        self.lock = Lock()
+        self.start = time.time()
+        self.counters = defaultdict(int)
+        self.timers = dict()        # stage -> [count, total seconds, max seconds]
+        self.gauges = dict()        # name -> function returning a number or {label: number}
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            timer = self.timers.get(stage)
+            if timer is None:
+                self.timers[stage] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                if seconds > timer[2]:
+                    timer[2] = seconds
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def gauge(self, name, function):
+        self.gauges[name] = function
+
+    def take_timers(self):
+        ''' Returns and clears the timers, for a process to hand them to another. '''
+        with self.lock:
+            timers, self.timers = self.timers, dict()
+        return timers
+
+    def merge_timers(self, timers):
+        with self.lock:
+            for stage, (count, total, longest) in timers.items():
+                timer = self.timers.setdefault(stage, [0, 0.0, 0.0])
+                timer[0] += count
+                timer[1] += total
+                timer[2] = max(timer[2], longest)
+
+    def snapshot(self):
+        uptime = time.time() - self.start
+        with self.lock:
+            counters = dict(self.counters)
+            timers = {
+                stage: {"count": count, "seconds": total, "max_seconds": longest,
+                        "mean_seconds": total / count if count else 0.0}
+                for stage, (count, total, longest) in self.timers.items()}
+        gauges = dict()
+        for name, function in list(self.gauges.items()):
+            try:
+                gauges[name] = function()
+            except Exception:
+                pass
+        return {
+            "time": time.time(),
+            "uptime_seconds": uptime,
+            "pages_per_second": counters.get("pages_scraped", 0) / uptime if uptime else 0.0,
+            "counters": counters,
+            "stages": timers,
+            "gauges": gauges,
+        }
+
+    def render(self):
+        ''' The snapshot in the Prometheus text exposition format. '''
+        snapshot = self.snapshot()
+        lines = [f"crawler_uptime_seconds {snapshot['uptime_seconds']:.3f}"]
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"crawler_{name}_total {value}")
+        for stage, timer in sorted(snapshot["stages"].items()):
+            lines.append(f'crawler_stage_seconds_count{{stage="{stage}"}} {timer["count"]}')
+            lines.append(f'crawler_stage_seconds_sum{{stage="{stage}"}} {timer["seconds"]:.6f}')
+            lines.append(f'crawler_stage_seconds_max{{stage="{stage}"}} {timer["max_seconds"]:.6f}')
+        for name, value in sorted(snapshot["gauges"].items()):
+            if isinstance(value, dict):
+                for label, labelled in sorted(value.items()):
+                    lines.append(f'crawler_{name}{{key="{label}"}} {labelled}')
+            else:
+                lines.append(f"crawler_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        ''' Serves /metrics and /metrics.json on a daemon thread. '''
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.render().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        httpd.daemon_threads = True
+        Thread(target=httpd.serve_forever, daemon=True).start()
+        return httpd
+
+    def dump(self, path):
+        with open(path + ".tmp", "w") as dump_file:
+            json.dump(self.snapshot(), dump_file, indent=1)
+        os.replace(path + ".tmp", path)
+
+    def dump_every(self, path, interval):
+        ''' Writes the JSON snapshot to path every interval seconds on a daemon thread. '''
+        def run():
+            while True:
+                time.sleep(interval)
+                self.dump(path)
+        Thread(target=run, daemon=True).start()
+
+
+metrics = Metrics()
@@ -5,10 +5,25 @@ class Response(object):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
-        try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
-        except TypeError:
-            self.raw_response = None
+        self._pickled = resp_dict.get("response")
+        self._raw_response = None
+        self.elapsed = None     # seconds the download took, set by download()
+
+    @property
+    def raw_response(self):
+        ''' The page's requests.Response, unpickled on first use so that pages
+            that are never parsed are never copied out of the envelope. '''
+        if self._pickled is not None:
+            try:
+                self._raw_response = pickle.loads(self._pickled)
+            except TypeError:
+                self._raw_response = None
+            self._pickled = None
+        return self._raw_response
+
+    @property
+    def pickled_response(self):
+        ''' The page's requests.Response pickled, for handing to another process. '''
+        if self._pickled is not None:
+            return self._pickled
+        return pickle.dumps(self._raw_response)
@@ -0,0 +1,84 @@
+''' A local stand-in for the spacetime cache server.
+
+    It answers GET /?q=<url>&u=<useragent> with the same CBOR envelope the
+    real cache sends: {"url", "status", "response"}, where "response" is a
+    pickled requests.Response. Point config.cache_server at it to exercise
+    download() and async_download() without the live cache:
+
+        server = StubCacheServer({"https://www.ics.uci.edu": b"<html>...</html>"})
+        server.start()
+        config.cache_server = server.address
+'''
+import pickle
+import cbor
+import requests
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import urlparse, parse_qs
+
+
+def make_envelope(url, status, content, headers=None):
+    ''' Builds the CBOR body the cache server returns for url. '''
+    raw = requests.Response()
+    raw.url = url
+    raw.status_code = status
+    raw._content = content
+    raw.headers.update(headers or {"Content-Type": "text/html; charset=utf-8"})
+    raw.encoding = "utf-8"
+    return cbor.dumps({
+        "url": url, "status": status, "response": pickle.dumps(raw)})
+
+
+class StubCacheServer(object):
+    ''' Serves pages from a dict of url -> body, or url -> (status, body,
+        headers). Unknown urls get a 404 envelope. '''
+    def __init__(self, pages, host="127.0.0.1", port=0):
+        self.pages = pages
+        self.requests = 0
+        self.fetched = Counter()    # url -> times requested
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                url = query.get("q", [""])[0]
+                server.requests += 1
+                server.fetched[url] += 1
+                body = server.envelope(url)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/cbor")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The crawler stopped reading an oversized page.
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.address = self.httpd.server_address[:2]
+
+    def envelope(self, url):
+        page = self.pages.get(url)
+        if page is None:
+            return make_envelope(url, 404, b"")
+        if isinstance(page, bytes):
+            return make_envelope(url, 200, page)
+        status, content, headers = page
+        return make_envelope(url, status, content, headers)
+
+    def start(self):
+        Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()